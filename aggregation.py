@@ -0,0 +1,189 @@
+"""This module contains the class LaenderKern which computes the results
+per state of one or many orders at once on typed arrays instead of
+nested dicts.
+
+Classes:\n
+    LaenderKern -- An instance of this class holds the external data of
+    the 16 states as arrays and computes the numbers of offers, the
+    rates per inhabitant and the expected numbers of offers.
+"""
+
+# %%
+###################################################################################################
+import numpy
+
+##################################################
+# Import modules from folder
+import helpers
+
+
+# %%
+###################################################################################################
+class LaenderKern:
+    """An instance of this class holds the external data of the 16 states
+    as arrays (built once per process, see Datenkontext) and computes the
+    results per state with NumPy: the numbers of offers with one
+    bincount over the codes of the states of the offers and the rates
+    and expected numbers by broadcasting against the arrays of the
+    states. All calculations take matrices with one row per order and
+    one column per state, so many orders are computed at once.
+
+    Attributes:\n
+        liste_laender -- Names of the 16 states in the order of the
+        columns (the order of Buch_Laender.json)\n
+        buch_land_spalte -- Dict with the names of the states as keys and
+        their columns as values\n
+        einwohnerzahl -- NumPy array with the inhabitant numbers of the
+        states\n
+        gewicht_einwohnerzahl -- NumPy array with the shares of the
+        states in the inhabitants of germany\n
+        frame_laender -- Pandas dataframe with column 'Land' and the
+        external data of the states (must not be changed, see
+        funk_frame_erstellen)
+
+    Public methods:\n
+        funk_anzahlen_zaehlen -- Returns the numbers of offers per order
+        and state.\n
+        funk_quoten -- Returns the offers per million inhabitants.\n
+        funk_erwartet -- Returns the expected numbers of offers.\n
+        funk_kennzahlen_berechnen -- Returns all results per order and
+        state.\n
+        funk_frame_erstellen -- Returns the results of one order as
+        dataframe with one row per state.
+    """
+
+    def __init__(self, init_buch_laender: dict):
+        """Inits LaenderKern.
+
+        Keyword arguments:\n
+        init_buch_laender -- Dict with the external data of the 16 states
+        as loaded from Buch_Laender.json
+        """
+        self.liste_laender = list(init_buch_laender.keys())
+        self.buch_land_spalte = {x: i for i, x in enumerate(self.liste_laender)}
+        self.einwohnerzahl = numpy.array(
+            [init_buch_laender[x]['Einwohnerzahl'] for x in self.liste_laender],
+            dtype=numpy.float64
+            )
+        self.gewicht_einwohnerzahl = numpy.array(
+            [init_buch_laender[x]['Gewicht_Einwohnerzahl'] for x in self.liste_laender],
+            dtype=numpy.float64
+            )
+        self.frame_laender = helpers.funk_nested_dict_zu_frame(
+            arg_dict=init_buch_laender,
+            arg_schluessel='Land'
+            )
+
+
+    def __len__(self):
+        """Returns the number of states."""
+        return(len(self.liste_laender))
+
+
+    def funk_anzahlen_zaehlen(
+            self,
+            arg_codes: numpy.ndarray,
+            arg_liste_laender_codes: list,
+            arg_auftraege: numpy.ndarray = None,
+            arg_n_auftraege: int = 1
+            ):
+        """Returns a NumPy array (int64) with the numbers of offers with
+        shape (orders, states), counted with one bincount over all offers
+        of all orders.
+
+        Keyword arguments:\n
+        arg_codes -- Codes of the states of the offers, i. e. the index
+        in argument arg_liste_laender_codes (offers with a negative code
+        are not counted)\n
+        arg_liste_laender_codes -- Names of the states in the order of
+        the codes (e. g. AnzeigenTabelle.liste_laender)\n
+        arg_auftraege -- Row of the order of every offer (None means that
+        all offers belong to one single order)\n
+        arg_n_auftraege -- Number of orders
+        """
+        abbildung = numpy.array(
+            [self.buch_land_spalte[x] for x in arg_liste_laender_codes], dtype=numpy.int64
+            )
+
+        maske = numpy.asarray(arg_codes) >= 0
+        spalten = abbildung[numpy.asarray(arg_codes)[maske]]
+
+        if arg_auftraege is not None:
+            spalten = spalten + numpy.asarray(arg_auftraege)[maske] * len(self)
+
+        anzahlen = numpy.bincount(spalten, minlength=arg_n_auftraege * len(self))
+
+        return(anzahlen.reshape(arg_n_auftraege, len(self)))
+
+
+    def funk_quoten(self, arg_anzahlen: numpy.ndarray):
+        """Returns the offers per million inhabitants with the shape of
+        argument arg_anzahlen.
+
+        Keyword arguments:\n
+        arg_anzahlen -- Numbers of offers with shape (orders, states)
+        """
+        return(arg_anzahlen / self.einwohnerzahl * 1000000)
+
+
+    def funk_erwartet(self, arg_anzahlen: numpy.ndarray):
+        """Returns the expected numbers of offers with the shape of
+        argument arg_anzahlen, i. e. the offers of every order distributed
+        over the states according to their inhabitants.
+
+        Keyword arguments:\n
+        arg_anzahlen -- Numbers of offers with shape (orders, states)
+        """
+        return(arg_anzahlen.sum(axis=1)[:, None] * self.gewicht_einwohnerzahl)
+
+
+    def funk_kennzahlen_berechnen(
+            self,
+            arg_anzahlen: numpy.ndarray,
+            arg_anzahlen_total: numpy.ndarray
+            ):
+        """Returns a dict with the names of the results as keys and NumPy
+        arrays with shape (orders, states) as values: 'Anzeigenanzahl_total',
+        'Anzeigenanzahl', 'Anzeigenquote', 'Anzeigenanzahl_erwartet',
+        'ANZEIGENQUOTE_TOTAL' and 'Anzeigenanzahl_total_erwartet'.
+
+        Keyword arguments:\n
+        arg_anzahlen -- Numbers of scraped offers with shape (orders,
+        states), e. g. from funk_anzahlen_zaehlen\n
+        arg_anzahlen_total -- Numbers of all offers on the website (from
+        the filter "Ort") with shape (orders, states)
+        """
+        anzahlen = numpy.asarray(arg_anzahlen, dtype=numpy.int64).reshape(-1, len(self))
+        anzahlen_total = numpy.asarray(arg_anzahlen_total, dtype=numpy.int64).reshape(
+            -1, len(self)
+            )
+
+        return({
+            'Anzeigenanzahl_total': anzahlen_total,
+            'Anzeigenanzahl': anzahlen,
+            'Anzeigenquote': self.funk_quoten(anzahlen),
+            'Anzeigenanzahl_erwartet': self.funk_erwartet(anzahlen),
+            'ANZEIGENQUOTE_TOTAL': self.funk_quoten(anzahlen_total),
+            'Anzeigenanzahl_total_erwartet': self.funk_erwartet(anzahlen_total)
+            })
+
+
+    def funk_frame_erstellen(
+            self,
+            arg_buch_kennzahlen: dict,
+            arg_zeile: int = 0
+            ):
+        """Returns a new dataframe with one row per state, column 'Land',
+        the external data of the states and the results of one order.
+
+        Keyword arguments:\n
+        arg_buch_kennzahlen -- Dict from funk_kennzahlen_berechnen\n
+        arg_zeile -- Row of the order in the arrays of argument
+        arg_buch_kennzahlen
+        """
+        frame = self.frame_laender.copy()
+
+        for name_x, werte_x in arg_buch_kennzahlen.items():
+            frame[name_x] = werte_x[arg_zeile]
+
+        return(frame)
@@ -0,0 +1,363 @@
+"""This module contains the batch mode which processes a list of search
+terms without the web app and writes the results of all of them into
+one Parquet file. Several search terms are processed at the same time in
+a pool of threads which share the pacing of the requests and the rate
+limit in the database with the web app, i. e. the batch mode waits
+instead of aborting when the rate limit is reached. Run from the main
+folder of the repository, e. g.:\n
+    python batch.py Suchbegriffe.txt --ausgabe Batch.parquet --stichprobe 50
+
+The text file contains one search term per line. Run with --help for
+all options.
+
+The Parquet file contains two kinds of rows which are told apart by
+column 'Ebene': one row per scraped offer ('Anzeige', with the columns
+of offer_table.Zeile) and one row per state and search term ('Land',
+with the columns of the report, e. g. Anzeigenanzahl_total and
+ANZEIGENQUOTE_TOTAL). Column 'Suchbegriff' is set in every row.
+
+Classes:\n
+    SqlWorkerWartend -- Like sqlWorker, but waits until the rate limit
+    allows the order instead of aborting it.
+
+Functions:\n
+    funk_batch_ausfuehren -- Processes a list of search terms and
+    returns one dataframe with the results of all of them.\n
+    funk_suchbegriffe_laden -- Returns the search terms from a text
+    file.\n
+    funk_suchbegriffe_normalisieren -- Returns the search terms like
+    the Scraper_Worker uses them, each one only once.
+"""
+
+# %%
+###################################################################################################
+import math
+import time
+import argparse
+import concurrent.futures
+
+import pandas
+
+##################################################
+# Import modules from folder
+import helpers
+import constants
+import pipeline
+import data_context
+from data_context import Datenkontext
+from workers import sqlWorker
+from eventmanager import Eventmanager
+from user_interface import UserInterface
+
+
+# %%
+###################################################################################################
+class SqlWorkerWartend(sqlWorker):
+    """Like sqlWorker, but waits until the rate limit allows the order
+    instead of aborting it. With the admission queue the order keeps its
+    place in the queue for as long as it waits. All orders of the batch
+    mode share one session for the rate limit, so they do not use up the
+    share of the users of the web app.
+    """
+
+    def __init__(
+            self,
+            init_eventmanager: Eventmanager,
+            init_user_interface: UserInterface,
+            init_sitzung_id: str = 'Batch'
+            ):
+        """Inits SqlWorkerWartend.
+
+        Keyword arguments:\n
+        init_eventmanager -- Active instance of class Eventmanager or
+        None\n
+        init_user_interface -- Active instance of class UserInterface or
+        None\n
+        init_sitzung_id -- Id of the session for the rate limit
+        """
+        super().__init__(
+            init_eventmanager=init_eventmanager,
+            init_user_interface=init_user_interface,
+            init_sitzung_id=init_sitzung_id
+            )
+
+        # Leaving the queue and entering it again would put the order at its end
+        self.max_sekunden_warteschlange = math.inf
+
+
+    def funk_sql_tracker_updaten(
+            self,
+            arg_stichprobe: int,
+            arg_flagge_abbrechen: bool = False
+            ):
+        """Returns True as soon as the scraping order is allowed to be
+        executed.
+
+        Keyword arguments:\n
+        arg_stichprobe -- Number of offers that should be scraped\n
+        arg_flagge_abbrechen -- Ignored, the order is never aborted
+        """
+        # Without the admission queue, the order is checked again after the waiting time
+        while super().funk_sql_tracker_updaten(
+                arg_stichprobe=arg_stichprobe,
+                arg_flagge_abbrechen=False
+                ) == False:
+            # The sliding window of the rate limit tells when the order will be allowed
+            if self.sekunden_bis_frei != None:
+                sekunden_warten = max(self.sekunden_bis_frei, 1)
+            else:
+                sekunden_warten = constants.BATCH_WARTEN_SEKUNDEN
+
+            helpers.funk_drucken('Rate Limit erreicht, warte', sekunden_warten, 'Sekunden')
+            time.sleep(sekunden_warten)
+
+        return(True)
+
+
+
+# %%
+###################################################################################################
+def _funk_frame_suchbegriff_erstellen(
+        arg_suchbegriff: str,
+        arg_buch_ergebnis: dict
+        ):
+    """Returns a dataframe with the rows for one search term: one row
+    per offer and one row per state.
+
+    Keyword arguments:\n
+    arg_suchbegriff -- Search term as given in the list\n
+    arg_buch_ergebnis -- Dict with the results of the order from
+    pipeline.funk_pipeline_ausfuehren
+    """
+    frame_anzeigen = arg_buch_ergebnis['Tabelle_Anzeigen'].funk_zu_frame()
+    frame_anzeigen = frame_anzeigen.rename(columns={'land': 'Land'})
+    frame_anzeigen.insert(0, 'Ebene', 'Anzeige')
+
+    liste_frames = [frame_anzeigen]
+
+    if arg_buch_ergebnis['Frame_Bericht'] is not None:
+        frame_laender = arg_buch_ergebnis['Frame_Bericht'].reset_index()
+        frame_laender.insert(0, 'Ebene', 'Land')
+        liste_frames.append(frame_laender)
+
+    frame_suchbegriff = pandas.concat(liste_frames, ignore_index=True)
+    frame_suchbegriff.insert(0, 'Suchbegriff', arg_suchbegriff)
+
+    return(frame_suchbegriff)
+
+
+def _funk_suchbegriff_ausfuehren(
+        arg_suchbegriff: str,
+        arg_auftrag_stichprobe: int,
+        arg_auftrag_max_anzeigenalter: int,
+        arg_auftrag_nur_anzahlen: bool,
+        arg_datenkontext: Datenkontext,
+        arg_url_scraper_api: str
+        ):
+    """Processes the order for one search term in a thread of the pool
+    and returns the dict from pipeline.funk_pipeline_ausfuehren.
+
+    Keyword arguments:\n
+    arg_suchbegriff -- Search term of the order\n
+    arg_auftrag_stichprobe -- Number of offers that should be scraped\n
+    arg_auftrag_max_anzeigenalter -- Maximum age of offers (in days)\n
+    arg_auftrag_nur_anzahlen -- Whether the order is a counts-only order\n
+    arg_datenkontext -- Instance of Datenkontext with the external data\n
+    arg_url_scraper_api -- URL of the external scraper API or None
+    """
+    # Every thread needs an SQL session of its own. The results are not collected in the shared
+    # data context, so they can be freed after they are added to the dataframe.
+    sql_worker = SqlWorkerWartend(
+        init_eventmanager=None,
+        init_user_interface=None
+        )
+
+    try:
+        return(pipeline.funk_pipeline_ausfuehren(
+            arg_auftrag_suchbegriff=arg_suchbegriff,
+            arg_auftrag_stichprobe=arg_auftrag_stichprobe,
+            arg_auftrag_max_anzeigenalter=arg_auftrag_max_anzeigenalter,
+            arg_auftrag_nur_anzahlen=arg_auftrag_nur_anzahlen,
+            arg_datenkontext=Datenkontext(
+                init_buch_laender=arg_datenkontext.buch_laender,
+                init_laender_kern=arg_datenkontext.laender_kern,
+                init_plz_index=arg_datenkontext.plz_index,
+                init_geojson_laender=arg_datenkontext.geojson_laender,
+                init_frame_geojson_laender=arg_datenkontext.frame_geojson_laender,
+                init_buch_frames_geometrie=arg_datenkontext.buch_frames_geometrie
+                ),
+            arg_sql_worker=sql_worker,
+            arg_flagge_darstellen=False,
+            arg_url_scraper_api=arg_url_scraper_api
+            ))
+    finally:
+        sql_worker._funk_sql_session_schliessen()
+
+
+def funk_batch_ausfuehren(
+        arg_liste_suchbegriffe: list,
+        arg_auftrag_stichprobe: int = constants.N_DEFAULT_STICHPROBE_AUFTRAG,
+        arg_auftrag_max_anzeigenalter: int = constants.DEFAULT_MAX_ANZEIGENALTER_AUFTRAG,
+        arg_auftrag_nur_anzahlen: bool = False,
+        arg_datenkontext: Datenkontext = None,
+        arg_n_threads: int = constants.N_BATCH_THREADS,
+        arg_url_scraper_api: str = None
+        ):
+    """Processes the orders for all search terms in argument
+    arg_liste_suchbegriffe (up to arg_n_threads at the same time) and
+    returns a tuple with one dataframe with the rows of all search terms
+    (see the docstring of this module) and a dict with the search terms
+    which failed as keys and the messages as values. The maps and plots
+    are not created.
+
+    Keyword arguments:\n
+    arg_liste_suchbegriffe -- List of search terms (normalized with
+    funk_suchbegriffe_normalisieren, the results use the normalized ones)\n
+    arg_auftrag_stichprobe -- Number of offers that should be scraped
+    per search term\n
+    arg_auftrag_max_anzeigenalter -- Maximum age of offers (in days)\n
+    arg_auftrag_nur_anzahlen -- Whether only the numbers of offers per
+    state are scraped from the first page of every search term (the
+    file then only contains rows with 'Ebene' 'Land')\n
+    arg_datenkontext -- Instance of Datenkontext with the external data
+    (None means the files in the main folder)\n
+    arg_n_threads -- Number of search terms which are processed at the
+    same time\n
+    arg_url_scraper_api -- URL of the external scraper API or of a
+    local stub server (None means URL_SCRAPER_API from constants.py)
+    """
+    if arg_datenkontext == None:
+        arg_datenkontext = data_context.funk_datenkontext_erstellen()
+
+    # The same search term is only processed once
+    liste_suchbegriffe = funk_suchbegriffe_normalisieren(arg_liste_suchbegriffe)
+
+    buch_frames = {}
+    buch_fehler = {}
+
+    # The SQL schema is created once before the threads start, because creating it in several
+    # threads at the same time fails
+    sql_worker = SqlWorkerWartend(
+        init_eventmanager=None,
+        init_user_interface=None
+        )
+    sql_worker._funk_sql_session_schliessen()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=arg_n_threads) as pool_threads:
+        buch_futures = {
+            pool_threads.submit(
+                _funk_suchbegriff_ausfuehren,
+                suchbegriff_x,
+                arg_auftrag_stichprobe,
+                arg_auftrag_max_anzeigenalter,
+                arg_auftrag_nur_anzahlen,
+                arg_datenkontext,
+                arg_url_scraper_api
+                ): suchbegriff_x
+            for suchbegriff_x in liste_suchbegriffe
+            }
+
+        for future_x in concurrent.futures.as_completed(buch_futures):
+            suchbegriff = buch_futures[future_x]
+
+            try:
+                buch_pipeline = future_x.result()
+            except Exception as fehler:
+                helpers.funk_drucken('ACHTUNG!: Fehler im Batch fuer Suchbegriff', suchbegriff)
+                helpers.funk_drucken('Exception:', str(type(fehler).__name__))
+                helpers.funk_drucken('Fehler:', fehler)
+                buch_fehler[suchbegriff] = str(fehler)
+                continue
+
+            if buch_pipeline['Art'] != 'Erfolg':
+                buch_fehler[suchbegriff] = ' '.join(buch_pipeline['Nachricht'].split())
+                continue
+
+            for buch_ergebnis_x in buch_pipeline['Ergebnisse'].values():
+                buch_frames[suchbegriff] = _funk_frame_suchbegriff_erstellen(
+                    arg_suchbegriff=suchbegriff,
+                    arg_buch_ergebnis=buch_ergebnis_x
+                    )
+
+            helpers.funk_drucken(f'Batch: {len(buch_frames) + len(buch_fehler)} von '
+                                 f'{len(liste_suchbegriffe)} Suchbegriffen fertig')
+
+    # Keep the order of the list in the file
+    liste_frames = [buch_frames[x] for x in liste_suchbegriffe if x in buch_frames]
+
+    if len(liste_frames) == 0:
+        return((pandas.DataFrame(columns=['Suchbegriff', 'Ebene']), buch_fehler))
+
+    return((pandas.concat(liste_frames, ignore_index=True), buch_fehler))
+
+
+def funk_suchbegriffe_laden(arg_pfad: str):
+    """Returns the search terms from a text file with one search term per
+    line (empty lines and lines starting with # are skipped).
+
+    Keyword arguments:\n
+    arg_pfad -- Path of the text file
+    """
+    with open(arg_pfad, encoding='utf-8') as datei:
+        liste_suchbegriffe = [zeile_x.strip() for zeile_x in datei]
+
+    return([x for x in liste_suchbegriffe if x != '' and x.startswith('#') == False])
+
+
+def funk_suchbegriffe_normalisieren(arg_liste_suchbegriffe: list):
+    """Returns the search terms in argument arg_liste_suchbegriffe like
+    the Scraper_Worker uses them (without leading and trailing
+    whitespace and in lower case), each one only once and in the order
+    of their first occurrence.
+
+    Keyword arguments:\n
+    arg_liste_suchbegriffe -- List of search terms
+    """
+    return(list(dict.fromkeys(x.strip().lower() for x in arg_liste_suchbegriffe)))
+
+
+
+# %%
+###################################################################################################
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Scrapes and analyzes a list of search terms and writes one Parquet file.'
+        )
+    parser.add_argument('suchbegriffe', help='Text file with one search term per line')
+    parser.add_argument('--ausgabe', default='Batch.parquet', help='Path of the Parquet file')
+    parser.add_argument('--stichprobe', type=int, default=constants.N_DEFAULT_STICHPROBE_AUFTRAG,
+                        help='Number of offers that should be scraped per search term')
+    parser.add_argument('--max-anzeigenalter', type=int,
+                        default=constants.DEFAULT_MAX_ANZEIGENALTER_AUFTRAG,
+                        help='Maximum age of offers (in days)')
+    parser.add_argument('--nur-anzahlen', action='store_true',
+                        help='Only scrape the numbers of offers per state from the first page')
+    parser.add_argument('--threads', type=int, default=constants.N_BATCH_THREADS,
+                        help='Number of search terms which are processed at the same time')
+    parser.add_argument('--daten', default='.',
+                        help='Folder with Buch_Laender.json, Buch_PLZs.json and '
+                             'Geojson_Laender.geojson')
+    parser.add_argument('--url-scraper-api', default=None,
+                        help='URL of the external scraper API or of a local stub server')
+    argumente = parser.parse_args()
+
+    frame_batch, buch_fehler = funk_batch_ausfuehren(
+        arg_liste_suchbegriffe=funk_suchbegriffe_laden(argumente.suchbegriffe),
+        arg_auftrag_stichprobe=min(argumente.stichprobe, constants.N_GRENZE_STICHPROBE_AUFTRAG),
+        arg_auftrag_max_anzeigenalter=min(argumente.max_anzeigenalter,
+                                          constants.GRENZE_ANZEIGENALTER_AUFTRAG),
+        arg_auftrag_nur_anzahlen=argumente.nur_anzahlen,
+        arg_datenkontext=data_context.funk_datenkontext_erstellen(argumente.daten),
+        arg_n_threads=argumente.threads,
+        arg_url_scraper_api=argumente.url_scraper_api
+        )
+
+    frame_batch.to_parquet(argumente.ausgabe, index=False)
+
+    print(f'{frame_batch["Suchbegriff"].nunique()} Suchbegriffe mit {len(frame_batch)} Zeilen '
+          f'in {argumente.ausgabe} geschrieben')
+    for suchbegriff_x, nachricht_x in buch_fehler.items():
+        print(f'Fehlgeschlagen: {suchbegriff_x}: {nachricht_x}')
+
+    if len(buch_fehler) > 0:
+        raise SystemExit(1)
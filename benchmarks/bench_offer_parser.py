@@ -0,0 +1,184 @@
+"""Benchmark for the parsing of result pages of the Kleinanzeigen
+website: previous parsing with per-element cssselect calls on the
+decoded string vs. the parsing engine in offer_parser.py.
+
+Run from the main folder of the repository:\n
+    python benchmarks/bench_offer_parser.py [path_to_html_file ...]
+
+Without arguments a synthetic result page with 25 offers and the "Ort"
+filter is used.
+"""
+
+# %%
+###################################################################################################
+import sys
+import json
+import time
+import pathlib
+import statistics
+
+from lxml import html
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+##################################################
+# Import modules from folder
+import offer_parser
+
+
+# %%
+###################################################################################################
+LAENDER = [
+    'Baden-Württemberg', 'Bayern', 'Berlin', 'Brandenburg', 'Bremen', 'Hamburg', 'Hessen',
+    'Mecklenburg-Vorpommern', 'Niedersachsen', 'Nordrhein-Westfalen', 'Rheinland-Pfalz',
+    'Saarland', 'Sachsen', 'Sachsen-Anhalt', 'Schleswig-Holstein', 'Thüringen'
+    ]
+
+# PLZs of Berlin from Buch_PLZs.json, so the synthetic offers can be enriched with the location data
+# like real ones (e. g. when the pages are replayed through the pipeline, see bench_replay.py)
+with open(pathlib.Path(__file__).resolve().parent.parent / 'Buch_PLZs.json',
+          encoding='utf-8') as datei:
+    LISTE_PLZS_BERLIN = sorted(x for x, y in json.load(datei).items() if y['Land'] == 'Berlin')
+
+
+def funk_seite_erstellen(arg_anzahl_anzeigen: int = 25):
+    """Returns a synthetic result page (as bytes) which mimics the
+    structure of the Kleinanzeigen website.
+
+    Keyword arguments:\n
+    arg_anzahl_anzeigen -- Number of offers on the page
+    """
+    liste_teile = ['<!DOCTYPE html><html><head><meta charset="utf-8"><title>Ergebnisse</title>']
+    liste_teile.extend(f'<script>var x{i} = "{"x" * 400}";</script>' for i in range(30))
+    liste_teile.append('</head><body><header><nav><ul>')
+    liste_teile.extend(f'<li><a href="/k{i}">Kategorie {i}</a></li>' for i in range(80))
+    liste_teile.append('</ul></nav></header><aside>')
+
+    for i in range(12):
+        liste_teile.append(f'<section><h3 class="sectionheadline">Filter {i}</h3><ul>')
+        liste_teile.extend(f'<li><a href="/f{i}-{k}">Option {k}</a> (12)</li>' for k in range(15))
+        liste_teile.append('</ul></section>')
+
+    liste_teile.append('<section><h3 class="sectionheadline">Ort</h3><ul>')
+    liste_teile.extend(
+        f'<li><a href="/l{i}">{land}</a>\n <span>({1000 * (i + 1):,})</span></li>'.\
+            replace(',', '.')
+        for i, land in enumerate(LAENDER)
+        )
+    liste_teile.append('</ul></section></aside><main><ul id="srchrslt-adtable">')
+
+    for i in range(arg_anzahl_anzeigen):
+        plz = LISTE_PLZS_BERLIN[i % len(LISTE_PLZS_BERLIN)]
+        liste_teile.append(f'''
+            <li class="ad-listitem"><article class="aditem" data-adid="{i}"
+                data-href="/s-anzeige/schoener-artikel-nummer-{i}/{1000000 + i}-1-{i}">
+              <div class="aditem-image"><a href="/s-anzeige/{i}"><div class="imagebox"
+                data-imgsrc="https://img.example/{i}.jpg"></div></a></div>
+              <div class="aditem-main">
+                <div class="aditem-main--top">
+                  <div class="aditem-main--top--left"> {plz} Berlin Mitte (3 km)</div>
+                  <div class="aditem-main--top--right"> {(i % 28) + 1:02d}.09.2024</div>
+                </div>
+                <div class="aditem-main--middle">
+                  <h2 class="text-module-begin"><a class="ellipsis" href="/s-anzeige/{i}">
+                    Schöner Artikel Nummer {i}</a></h2>
+                  <p class="aditem-main--middle--description">{"Beschreibung " * 20}</p>
+                  <div class="aditem-main--middle--price-shipping">
+                    <p class="aditem-main--middle--price-shipping--price"> {i * 10} € VB</p>
+                  </div>
+                </div>
+                <div class="aditem-main--bottom"><p class="text-module-end">
+                  <span class="simpletag">Versand möglich</span></p></div>
+              </div>
+            </article></li>''')
+
+    liste_teile.append('</ul></main><footer>')
+    liste_teile.extend(f'<p>Fußzeile {i}</p>' for i in range(50))
+    liste_teile.append('</footer></body></html>')
+
+    return(''.join(liste_teile).encode('utf-8'))
+
+
+def funk_seite_parsen_alt(arg_inhalt: bytes):
+    """Parses a result page like Scraper_Worker did before the parsing
+    engine existed and returns the same instance of offer_parser.Seite.
+
+    Keyword arguments:\n
+    arg_inhalt -- Content of the response as bytes
+    """
+    baum_html = html.fromstring(arg_inhalt.decode('utf-8'))
+    liste_elemente_anzeigen = baum_html.cssselect('article.aditem')
+
+    buch_ort_filter = None
+    for section_x in baum_html.cssselect('section'):
+        for ueberschrift_x in section_x.cssselect('h3.sectionheadline'):
+            if ueberschrift_x.text_content() == 'Ort':
+                buch_ort_filter = {}
+                for land_x in section_x.cssselect('li'):
+                    text = land_x.text_content()
+                    text = text.replace('.', '')
+                    text = text.replace('(', '')
+                    text = text.replace(')', '')
+                    text = text.replace('\n', '')
+
+                    land_str, anzahl_str = text.split()
+                    buch_ort_filter[land_str] = int(anzahl_str)
+                break
+
+    liste_anzeigen = []
+    for x in liste_elemente_anzeigen:
+        liste_anzeigen.append(offer_parser.Anzeige(
+            href=str(x.attrib['data-href']),
+            ort=x.cssselect('div.aditem-main--top--left')[0].text_content().lstrip(),
+            preis=x.cssselect('p.aditem-main--middle--price-shipping--price')[0].\
+                text_content().\
+                lstrip(),
+            zeit=x.cssselect('div.aditem-main--top > div.aditem-main--top--right')[0].\
+                text_content().\
+                lstrip()
+            ))
+
+    return(offer_parser.Seite(liste_anzeigen=liste_anzeigen, buch_ort_filter=buch_ort_filter))
+
+
+def funk_messen(
+        arg_funktion,
+        arg_inhalt: bytes,
+        arg_wiederholungen: int
+        ):
+    """Returns the median time (in milliseconds) of calling the function
+    in argument arg_funktion with argument arg_inhalt.
+
+    Keyword arguments:\n
+    arg_funktion -- Function to measure\n
+    arg_inhalt -- Content of the response as bytes\n
+    arg_wiederholungen -- Number of measured calls
+    """
+    liste_zeiten = []
+    for _ in range(arg_wiederholungen):
+        zeit_start = time.perf_counter()
+        arg_funktion(arg_inhalt)
+        liste_zeiten.append((time.perf_counter() - zeit_start) * 1000)
+
+    return(statistics.median(liste_zeiten))
+
+
+# %%
+###################################################################################################
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        liste_seiten = [(x, pathlib.Path(x).read_bytes()) for x in sys.argv[1:]]
+    else:
+        liste_seiten = [('synthetisch', funk_seite_erstellen())]
+
+    for name_x, inhalt_x in liste_seiten:
+        # Both ways of parsing have to return exactly the same records
+        assert funk_seite_parsen_alt(inhalt_x) == offer_parser.funk_seite_parsen(inhalt_x)
+
+        zeit_alt = funk_messen(funk_seite_parsen_alt, inhalt_x, 200)
+        zeit_neu = funk_messen(offer_parser.funk_seite_parsen, inhalt_x, 200)
+
+        print(f'{name_x} ({len(inhalt_x) / 1024:.0f} KiB):')
+        print(f'    vorher (cssselect je Element): {zeit_alt:.2f} ms pro Seite')
+        print(f'    nachher (offer_parser):        {zeit_neu:.2f} ms pro Seite')
+        print(f'    Faktor:                        {zeit_alt / zeit_neu:.1f}x')
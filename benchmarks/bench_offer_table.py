@@ -0,0 +1,89 @@
+"""Benchmark for storing the scraped offers of one order: previous dict of
+dicts with the duplicate check on a new list of all keys vs.
+offer_table.AnzeigenTabelle.
+
+Run from the main folder of the repository:\n
+    python benchmarks/bench_offer_table.py
+"""
+
+# %%
+###################################################################################################
+import sys
+import time
+import tracemalloc
+import pathlib
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+##################################################
+# Import modules from folder
+import offer_table
+
+
+# %%
+###################################################################################################
+def funk_anzeigen_erstellen(arg_anzahl: int):
+    """Returns a list of synthetic offers (as tuples) in which every
+    offer appears twice like on overlapping result pages.
+
+    Keyword arguments:\n
+    arg_anzahl -- Number of different offers
+    """
+    liste_anzeigen = [
+        (f'/s-anzeige/artikel-{i}/{1000000 + i}-1-{i}', f'{10115 + i % 80000:05d} Ort',
+         f'{i * 10} € VB', '01.09.2024', 1725141600.0)
+        for i in range(arg_anzahl)
+        ]
+    return(liste_anzeigen + liste_anzeigen)
+
+
+def funk_messen(arg_funktion, arg_liste_anzeigen: list):
+    """Returns the result, the time (in milliseconds) and the memory
+    allocated for the result (in KiB) of calling the function in
+    argument arg_funktion.
+
+    Keyword arguments:\n
+    arg_funktion -- Function to measure\n
+    arg_liste_anzeigen -- List from funk_anzeigen_erstellen
+    """
+    tracemalloc.start()
+    zeit_start = time.perf_counter()
+    ergebnis = arg_funktion(arg_liste_anzeigen)
+    zeit = (time.perf_counter() - zeit_start) * 1000
+    speicher = tracemalloc.get_traced_memory()[0] / 1024
+    tracemalloc.stop()
+
+    return(ergebnis, zeit, speicher)
+
+
+def funk_alt(arg_liste_anzeigen: list):
+    """Stores the offers like Scraper_Worker did before."""
+    buch_anzeigen = {}
+    for href_str, ort_str, preis_str, zeit_str, _ in arg_liste_anzeigen:
+        if href_str not in list(buch_anzeigen.keys()):
+            buch_anzeigen[href_str] = {'Preis': preis_str, 'Ort': ort_str, 'Zeit': zeit_str}
+    return(buch_anzeigen)
+
+
+def funk_neu(arg_liste_anzeigen: list):
+    """Stores the offers in an instance of offer_table.AnzeigenTabelle."""
+    tabelle_anzeigen = offer_table.AnzeigenTabelle()
+    for href_str, ort_str, preis_str, zeit_str, zeitstempel in arg_liste_anzeigen:
+        tabelle_anzeigen.funk_hinzufuegen(href_str, ort_str, preis_str, zeit_str, zeitstempel)
+    return(tabelle_anzeigen)
+
+
+# %%
+###################################################################################################
+if __name__ == '__main__':
+    for anzahl_x in [250, 1000, 5000, 10000]:
+        liste_anzeigen = funk_anzeigen_erstellen(anzahl_x)
+
+        buch_anzeigen, zeit_alt, speicher_alt = funk_messen(funk_alt, liste_anzeigen)
+        tabelle_anzeigen, zeit_neu, speicher_neu = funk_messen(funk_neu, liste_anzeigen)
+
+        assert list(buch_anzeigen.keys()) == tabelle_anzeigen.liste_href
+
+        print(f'{anzahl_x} Anzeigen (jede doppelt gefunden):')
+        print(f'    vorher (dict, Liste je Anzeige): {zeit_alt:9.1f} ms, {speicher_alt:7.0f} KiB')
+        print(f'    nachher (AnzeigenTabelle):       {zeit_neu:9.1f} ms, {speicher_neu:7.0f} KiB')
@@ -0,0 +1,123 @@
+"""Benchmark for the location data of the PLZs: previous dict from
+Buch_PLZs.json with one lookup per offer vs. plz_index.PLZIndex with one
+lookup for all offers of an order.
+
+Run from the main folder of the repository:\n
+    python benchmarks/bench_plz_index.py
+"""
+
+# %%
+###################################################################################################
+import sys
+import json
+import time
+import random
+import tracemalloc
+import pathlib
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+##################################################
+# Import modules from folder
+import plz_index
+import offer_table
+
+
+# %%
+###################################################################################################
+ORDNER = pathlib.Path(__file__).resolve().parent.parent
+
+
+def funk_messen(arg_funktion, *args):
+    """Returns the result, the time (in milliseconds) and the memory
+    allocated for the result (in KiB) of calling the function in
+    argument arg_funktion.
+
+    Keyword arguments:\n
+    arg_funktion -- Function to measure\n
+    args -- Arguments for the function
+    """
+    tracemalloc.start()
+    zeit_start = time.perf_counter()
+    ergebnis = arg_funktion(*args)
+    zeit = (time.perf_counter() - zeit_start) * 1000
+    speicher = tracemalloc.get_traced_memory()[0] / 1024
+    tracemalloc.stop()
+
+    return(ergebnis, zeit, speicher)
+
+
+def funk_laden_alt():
+    """Loads Buch_PLZs.json like the user interface did for every session
+    before.
+    """
+    with open(ORDNER / 'Buch_PLZs.json', encoding='utf-8') as datei:
+        return(json.load(datei))
+
+
+def funk_laden_neu():
+    """Opens the compiled index (memory-mapped)."""
+    return(plz_index.PLZIndex(init_pfad_index=ORDNER / 'PLZ_Index'))
+
+
+def funk_tabelle_erstellen(arg_liste_orte: list):
+    """Returns a new instance of offer_table.AnzeigenTabelle with one
+    offer per location in argument arg_liste_orte.
+
+    Keyword arguments:\n
+    arg_liste_orte -- Locations of the offers beginning with the PLZ
+    """
+    tabelle_anzeigen = offer_table.AnzeigenTabelle()
+    for i, ort_x in enumerate(arg_liste_orte):
+        tabelle_anzeigen.funk_hinzufuegen(f'/s-anzeige/{i}', ort_x, '10 €', '01.09.2024', 0.0)
+    return(tabelle_anzeigen)
+
+
+def funk_nachschlagen_alt(
+        arg_tabelle_anzeigen: offer_table.AnzeigenTabelle,
+        arg_buch_plzs: dict
+        ):
+    """Adds the location data with one lookup in the dict per offer like
+    AnzeigenTabelle did before.
+    """
+    for i, ort_x in enumerate(arg_tabelle_anzeigen.liste_ort):
+        eintrag_aus_buch_plzs = arg_buch_plzs[ort_x.split(' ')[0]]
+        land = eintrag_aus_buch_plzs['Land']
+        if land not in arg_tabelle_anzeigen.buch_land_code:
+            arg_tabelle_anzeigen.buch_land_code[land] = len(arg_tabelle_anzeigen.liste_laender)
+            arg_tabelle_anzeigen.liste_laender.append(land)
+        arg_tabelle_anzeigen.array_plz[i] = int(ort_x.split(' ')[0])
+        arg_tabelle_anzeigen.array_land[i] = arg_tabelle_anzeigen.buch_land_code[land]
+        arg_tabelle_anzeigen.array_breitengrad[i] = eintrag_aus_buch_plzs['Breitengrad']
+        arg_tabelle_anzeigen.array_laengengrad[i] = eintrag_aus_buch_plzs['Laengengrad']
+
+
+# %%
+###################################################################################################
+if __name__ == '__main__':
+    # Compiles the index if necessary (not part of the measurement, it is done once per machine)
+    plz_index.funk_plz_index_laden(str(ORDNER))
+
+    buch_plzs, zeit_alt, speicher_alt = funk_messen(funk_laden_alt)
+    index, zeit_neu, speicher_neu = funk_messen(funk_laden_neu)
+
+    print(f'Laden ({len(index)} PLZs, je Sitzung bzw. Prozess):')
+    print(f'    vorher (json.load):     {zeit_alt:9.1f} ms, {speicher_alt:7.0f} KiB')
+    print(f'    nachher (PLZIndex):     {zeit_neu:9.1f} ms, {speicher_neu:7.0f} KiB')
+
+    random.seed(0)
+    liste_plzs = list(buch_plzs.keys())
+
+    for anzahl_x in [100, 1000, 10000]:
+        liste_orte = [f'{random.choice(liste_plzs)} Ort' for _ in range(anzahl_x)]
+
+        tabelle_alt = funk_tabelle_erstellen(liste_orte)
+        tabelle_neu = funk_tabelle_erstellen(liste_orte)
+        _, zeit_alt, _ = funk_messen(funk_nachschlagen_alt, tabelle_alt, buch_plzs)
+        _, zeit_neu, _ = funk_messen(tabelle_neu.funk_orte_hinzufuegen, index)
+
+        assert list(tabelle_alt.funk_zeilen()) == list(tabelle_neu.funk_zeilen())
+
+        print(f'{anzahl_x} Anzeigen nachschlagen:')
+        print(f'    vorher (dict je Anzeige):  {zeit_alt:9.2f} ms')
+        print(f'    nachher (Binaersuche):     {zeit_neu:9.2f} ms')
@@ -0,0 +1,374 @@
+"""Concurrency stress test of the rate limit in the database
+(sqlWorker.funk_sql_tracker_updaten). Several processes with several
+threads each book orders at the same time until the limit is reached.
+Every thread is a session of its own. The test fails if more offers are
+admitted than N_FUER_RATELIMIT allows, if the sum in the database is
+smaller than the admitted offers (or differs from them without leasing
+of quota, see quota_lease.py) or if the limit is not used up (as far as
+the fair shares of the sessions allow it). The latency of the checks,
+the offers per session, the orders admitted from leased quota and the
+metrics of the pools of database connections (see sql_pool.py) are
+printed as well.
+
+With --warteschlange, orders which do not fit wait in the admission
+queue (see FLAGGE_WARTESCHLANGE_RATELIMIT) and a short timeframe should
+be set with --zeitraum. The test fails then if not every order is
+admitted or if the admissions are faster than N_FUER_RATELIMIT per
+timeframe allows.
+
+By default a new file of the embedded SQLite backend is used instead of
+the PostgreSQL database of the web app, the rate limit in it is reset
+first. Run from the main folder of the repository:\n
+    python benchmarks/bench_ratelimit.py [--db-url postgresql://...] [options]
+
+Run with --help for all options.
+"""
+
+# %%
+###################################################################################################
+import os
+import sys
+import math
+import time
+import pathlib
+import tempfile
+import argparse
+import statistics
+import multiprocessing
+import concurrent.futures
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+##################################################
+# Import modules from folder
+import constants
+
+
+# %%
+###################################################################################################
+def _funk_limits_setzen(
+        arg_limit: int,
+        arg_db_url: str,
+        arg_art: str,
+        arg_flagge_leasing: bool,
+        arg_flagge_warteschlange: bool,
+        arg_zeitraum: int
+        ):
+    """Sets the rate limit and the database for the current process. An
+    SQLite URL selects the embedded SQLite backend (SQL_BACKEND).
+
+    Keyword arguments:\n
+    arg_limit -- Value for N_FUER_RATELIMIT\n
+    arg_db_url -- URL of the database\n
+    arg_art -- Value for ART_RATELIMIT\n
+    arg_flagge_leasing -- Value for FLAGGE_QUOTEN_LEASING\n
+    arg_flagge_warteschlange -- Value for
+    FLAGGE_WARTESCHLANGE_RATELIMIT\n
+    arg_zeitraum -- Value for ZEITRAUM_FUER_RATELIMIT
+    """
+    if arg_db_url.startswith('sqlite:///') == True:
+        constants.SQL_BACKEND = 'SQLite'
+        constants.PFAD_SQLITE = arg_db_url[len('sqlite:///'):]
+    else:
+        constants.SQL_BACKEND = 'PostgreSQL'
+        os.environ['DATABASE_URL'] = arg_db_url
+    constants.N_FUER_RATELIMIT = arg_limit
+    constants.ZEITRAUM_FUER_RATELIMIT = arg_zeitraum
+    constants.ART_RATELIMIT = arg_art
+    constants.FLAGGE_QUOTEN_LEASING = arg_flagge_leasing
+    constants.FLAGGE_WARTESCHLANGE_RATELIMIT = arg_flagge_warteschlange
+
+
+def _funk_thread_buchen(
+        arg_n_auftraege: int,
+        arg_stichprobe: int,
+        arg_sitzung_id: str
+        ):
+    """Books up to arg_n_auftraege orders of one session one after
+    another and returns a tuple with the number of admitted offers, the
+    list of the latencies (in seconds) and the list of the times of
+    admission (as timestamps).
+
+    Keyword arguments:\n
+    arg_n_auftraege -- Number of orders of the thread\n
+    arg_stichprobe -- Number of offers per order\n
+    arg_sitzung_id -- Id of the session of the thread
+    """
+    from workers import sqlWorker
+
+    sql_worker = sqlWorker(init_eventmanager=None, init_user_interface=None,
+                           init_sitzung_id=arg_sitzung_id)
+    n_zugelassen = 0
+    liste_latenzen = []
+    liste_zeiten = []
+
+    try:
+        for _ in range(arg_n_auftraege):
+            zeit_start = time.perf_counter()
+            flagge_ausfuehren = sql_worker.funk_sql_tracker_updaten(
+                arg_stichprobe=arg_stichprobe,
+                arg_flagge_abbrechen=False
+                )
+            liste_latenzen.append(time.perf_counter() - zeit_start)
+
+            if flagge_ausfuehren == True:
+                n_zugelassen = n_zugelassen + arg_stichprobe
+                liste_zeiten.append(time.time())
+    finally:
+        sql_worker._funk_sql_session_schliessen()
+
+    return((n_zugelassen, liste_latenzen, liste_zeiten))
+
+
+def _funk_prozess_buchen(
+        arg_i_prozess: int,
+        arg_limit: int,
+        arg_db_url: str,
+        arg_art: str,
+        arg_flagge_leasing: bool,
+        arg_flagge_warteschlange: bool,
+        arg_zeitraum: int,
+        arg_n_threads: int,
+        arg_n_auftraege: int,
+        arg_stichprobe: int
+        ):
+    """Runs _funk_thread_buchen in arg_n_threads threads of a worker
+    process and returns the summed results together with the admitted
+    offers per session, the metrics of the pool, the state of the
+    leased quota of the process and the first and last time of
+    admission.
+
+    Keyword arguments:\n
+    arg_i_prozess -- Number of the process (for the ids of the
+    sessions)\n
+    arg_limit -- Value for N_FUER_RATELIMIT\n
+    arg_db_url -- URL of the database\n
+    arg_art -- Value for ART_RATELIMIT\n
+    arg_flagge_leasing -- Value for FLAGGE_QUOTEN_LEASING\n
+    arg_flagge_warteschlange -- Value for
+    FLAGGE_WARTESCHLANGE_RATELIMIT\n
+    arg_zeitraum -- Value for ZEITRAUM_FUER_RATELIMIT\n
+    arg_n_threads -- Number of threads\n
+    arg_n_auftraege -- Number of orders per thread\n
+    arg_stichprobe -- Number of offers per order
+    """
+    import sql_pool
+    import quota_lease
+    from workers import sqlWorker
+
+    _funk_limits_setzen(arg_limit=arg_limit, arg_db_url=arg_db_url, arg_art=arg_art,
+                        arg_flagge_leasing=arg_flagge_leasing,
+                        arg_flagge_warteschlange=arg_flagge_warteschlange,
+                        arg_zeitraum=arg_zeitraum)
+
+    n_zugelassen = 0
+    liste_latenzen = []
+    liste_zeiten = []
+    buch_sitzungen = {}
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=arg_n_threads) as pool_threads:
+        buch_futures = {
+            f'Sitzung_{arg_i_prozess}_{i_thread_x}': pool_threads.submit(
+                _funk_thread_buchen,
+                arg_n_auftraege,
+                arg_stichprobe,
+                f'Sitzung_{arg_i_prozess}_{i_thread_x}'
+                )
+            for i_thread_x in range(arg_n_threads)
+            }
+
+        for sitzung_id_x, future_x in buch_futures.items():
+            n_thread, liste_latenzen_thread, liste_zeiten_thread = future_x.result()
+            n_zugelassen = n_zugelassen + n_thread
+            liste_latenzen.extend(liste_latenzen_thread)
+            liste_zeiten.extend(liste_zeiten_thread)
+            buch_sitzungen[sitzung_id_x] = n_thread
+
+    buch_metriken = sql_pool.funk_pool_metriken(arg_engine=sqlWorker._funk_sql_engine_erstellen())
+
+    buch_leasing = quota_lease.funk_quoten_leasing_erstellen().funk_zustand()
+
+    return((n_zugelassen, liste_latenzen, buch_sitzungen, buch_metriken, buch_leasing,
+            min(liste_zeiten, default=None), max(liste_zeiten, default=None)))
+
+
+def _funk_tracker_zuruecksetzen():
+    """Deletes the tracker and the bookings of the sliding window, so the
+    test starts with an empty timeframe.
+    """
+    import sqlalchemy
+    from workers import sqlWorker
+    from sql_schema import sqlKlasseTracker
+    from sql_schema import sqlKlasseBuchung
+
+    sql_worker = sqlWorker(init_eventmanager=None, init_user_interface=None)
+    sql_worker._funk_sql_session_schliessen()
+
+    with sql_worker.engine_erstellt.begin() as verbindung:
+        verbindung.execute(sqlalchemy.delete(sqlKlasseTracker.__table__))
+        verbindung.execute(sqlalchemy.delete(sqlKlasseBuchung.__table__))
+
+
+def _funk_tracker_summe_lesen():
+    """Returns the sum of the current timeframe (or of the sliding
+    window) in the database.
+    """
+    import sqlalchemy
+    from workers import sqlWorker
+    from sql_schema import sqlKlasseTracker
+    from sql_schema import sqlKlasseBuchung
+
+    sql_worker = sqlWorker(init_eventmanager=None, init_user_interface=None)
+    sql_worker._funk_sql_session_schliessen()
+
+    if constants.ART_RATELIMIT == 'Fest':
+        anweisung = sqlalchemy.select(sqlKlasseTracker.__table__.c.summe_n_aktuell_in_zeitraum)
+    else:
+        anweisung = sqlalchemy.select(
+            sqlalchemy.func.coalesce(sqlalchemy.func.sum(sqlKlasseBuchung.__table__.c.anzahl), 0)
+            )
+
+    with sql_worker.engine_erstellt.connect() as verbindung:
+        return(verbindung.execute(anweisung).scalar())
+
+
+
+# %%
+###################################################################################################
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Stress test of the rate limit in the database with concurrent orders.'
+        )
+    parser.add_argument('--db-url', default=None,
+                        help='URL of the database (default: a new SQLite file in a temporary '
+                             'folder)')
+    parser.add_argument('--prozesse', type=int, default=4, help='Number of worker processes')
+    parser.add_argument('--threads', type=int, default=8, help='Number of threads per process')
+    parser.add_argument('--auftraege', type=int, default=20,
+                        help='Number of orders per thread')
+    parser.add_argument('--stichprobe', type=int, default=7, help='Number of offers per order')
+    parser.add_argument('--limit', type=int, default=constants.N_FUER_RATELIMIT,
+                        help='Value for N_FUER_RATELIMIT')
+    parser.add_argument('--art', choices=['Gleitend', 'Fest'], default=constants.ART_RATELIMIT,
+                        help='Value for ART_RATELIMIT')
+    parser.add_argument('--ohne-leasing', action='store_true',
+                        help='Check every order in the database (FLAGGE_QUOTEN_LEASING = False, '
+                             'only for --art Fest)')
+    parser.add_argument('--warteschlange', action='store_true',
+                        help='Let orders wait in the admission queue '
+                             '(FLAGGE_WARTESCHLANGE_RATELIMIT = True, only for --art Gleitend)')
+    parser.add_argument('--zeitraum', type=int, default=3600,
+                        help='Value for ZEITRAUM_FUER_RATELIMIT (long enough not to end during '
+                             'the test by default)')
+    argumente = parser.parse_args()
+
+    if argumente.db_url == None:
+        argumente.db_url = 'sqlite:///' + str(
+            pathlib.Path(tempfile.mkdtemp()) / 'Ratelimit_Stress.sqlite3'
+            )
+
+    # Leased quota is only used in fixed timeframes
+    flagge_leasing = argumente.ohne_leasing == False and argumente.art == 'Fest'
+    flagge_warteschlange = argumente.warteschlange == True and argumente.art == 'Gleitend'
+    _funk_limits_setzen(arg_limit=argumente.limit, arg_db_url=argumente.db_url,
+                        arg_art=argumente.art, arg_flagge_leasing=flagge_leasing,
+                        arg_flagge_warteschlange=flagge_warteschlange,
+                        arg_zeitraum=argumente.zeitraum)
+    _funk_tracker_zuruecksetzen()
+
+    n_auftraege = argumente.prozesse * argumente.threads * argumente.auftraege
+    print(f'{n_auftraege} Auftraege mit je {argumente.stichprobe} Anzeigen in '
+          f'{argumente.prozesse} Prozessen mit je {argumente.threads} Threads, '
+          f'Limit {argumente.limit} pro {argumente.zeitraum} s ({argumente.art}'
+          f'{", Warteschlange" if flagge_warteschlange == True else ""})')
+
+    zeit_start = time.perf_counter()
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=argumente.prozesse,
+            mp_context=multiprocessing.get_context('spawn')
+            ) as pool_prozesse:
+        liste_futures = [
+            pool_prozesse.submit(
+                _funk_prozess_buchen,
+                i_prozess_x,
+                argumente.limit,
+                argumente.db_url,
+                argumente.art,
+                flagge_leasing,
+                flagge_warteschlange,
+                argumente.zeitraum,
+                argumente.threads,
+                argumente.auftraege,
+                argumente.stichprobe
+                )
+            for i_prozess_x in range(argumente.prozesse)
+            ]
+        liste_ergebnisse = [x.result() for x in liste_futures]
+    zeit_gesamt = time.perf_counter() - zeit_start
+
+    n_zugelassen = sum(x[0] for x in liste_ergebnisse)
+    liste_latenzen = sorted(y for x in liste_ergebnisse for y in x[1])
+    summe_datenbank = _funk_tracker_summe_lesen()
+    buch_sitzungen = {y: z for x in liste_ergebnisse for y, z in x[2].items()}
+    liste_metriken = [x[3] for x in liste_ergebnisse]
+    n_lokal = sum(x[4]['anzahl_lokal'] for x in liste_ergebnisse)
+    n_leases = sum(x[4]['anzahl_leases'] for x in liste_ergebnisse)
+    liste_zeiten = [y for x in liste_ergebnisse for y in x[5:] if y != None]
+
+    print(f'Zugelassen: {n_zugelassen} Anzeigen, Summe in der Datenbank: {summe_datenbank}')
+    print(f'Dauer: {zeit_gesamt:.2f} s, Latenz Median: '
+          f'{statistics.median(liste_latenzen) * 1000:.2f} ms, 99%: '
+          f'{liste_latenzen[int(len(liste_latenzen) * 0.99) - 1] * 1000:.2f} ms')
+    print(f'Sitzungen: {sum(1 for x in buch_sitzungen.values() if x > 0)} von '
+          f'{len(buch_sitzungen)} mit Anzeigen, pro Sitzung Min: {min(buch_sitzungen.values())}, '
+          f'Max: {max(buch_sitzungen.values())}')
+    if flagge_leasing == True:
+        print(f'Leasing: {n_lokal} Auftraege ohne Datenbank zugelassen, {n_leases} Leases')
+    if flagge_warteschlange == True and len(liste_zeiten) > 0:
+        print(f'Warteschlange: Zulassungen ueber {max(liste_zeiten) - min(liste_zeiten):.2f} s '
+              f'verteilt, Latenz Max: {liste_latenzen[-1]:.2f} s')
+    print(f'Pool ({liste_metriken[0]["pool_klasse"]}): '
+          f'{sum(x["anzahl_checkouts"] for x in liste_metriken)} Checkouts, '
+          f'{sum(x["anzahl_verbindungen_neu"] for x in liste_metriken)} neue Verbindungen, '
+          f'Checkout Mittel: '
+          f'{statistics.mean(x["mittel_checkout_ms"] for x in liste_metriken):.2f} ms, Max: '
+          f'{max(x["max_checkout_ms"] for x in liste_metriken):.2f} ms')
+
+    liste_fehler = []
+    if summe_datenbank > argumente.limit:
+        liste_fehler.append('Mehr Anzeigen gebucht als das Limit erlaubt')
+
+    # With the queue, the orders are admitted over several timeframes and the bookings of the
+    # timeframes which are over are deleted
+    if flagge_warteschlange == True:
+        n_zeitraeume = math.ceil(n_auftraege * argumente.stichprobe / argumente.limit)
+        if n_zugelassen != n_auftraege * argumente.stichprobe:
+            liste_fehler.append('Nicht alle Auftraege aus der Warteschlange zugelassen')
+        if max(liste_zeiten) - min(liste_zeiten) < (n_zeitraeume - 1) * argumente.zeitraum:
+            liste_fehler.append('Auftraege schneller zugelassen als das Limit erlaubt')
+    else:
+        if n_zugelassen > argumente.limit:
+            liste_fehler.append('Mehr Anzeigen zugelassen als das Limit erlaubt')
+        if n_zugelassen > summe_datenbank or (flagge_leasing == False
+                                              and n_zugelassen != summe_datenbank):
+            liste_fehler.append('Summe in der Datenbank passt nicht zu den zugelassenen Anzeigen')
+        # Leased quota which was not used counts as booked until it is given back. In the sliding
+        # window the rest of the limit may be too small for the share of every session with
+        # offers.
+        n_anteil = argumente.limit // max(sum(1 for x in buch_sitzungen.values() if x > 0), 1)
+        flagge_anteile_voll = (argumente.art == 'Gleitend'
+                               and constants.FLAGGE_FAIRER_ANTEIL == True
+                               and all(x > 0 and x + argumente.stichprobe > n_anteil
+                                       for x in buch_sitzungen.values()))
+        if (n_auftraege * argumente.stichprobe >= argumente.limit
+                and argumente.limit - summe_datenbank >= argumente.stichprobe
+                and flagge_anteile_voll == False):
+            liste_fehler.append('Limit nicht ausgeschoepft')
+
+    for fehler_x in liste_fehler:
+        print('FEHLER:', fehler_x)
+
+    if len(liste_fehler) > 0:
+        raise SystemExit(1)
+
+    print('OK')
@@ -0,0 +1,266 @@
+"""End-to-end benchmark of Scraper_Worker against a local stub of the
+external scraper API which replays a recorded fixture corpus (see
+replay.py). Neither the scraper API nor the Kleinanzeigen website are
+contacted and the rate limit in the database is not touched.
+
+A corpus is recorded by setting PFAD_AUFNAHME_KORPUS in constants.py
+and running the web app as usual. Run from the main folder of the
+repository:\n
+    python benchmarks/bench_replay.py path_to_corpus.jsonl.gz [options]
+
+With option --synthetisch a synthetic corpus is written to the path
+first (see bench_offer_parser.py). Run with --help for all options.
+"""
+
+# %%
+###################################################################################################
+import sys
+import time
+import pathlib
+import argparse
+import contextlib
+import statistics
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+##################################################
+# Import modules from folder
+import constants
+import replay
+import data_context
+import pacing
+import offer_table
+from workers import Scraper_Worker
+from eventmanager import Eventmanager
+from bench_offer_parser import funk_seite_erstellen
+
+
+# %%
+###################################################################################################
+class AuftragAbgebrochen(Exception):
+    """Raised instead of stopping the script when the order is aborted
+    (event Vorzeitig_abgebrochen).
+    """
+
+
+class _SqlWorkerOhneLimit:
+    """Replaces sqlWorker, so the benchmark does not touch the rate limit
+    in the database. The stored offers for delta scraping are kept in
+    memory.
+    """
+
+    def __init__(self):
+        """Inits _SqlWorkerOhneLimit."""
+        self.buch_suchbegriffe = {}
+
+
+    def funk_sql_tracker_updaten(self, arg_stichprobe):
+        """Does nothing."""
+        pass
+
+
+    def funk_suchbegriff_laden(self, arg_suchbegriff):
+        """Returns the stored offers like sqlWorker.funk_suchbegriff_laden
+        (without expiry).
+        """
+        eintrag = self.buch_suchbegriffe.get(arg_suchbegriff)
+        if eintrag == None:
+            return(None)
+
+        daten, vollstaendig_ab_stamp = eintrag
+        return({
+            'tabelle_anzeigen': offer_table.AnzeigenTabelle.funk_aus_bytes(daten),
+            'vollstaendig_ab_stamp': vollstaendig_ab_stamp
+            })
+
+
+    def funk_suchbegriff_speichern(self, arg_suchbegriff, arg_tabelle_anzeigen,
+                                   arg_vollstaendig_ab_stamp):
+        """Stores the offers like sqlWorker.funk_suchbegriff_speichern."""
+        self.buch_suchbegriffe[arg_suchbegriff] = (
+            arg_tabelle_anzeigen.funk_zu_bytes(),
+            arg_vollstaendig_ab_stamp
+            )
+
+
+class _UserInterfaceOhneAnzeige:
+    """Replaces UserInterface, so the worker can run without a browser."""
+
+    platzhalter_ausgabe_spinner_02 = contextlib.nullcontext()
+
+
+def funk_abbrechen(arg_art, arg_nachricht):
+    """Subscriber function for event Vorzeitig_abgebrochen.
+
+    Keyword arguments:\n
+    arg_art -- Kind of the message\n
+    arg_nachricht -- Message for the user
+    """
+    raise AuftragAbgebrochen(' '.join(arg_nachricht.split()))
+
+
+def funk_synthetischen_korpus_schreiben(
+        arg_pfad: str,
+        arg_scraper_worker: Scraper_Worker,
+        arg_anzahl_seiten: int
+        ):
+    """Writes a synthetic fixture corpus with full result pages for the
+    URLs which are requested by the worker in argument
+    arg_scraper_worker for its current order.
+
+    Keyword arguments:\n
+    arg_pfad -- Path of the fixture corpus\n
+    arg_scraper_worker -- Instance of Scraper_Worker with the order\n
+    arg_anzahl_seiten -- Number of pages with offers (followed by one
+    empty page)
+    """
+    pathlib.Path(arg_pfad).unlink(missing_ok=True)
+    rekorder = replay.KorpusRekorder(init_pfad=arg_pfad)
+
+    for seite_i in range(0, arg_anzahl_seiten + 1):
+        if seite_i < arg_anzahl_seiten:
+            # Every page needs offers of its own, otherwise they are removed as duplicates
+            inhalt = funk_seite_erstellen().replace(
+                b'data-href="/s-anzeige/',
+                f'data-href="/s-anzeige/seite-{seite_i}-'.encode('utf-8')
+                )
+        else:
+            inhalt = funk_seite_erstellen(arg_anzahl_anzeigen=0)
+
+        rekorder.funk_aufnehmen(
+            arg_url=arg_scraper_worker._funk_payload_erstellen(arg_seite_i=seite_i)['url'],
+            arg_status=200,
+            arg_inhalt=inhalt
+            )
+
+
+# %%
+###################################################################################################
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('korpus', help='Path of the fixture corpus')
+    parser.add_argument('--synthetisch', type=int, default=None, metavar='SEITEN',
+                        help='Write a synthetic corpus with this number of pages first')
+    parser.add_argument('--suchbegriff', default='fahrrad')
+    parser.add_argument('--stichprobe', type=int, default=constants.N_DEFAULT_STICHPROBE_AUFTRAG)
+    parser.add_argument('--max-anzeigenalter', type=int, default=100000,
+                        help='Maximum age of offers in days')
+    parser.add_argument('--parallel', type=int, default=constants.N_PARALLELE_SEITENABFRAGEN,
+                        help='Value for N_PARALLELE_SEITENABFRAGEN')
+    parser.add_argument('--rate', type=float, default=constants.TAKT_RATE_START,
+                        help='Value for TAKT_RATE_START (requests per second)')
+    parser.add_argument('--kein-strom', action='store_true',
+                        help='Set FLAGGE_STROM_PARSEN to False')
+    parser.add_argument('--kein-delta', action='store_true',
+                        help='Set FLAGGE_DELTA_SCHUERFEN to False (otherwise every run after the '
+                             'first one is a repeat order)')
+    parser.add_argument('--latenz', type=float, default=0.5, help='Mean latency in seconds')
+    parser.add_argument('--streuung', type=float, default=0.2,
+                        help='Maximum deviation from the mean latency in seconds')
+    parser.add_argument('--bandbreite', type=int, default=None, help='Bytes per second')
+    parser.add_argument('--fehlerquote', type=float, default=0.0,
+                        help='Share of requests answered with an injected error')
+    parser.add_argument('--fehler-status', type=int, default=418)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--wiederholungen', type=int, default=5)
+    argumente = parser.parse_args()
+
+    constants.N_PARALLELE_SEITENABFRAGEN = argumente.parallel
+    constants.TAKT_RATE_START = argumente.rate
+    constants.PFAD_TAKT_ZUSTAND = None
+    constants.FLAGGE_STROM_PARSEN = not argumente.kein_strom
+    constants.FLAGGE_ANTWORT_CACHE = False
+    constants.FLAGGE_DELTA_SCHUERFEN = not argumente.kein_delta
+
+    ergebnisse = {}
+
+    def funk_ergebnis_merken(**kwargs):
+        """Subscriber function for event Fertig_geschuerft."""
+        ergebnisse.update(kwargs)
+
+    eventmanager = Eventmanager()
+    eventmanager.funk_abonnent_hinzufuegen(
+        arg_event_name='Fertig_geschuerft',
+        arg_abonnent=funk_ergebnis_merken,
+        arg_argumente_vom_abonnieren={}
+        )
+    eventmanager.funk_abonnent_hinzufuegen(
+        arg_event_name='Vorzeitig_abgebrochen',
+        arg_abonnent=funk_abbrechen,
+        arg_argumente_vom_abonnieren={}
+        )
+
+    scraper_worker = Scraper_Worker(
+        init_eventmanager=eventmanager,
+        init_sql_worker=_SqlWorkerOhneLimit(),
+        init_user_interface=_UserInterfaceOhneAnzeige(),
+        init_datenkontext=data_context.funk_datenkontext_erstellen()
+        )
+
+    if argumente.synthetisch != None:
+        scraper_worker.suchbegriff = argumente.suchbegriff
+        scraper_worker.stichprobe = argumente.stichprobe
+        scraper_worker._funk_url_parameter_setzen()
+        funk_synthetischen_korpus_schreiben(
+            arg_pfad=argumente.korpus,
+            arg_scraper_worker=scraper_worker,
+            arg_anzahl_seiten=argumente.synthetisch
+            )
+
+    replay_server = replay.ReplayServer(
+        init_buch_korpus=replay.funk_korpus_laden(argumente.korpus),
+        init_latenz_sekunden=argumente.latenz,
+        init_latenz_streuung=argumente.streuung,
+        init_bytes_pro_sekunde=argumente.bandbreite,
+        init_fehlerquote=argumente.fehlerquote,
+        init_fehler_status=argumente.fehler_status,
+        init_seed=argumente.seed
+        )
+    scraper_worker.url_scraper_api = replay_server.funk_starten()
+
+    liste_zeiten = []
+    liste_anzeigen = []
+    anzahl_abgebrochen = 0
+
+    try:
+        for lauf_i in range(argumente.wiederholungen):
+            replay_server.funk_zuruecksetzen()
+            ergebnisse.clear()
+
+            # Every run starts with a fresh pacing
+            pacing.funk_taktgeber_erstellen.clear()
+
+            zeit_start = time.perf_counter()
+            try:
+                scraper_worker.funk_auftrag_annehmen(
+                    arg_auftrag_suchbegriff=argumente.suchbegriff,
+                    arg_auftrag_stichprobe=argumente.stichprobe,
+                    arg_auftrag_max_anzeigenalter=argumente.max_anzeigenalter
+                    )
+                status = 'ok'
+            except AuftragAbgebrochen as fehler:
+                anzahl_abgebrochen += 1
+                status = f'abgebrochen ({fehler})'
+            zeit = time.perf_counter() - zeit_start
+
+            anzahl_anzeigen = len(ergebnisse.get('arg_auftrag_tabelle_anzeigen', ()))
+            liste_zeiten.append(zeit)
+            liste_anzeigen.append(anzahl_anzeigen)
+
+            buch_takt = pacing.funk_taktgeber_erstellen().funk_zustand()
+
+            print(f'Lauf {lauf_i + 1}: {zeit:.2f} s, {anzahl_anzeigen} Anzeigen, '
+                  f'{replay_server.anzahl_anfragen} Anfragen, '
+                  f'{replay_server.anzahl_fehler} injizierte Fehler, '
+                  f'Rate am Ende {buch_takt["rate"]:.2f} Anfragen pro s, {status}')
+
+    finally:
+        replay_server.funk_stoppen()
+
+    liste_zeiten_sortiert = sorted(liste_zeiten)
+    p95 = liste_zeiten_sortiert[min(len(liste_zeiten) - 1, int(0.95 * len(liste_zeiten)))]
+
+    print(f'Auftraege:       {len(liste_zeiten)} ({anzahl_abgebrochen} abgebrochen)')
+    print(f'Latenz Median:   {statistics.median(liste_zeiten):.2f} s pro Auftrag')
+    print(f'Latenz p95:      {p95:.2f} s pro Auftrag')
+    print(f'Durchsatz:       {sum(liste_anzeigen) / sum(liste_zeiten):.1f} Anzeigen pro s')
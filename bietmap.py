@@ -20,56 +20,29 @@ with streamlit.spinner('''Bitte warte einen Moment, bis der Server aufgewacht is
     # Import modules from folder
     import helpers
     import constants
-    from sql_schema import sql_basis
-    from sql_schema import sqlKlasseTracker
-    from workers import sqlWorker
-    from workers import ScraperWorker
-    from workers import AnalyzerWorker
+    import job_queue
     from eventmanager import Eventmanager
     from user_interface import UserInterface
 
 
 # %%
 ###################################################################################################
-# Create eventmanager object which organizes most of the communication between the user_interface,
-# scraper_worker and analyzer_worker object
+# Create eventmanager object which organizes most of the communication between the user_interface
+# and the job queue
 eventmanager = Eventmanager()
 
-# Create objects for each distinct task (i. e. displaying UI, scraping, analyzing).
+# Create the object for displaying the UI. Scraping and analyzing are done by the scraper_worker and
+# analyzer_worker objects in the worker processes of the job queue (see job_queue.py).
 user_interface = UserInterface(init_eventmanager=eventmanager)
 user_interface.funk_einrichten()
 
 with user_interface.platzhalter_ausgabe_spinner_01:
     with streamlit.spinner('Bitte warte, bis ich verschwunden bin, bevor du weitermachst!'):
-        sql_worker = sqlWorker(
-            init_eventmanager=eventmanager,
-            init_user_interface=user_interface
-            )
-
-        scraper_worker = ScraperWorker(
-            init_eventmanager=eventmanager,
-            init_sql_worker=sql_worker,
-            init_user_interface=user_interface
-            )
-
-        analyzer_worker = AnalyzerWorker(
-            init_eventmanager=eventmanager,
-            init_user_interface=user_interface
-            )
+        # Create the job queue shared by all users (only in the first run after starting the web
+        # app)
+        job_queue.funk_job_warteschlange_erstellen()
 
         # Add different events and subscriber functions to the Eventmanager object
-        eventmanager.funk_abonnent_hinzufuegen(
-            arg_event_name='Button_gedrueckt',
-            arg_abonnent=scraper_worker.funk_auftrag_annehmen,
-            arg_argumente_vom_abonnieren={}
-            )
-
-        eventmanager.funk_abonnent_hinzufuegen(
-            arg_event_name='Fertig_geschuerft',
-            arg_abonnent=analyzer_worker.funk_auftrag_annehmen,
-            arg_argumente_vom_abonnieren={}
-            )
-
         eventmanager.funk_abonnent_hinzufuegen(
             arg_event_name='Fertig_analysiert',
             arg_abonnent=user_interface.funk_feedback_ausgeben,
@@ -100,7 +73,7 @@ with user_interface.platzhalter_ausgabe_spinner_01:
             arg_argumente_vom_abonnieren={}
             )
         
-        # komdoku: Check whether there are open jobs
+        # komdoku: Check whether there are open jobs (submit new orders, collect finished ones)
         user_interface.funk_jobs_pruefen()
         
         # komdoku: Clean up
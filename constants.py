@@ -11,9 +11,209 @@ PFAD_DB_LOKAL = ''
 # Key for scraperapi
 SCHLUESSEL = ''
 
-# Average seconds to sleep between scraping of two pages of the Kleinanzeigen website
+# URL of the external scraper API
+URL_SCRAPER_API = ''
+
+# Number of offers on one single page of the Kleinanzeigen website
+ANZEIGEN_PRO_SEITE = 25
+
+# Average seconds between two requests to the Kleinanzeigen website as long as no safe rate was
+# observed (see TAKT_RATE_START)
 SCHLAFEN_SEKUNDEN = 3
 
+# Maximum number of pages of the Kleinanzeigen website which are requested at the same time in one
+# single order (1 means that the pages are requested strictly one after another)
+N_PARALLELE_SEITENABFRAGEN = 3
+
+# Switch for parsing the pages while they are still being downloaded, so the transfer can be
+# aborted as soon as enough offers are scraped (only for N_PARALLELE_SEITENABFRAGEN = 1)
+FLAGGE_STROM_PARSEN = True
+
+# Size of the chunks in which the pages are read when parsing while downloading (in bytes)
+STROM_CHUNK_BYTES = 16*1024
+
+
+##################################################
+# Adaptive pacing of the requests to the Kleinanzeigen website with a token bucket (shared by all
+# users, see pacing.py)
+
+# Rate (requests per second) as long as no safe rate was observed
+TAKT_RATE_START = 1/SCHLAFEN_SEKUNDEN
+
+# Lower and upper boundary for the rate (requests per second)
+TAKT_RATE_MIN = 0.05
+TAKT_RATE_MAX = 2
+
+# Additive increase of the rate after every successful request (requests per second)
+TAKT_RATE_SCHRITT = 0.02
+
+# Factor for the rate after a block (status code 418, 429 or 5xx)
+TAKT_FAKTOR_BLOCKIERUNG = 0.5
+
+# Maximum number of requests which may be sent at once after idle time (size of the token bucket)
+TAKT_KAPAZITAET = 2
+
+# Backoff after the first block, which doubles with every further block in a row (in seconds)
+TAKT_BACKOFF_BASIS_SEKUNDEN = 4
+
+# Upper boundary for the backoff (in seconds)
+TAKT_BACKOFF_MAX_SEKUNDEN = 120
+
+# Number of successful requests in a row after which the current rate is recorded as safe
+TAKT_N_ERFOLGE_SICHER = 10
+
+# Path of the JSON file in which the safe rate is stored across restarts (None means not stored)
+PFAD_TAKT_ZUSTAND = 'Taktgeber_Zustand.json'
+
+# Minimum seconds between two writes of the JSON file after a higher safe rate was recorded (a
+# lower safe rate after a block is always written at once)
+TAKT_SEKUNDEN_SPEICHERN = 30
+
+# Number of tries for one single page which is blocked before the order is aborted
+N_VERSUCHE_BLOCKIERUNG = 3
+
+
+##################################################
+# Process-wide HTTP client for the requests to the external scraper API (shared by all users)
+
+# Maximum number of keep-alive connections in the pool per host
+HTTP_POOL_GROESSE = 10
+
+# Timeout for establishing a connection (in seconds)
+HTTP_TIMEOUT_VERBINDUNG = 10
+
+# Timeout for waiting for the response after the connection was established (in seconds)
+HTTP_TIMEOUT_LESEN = 70
+
+
+##################################################
+# Database with the rate limit, the admission queue and the stored offers
+
+# Backend of the database: 'PostgreSQL' uses the database in the environment variable DATABASE_URL
+# (or from PFAD_DB_LOKAL on the machine with LOKALE_IP), 'SQLite' uses an embedded file in WAL mode
+# which needs no external service (for the processes on one machine, e. g. for development and
+# benchmarks)
+SQL_BACKEND = 'PostgreSQL'
+
+# Path of the SQLite file (only for SQL_BACKEND = 'SQLite')
+PFAD_SQLITE = 'Bietmap.sqlite3'
+
+# Seconds to wait for the lock of the SQLite file while another connection writes to it
+SQLITE_TIMEOUT_SEKUNDEN = 30
+
+
+##################################################
+# Process-wide pool of connections to the database with the rate limit and the stored offers
+# (shared by all users, see sql_pool.py)
+
+# Class of the pool: 'QueuePool' keeps connections open for the next orders, 'NullPool' opens and
+# closes a connection for every single use
+SQL_POOL_KLASSE = 'QueuePool'
+
+# Number of connections which are kept open in the pool
+SQL_POOL_GROESSE = 5
+
+# Number of additional connections which may be opened if all connections in the pool are in use
+# (they are closed when they are given back)
+SQL_POOL_UEBERLAUF = 10
+
+# Seconds to wait for a free connection if the pool and the overflow are used up
+SQL_POOL_TIMEOUT_SEKUNDEN = 30
+
+# Switch for testing every connection before it is taken from the pool (connections which were
+# closed by the database are replaced then)
+SQL_POOL_PRE_PING = True
+
+# Seconds after which a connection in the pool is replaced by a new one
+SQL_POOL_RECYCLE_SEKUNDEN = 1800
+
+# Timeout for every SQL statement (in milliseconds, only for PostgreSQL, None means no timeout)
+SQL_STATEMENT_TIMEOUT_MS = 5000
+
+# Minimum seconds between two log messages with the metrics and the usage of the pool (written on
+# a checkout, None means no log messages)
+SQL_POOL_SEKUNDEN_PROTOKOLL = 300
+
+
+##################################################
+# Local cache for scraped pages of the Kleinanzeigen website (shared by all users). Pages from the
+# cache are neither requested again nor counted for the rate limit.
+
+# Switch for using the cache
+FLAGGE_ANTWORT_CACHE = True
+
+# Path of the SQLite file for the cache
+PFAD_ANTWORT_CACHE = 'Antwort_Cache.sqlite3'
+
+# Seconds after which a cached page expires
+TTL_SEKUNDEN_ANTWORT_CACHE = 600
+
+# Upper boundary for the size of all cached pages (in bytes)
+MAX_BYTES_ANTWORT_CACHE = 200*1024*1024
+
+
+##################################################
+# Record/replay of the responses of the external scraper API for offline benchmarks (see replay.py
+# and benchmarks/bench_replay.py)
+
+# Path of the compressed fixture corpus into which every response is recorded (None means that
+# nothing is recorded)
+PFAD_AUFNAHME_KORPUS = None
+
+
+##################################################
+# Delta scraping: the offers of every search term are stored in the database, so a repeat order only
+# requests the pages with offers which are newer than the stored ones
+
+# Switch for delta scraping
+FLAGGE_DELTA_SCHUERFEN = True
+
+# Seconds after which the stored offers of a search term are not used anymore
+TTL_SEKUNDEN_DELTA = 3600
+
+# Number of stored offers in a row after which the rest of the offers is taken from the database
+# (more than one, because sticky TOP offers are shown above the new ones)
+N_BEKANNTE_ANZEIGEN_DELTA = 3
+
+# Upper boundary for the number of stored offers per search term
+MAX_ANZEIGEN_DELTA = 1000
+
+
+##################################################
+# Local job queue which processes the orders of all users in a pool of worker processes, so the
+# script thread of a session is not blocked (see job_queue.py)
+
+# Number of worker processes (None means one per CPU core). Every worker process paces its requests
+# with a Taktgeber of its own, which gets an equal share of the TAKT_* rates and of the capacity.
+N_JOB_PROZESSE = None
+
+# Upper boundary for the number of orders which are waiting or being processed (summed over all
+# users)
+MAX_JOBS_WARTESCHLANGE = 20
+
+# Seconds between two checks of the status of an open order by the UI
+JOB_ABFRAGE_SEKUNDEN = 1
+
+# Seconds after which the results of a finished order are deleted if they were not collected
+TTL_SEKUNDEN_JOB = 900
+
+
+##################################################
+# Batch mode which processes a list of search terms without the web app and writes the results into
+# one Parquet file (see batch.py)
+
+# Number of search terms which are processed at the same time. All of them share the pacing and the
+# rate limit with the web app.
+N_BATCH_THREADS = 4
+
+# Seconds to wait before checking the rate limit again if it is reached and the time until the
+# order is allowed is not known
+BATCH_WARTEN_SEKUNDEN = 10
+
+# Maximum number of clusters into which the search terms are divided by their regional profile when
+# the numbers of offers of many search terms are analyzed at once (see count_matrix.py)
+N_MATRIX_CLUSTER = 4
+
 
 ##################################################
 # Limiting the number of pages which can be scraped in a specific timeframe (summed over all active
@@ -26,6 +226,38 @@ ZEITRAUM_FUER_RATELIMIT = 180
 # users)
 N_FUER_RATELIMIT = 200
 
+# Kind of the rate limit: 'Gleitend' sums the offers of the last ZEITRAUM_FUER_RATELIMIT seconds
+# for every order (sliding window, see table Tabelle_Buchungen), 'Fest' sums them in fixed
+# timeframes on the tracker (allows up to twice N_FUER_RATELIMIT around the end of a timeframe).
+# The two kinds are mutually exclusive in their features: only 'Gleitend' knows the sessions of the
+# orders, so FLAGGE_FAIRER_ANTEIL and FLAGGE_WARTESCHLANGE_RATELIMIT only work with it, and only
+# 'Fest' can admit orders from leased quota without the database (FLAGGE_QUOTEN_LEASING).
+# 'Gleitend' is the default on purpose: a fair share for every user and the admission queue are
+# worth one transaction with a few statements per order, since every order sends at least one
+# request to the Kleinanzeigen website anyway. 'Fest' with leasing suits a single user with many
+# small orders (e. g. the batch mode on its own machine).
+ART_RATELIMIT = 'Gleitend'
+
+# Switch for limiting every session (user of the web app, batch mode, ...) to an equal share of
+# N_FUER_RATELIMIT among all sessions with orders in the sliding window, so one session cannot use
+# up the rate limit for all others (only for ART_RATELIMIT = 'Gleitend')
+FLAGGE_FAIRER_ANTEIL = True
+
+# Switch for leasing blocks of the rate limit: every process books a block of offers on the tracker
+# in the database at once and admits the following orders from it without a round trip to the
+# database. Quota which is not used is given back as soon as SEKUNDEN_QUOTEN_LEASING are over or
+# the process ends, until then it cannot be used by other processes (only for ART_RATELIMIT =
+# 'Fest', since the blocks do not belong to a session, i. e. it has no effect with the default
+# 'Gleitend', see there).
+FLAGGE_QUOTEN_LEASING = True
+
+# Number of offers which are leased at once (at least the number of offers of the order)
+N_QUOTEN_LEASING_BLOCK = 50
+
+# Seconds after which leased quota which was not used is given back (a lease always ends with the
+# timeframe of the rate limit in which it was booked)
+SEKUNDEN_QUOTEN_LEASING = 30
+
 # Upper boundary for the number of offers which can be scraped in one single order, i. e. upper
 # boundary of the sample size
 N_GRENZE_STICHPROBE_AUFTRAG = 100
@@ -39,3 +271,50 @@ N_DEFAULT_STICHPROBE_AUFTRAG = 25
 # Default setting in the UI for the age of offers which should be included in the scraped sample
 # (in days)
 DEFAULT_MAX_ANZEIGENALTER_AUFTRAG = 365
+
+
+##################################################
+# Admission queue in the database: orders which do not fit into the rate limit wait for their turn
+# instead of being aborted (shared by all processes, only for ART_RATELIMIT = 'Gleitend')
+
+# Switch for the admission queue
+FLAGGE_WARTESCHLANGE_RATELIMIT = True
+
+# Order of the waiting orders: 'FIFO' by the time of entering the queue, 'Fair' first the orders of
+# the sessions with the fewest offers in the sliding window (then by the time of entering)
+REIHENFOLGE_WARTESCHLANGE = 'Fair'
+
+# Upper boundary for the waiting time of an order (in seconds). Orders which would have to wait
+# longer are aborted at once.
+MAX_SEKUNDEN_WARTESCHLANGE = 120
+
+# Seconds between two checks of a waiting order
+SEKUNDEN_WARTESCHLANGE_ABFRAGE = 1
+
+# Seconds after which a waiting order which was not checked anymore (e. g. because its process
+# ended) is removed from the queue
+SEKUNDEN_WARTESCHLANGE_VERWAIST = 10
+
+
+##################################################
+# Levels of detail of the borders of the states in the maps: the borders are simplified once per
+# process for every level (together, so neighbouring states keep their common borders)
+
+# Tolerances of the levels of detail (in degrees, 0 means the original borders)
+TOLERANZEN_GEOMETRIE = {'Original': 0, 'Fein': 0.002, 'Mittel': 0.005, 'Grob': 0.01}
+
+# Grid to which the coordinates of the simplified borders are rounded (in degrees, None means no
+# rounding)
+RASTER_GEOMETRIE = 0.0001
+
+# Level of detail of the borders in the map with the ANZEIGENQUOTE_TOTAL
+STUFE_GEOMETRIE_KARTE_ANZEIGENQUOTE = 'Grob'
+
+
+##################################################
+# Process-wide cache for the rendered plots (heatmap, clustermap and scatterplots) in memory, keyed
+# by a hash of their input data, so identical input data is never rendered twice (see
+# figure_cache.py)
+
+# Upper boundary for the size of all cached plots (in bytes, 0 means that nothing is cached)
+MAX_BYTES_BILD_CACHE = 50*1024*1024
@@ -0,0 +1,430 @@
+"""This module contains the engine which gathers the numbers of offers
+per state (from the filter "Ort" on the first page, like a counts-only
+order) for a large list of search terms at the same time and analyzes
+all of them at once in one matrix with one row per search term and one
+column per state. Unlike the batch mode, no AnalyzerWorker is run per
+search term: the rates per inhabitant, the expected numbers, the
+chi-square tests and the clusters of the regional profiles are computed
+for all search terms together. Run from the main folder of the
+repository, e. g.:\n
+    python count_matrix.py Suchbegriffe.txt --ausgabe Matrix.parquet
+
+The text file contains one search term per line. Run with --help for
+all options. The Parquet file contains one row per search term with the
+columns of AnzahlenMatrix.funk_bericht_erstellen.
+
+Classes:\n
+    AnzahlenMatrix -- An instance of this class holds the numbers of
+    offers per state of many search terms and analyzes all of them at
+    once.
+
+Functions:\n
+    funk_anzahlen_sammeln -- Gathers the numbers of offers per state for
+    a list of search terms and returns an instance of AnzahlenMatrix.
+"""
+
+# %%
+###################################################################################################
+import argparse
+import concurrent.futures
+
+import numpy
+import pandas
+import scipy.stats
+import scipy.cluster.hierarchy
+
+##################################################
+# Import modules from folder
+import helpers
+import constants
+import batch
+import pipeline
+import data_context
+from data_context import Datenkontext
+from aggregation import LaenderKern
+from workers import Scraper_Worker
+from eventmanager import Eventmanager
+
+
+# %%
+###################################################################################################
+class AnzahlenMatrix:
+    """An instance of this class holds the numbers of offers per state of
+    many search terms in one NumPy matrix and analyzes all of them at
+    once. The calculations are the same as in AnalyzerWorker for a single
+    order.
+
+    Attributes:\n
+        liste_suchbegriffe -- Search terms in the order of the rows\n
+        liste_laender -- Names of the 16 states in the order of the
+        columns\n
+        matrix -- NumPy array (int64) with the numbers of offers
+        (Anzeigenanzahl_total) with shape (search terms, states)\n
+        einwohnerzahl -- NumPy array with the inhabitant numbers of the
+        states\n
+        gewicht_einwohnerzahl -- NumPy array with the shares of the
+        states in the inhabitants of germany\n
+        laender_kern -- Instance of LaenderKern which computes the rates
+        and the expected numbers for all search terms at once
+
+    Public methods:\n
+        funk_quoten -- Returns the offers per million inhabitants.\n
+        funk_erwartet -- Returns the expected numbers of offers.\n
+        funk_chi_quadrat -- Returns the chi-square tests of all search
+        terms.\n
+        funk_cluster -- Returns the cluster of every search term.\n
+        funk_bericht_erstellen -- Returns a dataframe with one row per
+        search term.\n
+        funk_zu_frame -- Returns a dataframe with one row per search
+        term and state.
+    """
+
+    def __init__(
+            self,
+            init_liste_suchbegriffe: list,
+            init_matrix: numpy.ndarray,
+            init_buch_laender: dict
+            ):
+        """Inits AnzahlenMatrix.
+
+        Keyword arguments:\n
+        init_liste_suchbegriffe -- Search terms in the order of the rows\n
+        init_matrix -- Numbers of offers with shape (search terms,
+        states), the columns in the order of init_buch_laender\n
+        init_buch_laender -- Dict with the external data of the 16 states
+        as loaded from Buch_Laender.json
+        """
+        self.laender_kern = LaenderKern(init_buch_laender=init_buch_laender)
+        self.liste_suchbegriffe = list(init_liste_suchbegriffe)
+        self.liste_laender = self.laender_kern.liste_laender
+        self.matrix = numpy.asarray(init_matrix, dtype=numpy.int64).reshape(
+            len(self.liste_suchbegriffe), len(self.liste_laender)
+            )
+        self.einwohnerzahl = self.laender_kern.einwohnerzahl
+        self.gewicht_einwohnerzahl = self.laender_kern.gewicht_einwohnerzahl
+
+
+    def __len__(self):
+        """Returns the number of search terms."""
+        return(len(self.liste_suchbegriffe))
+
+
+    def funk_quoten(self):
+        """Returns the offers per million inhabitants
+        (ANZEIGENQUOTE_TOTAL) with the shape of attribute matrix.
+        """
+        return(self.laender_kern.funk_quoten(self.matrix))
+
+
+    def funk_erwartet(self):
+        """Returns the expected numbers of offers
+        (Anzeigenanzahl_total_erwartet) with the shape of attribute
+        matrix, i. e. the offers of every search term distributed over
+        the states according to their inhabitants.
+        """
+        return(self.laender_kern.funk_erwartet(self.matrix))
+
+
+    def funk_chi_quadrat(self):
+        """Returns a dataframe with the search terms as index and the
+        chi-square test of every search term in columns 'Freiheitsgrade',
+        'Stichprobe', 'Chi_Quadrat' and 'p_Wert' (NaN for search terms
+        without offers).
+        """
+        stichprobe = self.matrix.sum(axis=1)
+        erwartet = self.funk_erwartet()
+        freiheitsgrade = len(self.liste_laender) - 1
+
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            chi_quadrat = ((self.matrix - erwartet) ** 2 / erwartet).sum(axis=1)
+        chi_quadrat[stichprobe == 0] = numpy.nan
+
+        frame_chi_quadrat = pandas.DataFrame(
+            {
+                'Freiheitsgrade': freiheitsgrade,
+                'Stichprobe': stichprobe,
+                'Chi_Quadrat': chi_quadrat,
+                'p_Wert': scipy.stats.chi2.sf(chi_quadrat, freiheitsgrade)
+                },
+            index=pandas.Index(self.liste_suchbegriffe, name='Suchbegriff')
+            )
+
+        return(frame_chi_quadrat)
+
+
+    def funk_cluster(self, arg_n_cluster: int = constants.N_MATRIX_CLUSTER):
+        """Returns a NumPy array with the cluster (1 to arg_n_cluster) of
+        every search term. Search terms are clustered by their regional
+        profile, i. e. the logarithm of the observed divided by the
+        expected numbers per state, so the clusters do not depend on how
+        many offers a search term has. Search terms without offers get
+        cluster 0.
+
+        Keyword arguments:\n
+        arg_n_cluster -- Maximum number of clusters
+        """
+        cluster = numpy.zeros(len(self), dtype=numpy.int64)
+        maske = self.matrix.sum(axis=1) > 0
+
+        if maske.sum() < 2:
+            cluster[maske] = 1
+            return(cluster)
+
+        # Half an offer is added, so states without offers do not lead to log(0)
+        profile = numpy.log(
+            (self.matrix[maske] + 0.5) / (self.funk_erwartet()[maske] + 0.5)
+            )
+
+        verknuepfung = scipy.cluster.hierarchy.linkage(profile, method='ward')
+        cluster[maske] = scipy.cluster.hierarchy.fcluster(
+            verknuepfung, t=arg_n_cluster, criterion='maxclust'
+            )
+
+        return(cluster)
+
+
+    def funk_bericht_erstellen(self, arg_n_cluster: int = constants.N_MATRIX_CLUSTER):
+        """Returns a dataframe with the search terms as index, the
+        chi-square tests (see funk_chi_quadrat), column 'Cluster' (see
+        funk_cluster) and one column per state with the numbers of
+        offers.
+
+        Keyword arguments:\n
+        arg_n_cluster -- Maximum number of clusters
+        """
+        frame_bericht = self.funk_chi_quadrat()
+        frame_bericht['Cluster'] = self.funk_cluster(arg_n_cluster=arg_n_cluster)
+
+        frame_laender = pandas.DataFrame(
+            self.matrix,
+            index=frame_bericht.index,
+            columns=self.liste_laender
+            )
+
+        return(frame_bericht.join(frame_laender))
+
+
+    def funk_zu_frame(self):
+        """Returns a dataframe with one row per search term and state and
+        columns 'Suchbegriff', 'Land', 'Anzeigenanzahl_total',
+        'Anzeigenanzahl_total_erwartet' and 'ANZEIGENQUOTE_TOTAL'.
+        """
+        frame = pandas.DataFrame({
+            'Suchbegriff': numpy.repeat(self.liste_suchbegriffe, len(self.liste_laender)),
+            'Land': numpy.tile(self.liste_laender, len(self)),
+            'Anzeigenanzahl_total': self.matrix.ravel(),
+            'Anzeigenanzahl_total_erwartet': self.funk_erwartet().ravel(),
+            'ANZEIGENQUOTE_TOTAL': self.funk_quoten().ravel()
+            })
+
+        return(frame)
+
+
+
+# %%
+###################################################################################################
+def _funk_anzahlen_schuerfen(
+        arg_suchbegriff: str,
+        arg_datenkontext: Datenkontext,
+        arg_url_scraper_api: str
+        ):
+    """Runs a counts-only order for one search term in a thread of the
+    pool and returns a dict with the states as keys and the numbers of
+    offers as values (all zero if there is not a single offer for the
+    search term). Only the Scraper_Worker is run. Raises
+    pipeline.AuftragAbgebrochen if the order is aborted for another
+    reason.
+
+    Keyword arguments:\n
+    arg_suchbegriff -- Search term of the order\n
+    arg_datenkontext -- Instance of Datenkontext with the external data\n
+    arg_url_scraper_api -- URL of the external scraper API or None
+    """
+    buch_anzahlen = {}
+
+    def funk_fertig_geschuerft(arg_auftrag_buch_ergebnisse, **kwargs):
+        """Subscriber function for event Fertig_geschuerft."""
+        for land_x, buch_land_x in arg_auftrag_buch_ergebnisse.items():
+            buch_anzahlen[land_x] = buch_land_x['Anzeigenanzahl_total']
+
+    eventmanager = Eventmanager()
+    user_interface = pipeline.UserInterfaceOhneAnzeige()
+
+    # Every thread needs an SQL session of its own
+    sql_worker = batch.SqlWorkerWartend(
+        init_eventmanager=eventmanager,
+        init_user_interface=user_interface
+        )
+
+    scraper_worker = Scraper_Worker(
+        init_eventmanager=eventmanager,
+        init_sql_worker=sql_worker,
+        init_user_interface=user_interface,
+        init_datenkontext=arg_datenkontext,
+        init_url_scraper_api=arg_url_scraper_api
+        )
+
+    eventmanager.funk_abonnent_hinzufuegen(
+        arg_event_name='Button_gedrueckt',
+        arg_abonnent=scraper_worker.funk_auftrag_annehmen,
+        arg_argumente_vom_abonnieren={}
+        )
+
+    eventmanager.funk_abonnent_hinzufuegen(
+        arg_event_name='Fertig_geschuerft',
+        arg_abonnent=funk_fertig_geschuerft,
+        arg_argumente_vom_abonnieren={}
+        )
+
+    eventmanager.funk_abonnent_hinzufuegen(
+        arg_event_name='Vorzeitig_abgebrochen',
+        arg_abonnent=pipeline.funk_abbrechen,
+        arg_argumente_vom_abonnieren={}
+        )
+
+    try:
+        eventmanager.funk_event_eingetreten(
+            arg_event_name='Button_gedrueckt',
+            arg_argumente_von_event={
+                'arg_auftrag_suchbegriff': arg_suchbegriff,
+                'arg_auftrag_stichprobe': constants.ANZEIGEN_PRO_SEITE,
+                'arg_auftrag_max_anzeigenalter': constants.GRENZE_ANZEIGENALTER_AUFTRAG,
+                'arg_auftrag_nur_anzahlen': True
+                }
+            )
+    except pipeline.AuftragAbgebrochen:
+        # A search term without a single offer is a valid row of zeros, not a failure
+        if scraper_worker.flagge_keine_anzeigen != True:
+            raise
+
+        buch_anzahlen.update(dict.fromkeys(arg_datenkontext.buch_laender, 0))
+    finally:
+        sql_worker._funk_sql_session_schliessen()
+
+    return(buch_anzahlen)
+
+
+def funk_anzahlen_sammeln(
+        arg_liste_suchbegriffe: list,
+        arg_datenkontext: Datenkontext = None,
+        arg_n_threads: int = constants.N_BATCH_THREADS,
+        arg_url_scraper_api: str = None
+        ):
+    """Gathers the numbers of offers per state for all search terms in
+    argument arg_liste_suchbegriffe (up to arg_n_threads at the same
+    time, sharing the pacing and the rate limit with the web app like
+    the batch mode) and returns a tuple with an instance of
+    AnzahlenMatrix with one row per successful search term and a dict
+    with the search terms which failed as keys and the messages as
+    values.
+
+    Keyword arguments:\n
+    arg_liste_suchbegriffe -- List of search terms (normalized with
+    batch.funk_suchbegriffe_normalisieren, the rows use the normalized
+    ones)\n
+    arg_datenkontext -- Instance of Datenkontext with the external data
+    (None means the files in the main folder)\n
+    arg_n_threads -- Number of search terms which are requested at the
+    same time\n
+    arg_url_scraper_api -- URL of the external scraper API or of a
+    local stub server (None means URL_SCRAPER_API from constants.py)
+    """
+    if arg_datenkontext == None:
+        arg_datenkontext = data_context.funk_datenkontext_erstellen()
+
+    # The same search term is only requested once
+    liste_suchbegriffe = batch.funk_suchbegriffe_normalisieren(arg_liste_suchbegriffe)
+    liste_laender = list(arg_datenkontext.buch_laender.keys())
+
+    # Every search term fills the row with its position in the list as soon as it is done
+    matrix = numpy.zeros((len(liste_suchbegriffe), len(liste_laender)), dtype=numpy.int64)
+    maske_erfolg = numpy.zeros(len(liste_suchbegriffe), dtype=bool)
+    buch_fehler = {}
+
+    # The SQL schema is created once before the threads start (see batch.funk_batch_ausfuehren)
+    sql_worker = batch.SqlWorkerWartend(
+        init_eventmanager=None,
+        init_user_interface=None
+        )
+    sql_worker._funk_sql_session_schliessen()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=arg_n_threads) as pool_threads:
+        buch_futures = {
+            pool_threads.submit(
+                _funk_anzahlen_schuerfen,
+                suchbegriff_x,
+                arg_datenkontext,
+                arg_url_scraper_api
+                ): i
+            for i, suchbegriff_x in enumerate(liste_suchbegriffe)
+            }
+
+        for future_x in concurrent.futures.as_completed(buch_futures):
+            i = buch_futures[future_x]
+            suchbegriff = liste_suchbegriffe[i]
+
+            try:
+                buch_anzahlen = future_x.result()
+            except pipeline.AuftragAbgebrochen as abbruch:
+                buch_fehler[suchbegriff] = ' '.join(abbruch.nachricht.split())
+                continue
+            except Exception as fehler:
+                helpers.funk_drucken('ACHTUNG!: Fehler in der Matrix fuer Suchbegriff',
+                                     suchbegriff)
+                helpers.funk_drucken('Exception:', str(type(fehler).__name__))
+                helpers.funk_drucken('Fehler:', fehler)
+                buch_fehler[suchbegriff] = str(fehler)
+                continue
+
+            matrix[i] = [buch_anzahlen.get(land_x, 0) for land_x in liste_laender]
+            maske_erfolg[i] = True
+
+            helpers.funk_drucken(f'Matrix: {maske_erfolg.sum() + len(buch_fehler)} von '
+                                 f'{len(liste_suchbegriffe)} Suchbegriffen fertig')
+
+    anzahlen_matrix = AnzahlenMatrix(
+        init_liste_suchbegriffe=[x for x, y in zip(liste_suchbegriffe, maske_erfolg) if y],
+        init_matrix=matrix[maske_erfolg],
+        init_buch_laender=arg_datenkontext.buch_laender
+        )
+
+    return((anzahlen_matrix, buch_fehler))
+
+
+
+# %%
+###################################################################################################
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Scrapes the numbers of offers per state for a list of search terms and '
+                    'writes one Parquet file with the analysis of all of them.'
+        )
+    parser.add_argument('suchbegriffe', help='Text file with one search term per line')
+    parser.add_argument('--ausgabe', default='Matrix.parquet', help='Path of the Parquet file')
+    parser.add_argument('--cluster', type=int, default=constants.N_MATRIX_CLUSTER,
+                        help='Maximum number of clusters of the regional profiles')
+    parser.add_argument('--threads', type=int, default=constants.N_BATCH_THREADS,
+                        help='Number of search terms which are requested at the same time')
+    parser.add_argument('--daten', default='.',
+                        help='Folder with Buch_Laender.json, Buch_PLZs.json and '
+                             'Geojson_Laender.geojson')
+    parser.add_argument('--url-scraper-api', default=None,
+                        help='URL of the external scraper API or of a local stub server')
+    argumente = parser.parse_args()
+
+    anzahlen_matrix, buch_fehler = funk_anzahlen_sammeln(
+        arg_liste_suchbegriffe=batch.funk_suchbegriffe_laden(argumente.suchbegriffe),
+        arg_datenkontext=data_context.funk_datenkontext_erstellen(argumente.daten),
+        arg_n_threads=argumente.threads,
+        arg_url_scraper_api=argumente.url_scraper_api
+        )
+
+    anzahlen_matrix.funk_bericht_erstellen(arg_n_cluster=argumente.cluster).\
+        reset_index().to_parquet(argumente.ausgabe, index=False)
+
+    print(f'{len(anzahlen_matrix)} Suchbegriffe in {argumente.ausgabe} geschrieben')
+    for suchbegriff_x, nachricht_x in buch_fehler.items():
+        print(f'Fehlgeschlagen: {suchbegriff_x}: {nachricht_x}')
+
+    if len(buch_fehler) > 0:
+        raise SystemExit(1)
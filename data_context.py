@@ -0,0 +1,185 @@
+"""This module contains the class Datenkontext which holds the data the
+workers need besides the order itself, so they can be run with or
+without a Streamlit session.
+
+Classes:\n
+    Datenkontext -- An instance of this class holds the external data
+    for the workers and collects the results of the orders.
+
+Functions:\n
+    funk_datenkontext_erstellen -- Returns a new instance of Datenkontext
+    with the data from the files in the main folder.
+"""
+
+# %%
+###################################################################################################
+import streamlit
+
+import json
+import pathlib
+
+import shapely
+import geopandas
+
+##################################################
+# Import modules from folder
+import constants
+from plz_index import PLZIndex, funk_plz_index_laden
+from aggregation import LaenderKern
+
+
+# %%
+###################################################################################################
+class Datenkontext:
+    """An instance of this class holds the external data for the workers
+    and collects the results of the orders, i. e. everything the workers
+    took from and wrote into streamlit.session_state before.
+
+    Attributes:\n
+        buch_laender -- Dict with the external data (e. g. inhabitant
+        numbers) of the 16 states in germany as loaded from
+        Buch_Laender.json (must not be changed, the workers copy it)\n
+        laender_kern -- Instance of LaenderKern with the data of
+        attribute buch_laender as arrays (shared by all instances of the
+        process)\n
+        plz_index -- Instance of PLZIndex with the location data of the
+        PLZs from Buch_PLZs.json (shared by all instances of the
+        process)\n
+        geojson_laender -- Geojson data for the borders of the 16 states
+        as string\n
+        frame_geojson_laender -- Geodataframe parsed from attribute
+        geojson_laender (shared by all instances of the process, must not
+        be changed)\n
+        buch_frames_geometrie -- Dict with the levels of detail of
+        TOLERANZEN_GEOMETRIE as keys and geodataframes with the columns
+        'Land' and 'geometry' (simplified borders) as values (shared by
+        all instances of the process, must not be changed)\n
+        buch_ergebnisse_auftraege -- Dict into which AnalyzerWorker saves
+        the results of every processed order (with the order id as key)
+    """
+
+    def __init__(
+            self,
+            init_buch_laender: dict,
+            init_laender_kern: LaenderKern,
+            init_plz_index: PLZIndex,
+            init_geojson_laender: str,
+            init_frame_geojson_laender: geopandas.GeoDataFrame,
+            init_buch_frames_geometrie: dict,
+            init_buch_ergebnisse_auftraege: dict = None
+            ):
+        """Inits Datenkontext.
+
+        Keyword arguments:\n
+        init_buch_laender -- Dict with the external data of the 16 states\n
+        init_laender_kern -- Instance of LaenderKern for argument
+        init_buch_laender\n
+        init_plz_index -- Instance of PLZIndex with the location data of
+        the PLZs\n
+        init_geojson_laender -- Geojson data for the borders of the 16
+        states as string\n
+        init_frame_geojson_laender -- Geodataframe parsed from argument
+        init_geojson_laender\n
+        init_buch_frames_geometrie -- Dict with the simplified borders
+        per level of detail\n
+        init_buch_ergebnisse_auftraege -- Dict for the results of the
+        orders (None means a new empty dict)
+        """
+        self.buch_laender = init_buch_laender
+        self.laender_kern = init_laender_kern
+        self.plz_index = init_plz_index
+        self.geojson_laender = init_geojson_laender
+        self.frame_geojson_laender = init_frame_geojson_laender
+        self.buch_frames_geometrie = init_buch_frames_geometrie
+
+        if init_buch_ergebnisse_auftraege == None:
+            self.buch_ergebnisse_auftraege = {}
+        else:
+            self.buch_ergebnisse_auftraege = init_buch_ergebnisse_auftraege
+
+
+
+# %%
+###################################################################################################
+def _funk_geometrie_vereinfachen(arg_frame_geojson_laender: geopandas.GeoDataFrame):
+    """Returns a dict with the levels of detail of TOLERANZEN_GEOMETRIE as
+    keys and geodataframes with the columns 'Land' and 'geometry' as
+    values. The borders of all states are simplified as one coverage, so
+    common borders of neighbouring states are simplified the same way and
+    no gaps or overlaps appear between them.
+
+    Keyword arguments:\n
+    arg_frame_geojson_laender -- Geodataframe with the original borders
+    """
+    buch_frames_geometrie = {}
+
+    for stufe_x, toleranz_x in constants.TOLERANZEN_GEOMETRIE.items():
+        geometrie = arg_frame_geojson_laender.geometry.values
+
+        if toleranz_x > 0:
+            geometrie = shapely.coverage_simplify(geometrie, tolerance=toleranz_x)
+            if constants.RASTER_GEOMETRIE != None:
+                geometrie = shapely.set_precision(geometrie, grid_size=constants.RASTER_GEOMETRIE)
+
+        buch_frames_geometrie[stufe_x] = geopandas.GeoDataFrame(
+            {'Land': arg_frame_geojson_laender['Land'].values},
+            geometry=geometrie,
+            crs=arg_frame_geojson_laender.crs
+            )
+
+    return(buch_frames_geometrie)
+
+
+@streamlit.cache_resource(show_spinner=False)
+def _funk_dateien_laden(arg_pfad_ordner: str):
+    """Returns a tuple with the contents of Buch_Laender.json (as dict and
+    as LaenderKern) and Geojson_Laender.geojson (as string, as geodataframe and simplified per
+    level of detail) as well as the index of Buch_PLZs.json (see
+    plz_index.py). The files are only read and parsed once per process.
+
+    Keyword arguments:\n
+    arg_pfad_ordner -- Folder with the files
+    """
+    ordner = pathlib.Path(arg_pfad_ordner)
+
+    with open(ordner / 'Buch_Laender.json', encoding='utf-8') as datei:
+        buch_laender = json.load(datei)
+
+    laender_kern = LaenderKern(init_buch_laender=buch_laender)
+    plz_index = funk_plz_index_laden(arg_pfad_ordner)
+
+    with open(ordner / 'Geojson_Laender.geojson', encoding='utf-8') as datei:
+        geojson_laender = json.dumps(json.load(datei))
+
+    frame_geojson_laender = geopandas.read_file(geojson_laender)
+    buch_frames_geometrie = _funk_geometrie_vereinfachen(frame_geojson_laender)
+
+    return((buch_laender, laender_kern, plz_index, geojson_laender, frame_geojson_laender,
+            buch_frames_geometrie))
+
+
+def funk_datenkontext_erstellen(
+        arg_pfad_ordner: str = '.',
+        arg_buch_ergebnisse_auftraege: dict = None
+        ):
+    """Returns a new instance of Datenkontext with the data from the files
+    in the folder in argument arg_pfad_ordner.
+
+    Keyword arguments:\n
+    arg_pfad_ordner -- Folder with the files (the main folder of the
+    repository by default)\n
+    arg_buch_ergebnisse_auftraege -- Dict for the results of the orders
+    (None means a new empty dict)
+    """
+    (buch_laender, laender_kern, plz_index, geojson_laender, frame_geojson_laender,
+     buch_frames_geometrie) = _funk_dateien_laden(arg_pfad_ordner)
+
+    return(Datenkontext(
+        init_buch_laender=buch_laender,
+        init_laender_kern=laender_kern,
+        init_plz_index=plz_index,
+        init_geojson_laender=geojson_laender,
+        init_frame_geojson_laender=frame_geojson_laender,
+        init_buch_frames_geometrie=buch_frames_geometrie,
+        init_buch_ergebnisse_auftraege=arg_buch_ergebnisse_auftraege
+        ))
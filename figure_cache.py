@@ -0,0 +1,191 @@
+"""This module contains the class BildCache which renders the plots of the
+AnalyzerWorker into PNG images in memory and keeps them for identical
+input data.
+
+Classes:\n
+    BildCache -- An instance of this class stores rendered PNG images in
+    memory, keyed by a hash of the data they were rendered from.
+
+Functions:\n
+    funk_figur_zu_png -- Returns a matplotlib figure as PNG image and
+    disposes the figure.\n
+    funk_bild_cache_erstellen -- Returns the process-wide instance of
+    BildCache.
+"""
+
+# %%
+###################################################################################################
+import streamlit
+
+import io
+import hashlib
+import threading
+import collections
+
+import pandas
+import matplotlib.figure
+import matplotlib.pyplot as plt
+
+##################################################
+# Import modules from folder
+import constants
+
+
+# %%
+###################################################################################################
+def funk_figur_zu_png(arg_figur: matplotlib.figure.Figure):
+    """Returns the figure in argument arg_figur as PNG image (bytes) and
+    disposes the figure afterwards, so its memory is freed even if it was
+    created with pyplot (e. g. by seaborn.clustermap).
+
+    Keyword arguments:\n
+    arg_figur -- Matplotlib figure
+    """
+    try:
+        puffer = io.BytesIO()
+        arg_figur.savefig(puffer, format='png', bbox_inches='tight')
+        return(puffer.getvalue())
+
+    finally:
+        arg_figur.clear()
+        plt.close(arg_figur)
+
+
+class BildCache:
+    """An instance of this class stores rendered PNG images in memory. The
+    images are keyed by the kind of the plot and a sha256 hash of the
+    data it was rendered from (see funk_schluessel), so identical input
+    data (e. g. the same correlation matrix in several sessions) is never
+    rendered twice. The least recently used images are evicted as soon as
+    the sum of their sizes exceeds a byte budget.
+
+    The instance is thread-safe and meant to be shared by all users of
+    the process (see function funk_bild_cache_erstellen).
+
+    Attributes:\n
+        CAUTION!: All attributes should be used as private ones despite
+        not being prefixed with an underscore.\n
+        max_bytes -- Upper boundary for the sum of the sizes of all
+        images (in bytes)\n
+        buch_bilder -- Ordered dict with the keys as keys and the PNG
+        images as values (least recently used first)\n
+        summe_bytes -- Sum of the sizes of all images\n
+        anzahl_treffer -- Counter for the images taken from the cache\n
+        anzahl_gerendert -- Counter for the rendered images\n
+        sperre -- Lock for all attributes\n
+        sperre_rendern -- Lock which is held while an image is rendered,
+        since the settings of matplotlib (rcParams) and the figures of
+        pyplot are shared by all threads of the process
+
+    Public methods:\n
+        funk_schluessel -- Returns the key for a kind of plot and its
+        input data.\n
+        funk_bild_holen -- Returns the PNG image from the cache or
+        renders it.\n
+        funk_zustand -- Returns the current state as dict.
+    """
+
+    def __init__(self, init_max_bytes: int):
+        """Inits BildCache.
+
+        Keyword arguments:\n
+        init_max_bytes -- Upper boundary for the sum of the sizes of all
+        images (in bytes)
+        """
+        self.max_bytes = init_max_bytes
+
+        self.buch_bilder = collections.OrderedDict()
+        self.summe_bytes = 0
+        self.anzahl_treffer = 0
+        self.anzahl_gerendert = 0
+
+        self.sperre = threading.Lock()
+        self.sperre_rendern = threading.Lock()
+
+
+    @staticmethod
+    def funk_schluessel(
+            arg_art: str,
+            arg_frame: pandas.DataFrame
+            ):
+        """Returns the sha256 hash (hex) of the kind of plot in argument
+        arg_art and of the values, the index and the column names of the
+        dataframe in argument arg_frame.
+
+        Keyword arguments:\n
+        arg_art -- Kind of the plot (e. g. 'Heatmap')\n
+        arg_frame -- Input data of the plot
+        """
+        hash_sha256 = hashlib.sha256(arg_art.encode('utf-8'))
+        hash_sha256.update('|'.join(map(str, arg_frame.columns)).encode('utf-8'))
+        hash_sha256.update(pandas.util.hash_pandas_object(arg_frame, index=True).values.tobytes())
+
+        return(hash_sha256.hexdigest())
+
+
+    def funk_bild_holen(
+            self,
+            arg_art: str,
+            arg_frame: pandas.DataFrame,
+            arg_funk_rendern
+            ):
+        """Returns the PNG image (bytes) for the kind of plot in argument
+        arg_art and the data in argument arg_frame. If it is not in the
+        cache, it is rendered by calling the function in argument
+        arg_funk_rendern with arg_frame and stored.
+
+        Keyword arguments:\n
+        arg_art -- Kind of the plot (e. g. 'Heatmap')\n
+        arg_frame -- Input data of the plot\n
+        arg_funk_rendern -- Function which renders the plot for a
+        dataframe and returns it as PNG image (e. g. with
+        funk_figur_zu_png)
+        """
+        schluessel = self.funk_schluessel(arg_art=arg_art, arg_frame=arg_frame)
+
+        with self.sperre:
+            if schluessel in self.buch_bilder:
+                self.buch_bilder.move_to_end(schluessel)
+                self.anzahl_treffer += 1
+                return(self.buch_bilder[schluessel])
+
+        # Only one thread renders at a time, the cache can still be read by the other threads
+        with self.sperre_rendern:
+            png = arg_funk_rendern(arg_frame)
+
+        with self.sperre:
+            self.anzahl_gerendert += 1
+
+            if schluessel not in self.buch_bilder and len(png) <= self.max_bytes:
+                self.buch_bilder[schluessel] = png
+                self.summe_bytes += len(png)
+
+                while self.summe_bytes > self.max_bytes:
+                    _, png_alt = self.buch_bilder.popitem(last=False)
+                    self.summe_bytes -= len(png_alt)
+
+        return(png)
+
+
+    def funk_zustand(self):
+        """Returns the current state (size and counters) as dict."""
+        with self.sperre:
+            return({
+                'anzahl_bilder': len(self.buch_bilder),
+                'summe_bytes': self.summe_bytes,
+                'anzahl_treffer': self.anzahl_treffer,
+                'anzahl_gerendert': self.anzahl_gerendert
+                })
+
+
+
+# %%
+###################################################################################################
+@streamlit.cache_resource(show_spinner=False)
+def funk_bild_cache_erstellen():
+    """Returns the process-wide instance of BildCache which is shared by
+    all users and all runs of the main script.
+    """
+    bild_cache = BildCache(init_max_bytes=constants.MAX_BYTES_BILD_CACHE)
+
+    return(bild_cache)
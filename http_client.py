@@ -0,0 +1,182 @@
+"""This module contains the class HttpClient which sends the requests to
+the external scraper API.
+
+Classes:\n
+    HttpClient -- An instance of this class sends requests over a pool
+    of keep-alive connections which is shared by all users.\n
+    RichtlinieKeineCookies -- Cookie policy which does not accept any
+    cookies.
+
+Functions:\n
+    funk_http_client_erstellen -- Returns the process-wide instance of
+    HttpClient.
+"""
+
+# %%
+###################################################################################################
+import streamlit
+
+import http.cookiejar
+
+import requests
+from requests.adapters import HTTPAdapter
+
+##################################################
+# Import modules from folder
+import constants
+import replay
+
+
+# %%
+###################################################################################################
+class RichtlinieKeineCookies(http.cookiejar.DefaultCookiePolicy):
+    """Cookie policy which does not accept any cookies. It is set for the
+    cookie jar of the shared session, so the cookies of one order can
+    never leak into the order of another user.
+    """
+
+    def set_ok(self, cookie, request):
+        """Rejects every cookie."""
+        return(False)
+
+
+
+# %%
+###################################################################################################
+class HttpClient:
+    """An instance of this class sends requests over a pool of keep-alive
+    connections. The instance is thread-safe and meant to be shared by
+    all users and all runs of the main script (see function
+    funk_http_client_erstellen), so the TCP and TLS handshakes are only
+    paid once per connection and not once per order.
+
+    The shared session never stores cookies. Instead every order gets
+    its own cookie jar from funk_cookie_jar_erstellen which is passed to
+    every request of this order.
+
+    Attributes:\n
+        CAUTION!: All attributes should be used as private ones despite
+        not being prefixed with an underscore.\n
+        pool_groesse -- Maximum number of keep-alive connections per
+        host\n
+        timeout -- Tuple with the timeouts for establishing a connection
+        and for reading the response (in seconds)\n
+        sitzung -- Shared object for sending requests created by calling
+        requests.Session()\n
+        rekorder -- Instance of replay.KorpusRekorder which records every
+        response or None
+
+    Public methods:\n
+        funk_cookie_jar_erstellen -- Returns a new empty cookie jar for
+        one single order.\n
+        funk_get -- Sends a GET request and returns the response.
+    """
+
+    def __init__(
+            self,
+            init_pool_groesse: int,
+            init_timeout_verbindung: float,
+            init_timeout_lesen: float,
+            init_rekorder: replay.KorpusRekorder = None
+            ):
+        """Inits HttpClient.
+
+        Keyword arguments:\n
+        init_pool_groesse -- Maximum number of keep-alive connections
+        per host\n
+        init_timeout_verbindung -- Timeout for establishing a connection
+        (in seconds)\n
+        init_timeout_lesen -- Timeout for reading the response (in
+        seconds)\n
+        init_rekorder -- Instance of replay.KorpusRekorder which records
+        every response or None
+        """
+        self.pool_groesse = init_pool_groesse
+        self.timeout = (init_timeout_verbindung, init_timeout_lesen)
+        self.rekorder = init_rekorder
+
+        self.sitzung = requests.Session()
+        self.sitzung.cookies.set_policy(RichtlinieKeineCookies())
+
+        # With pool_block=True a request waits for a free connection instead of opening (and
+        # throwing away) additional ones
+        adapter = HTTPAdapter(
+            pool_connections=init_pool_groesse,
+            pool_maxsize=init_pool_groesse,
+            pool_block=True
+            )
+        self.sitzung.mount('https://', adapter)
+        self.sitzung.mount('http://', adapter)
+
+
+    @staticmethod
+    def funk_cookie_jar_erstellen():
+        """Returns a new empty cookie jar for one single order."""
+        return(requests.cookies.RequestsCookieJar())
+
+
+    def funk_get(
+            self,
+            arg_url: str,
+            arg_params: dict = None,
+            arg_cookie_jar: requests.cookies.RequestsCookieJar = None,
+            arg_stream: bool = False
+            ):
+        """Sends a GET request and returns the response.
+
+        Keyword arguments:\n
+        arg_url -- URL for the request\n
+        arg_params -- Parameters for the query string of the URL\n
+        arg_cookie_jar -- Cookie jar of the order (see function
+        funk_cookie_jar_erstellen) which is sent with the request and
+        receives the cookies of the response\n
+        arg_stream -- If True, only the headers are downloaded before
+        returning and the body can be read in chunks (the response must
+        be closed by the caller then)
+        """
+        antwort = self.sitzung.get(
+            arg_url,
+            params=arg_params,
+            cookies=arg_cookie_jar,
+            timeout=self.timeout,
+            stream=arg_stream
+            )
+
+        if arg_cookie_jar != None:
+            for antwort_x in [*antwort.history, antwort]:
+                arg_cookie_jar.update(antwort_x.cookies)
+
+        # While recording, the content is always downloaded completely (it can still be read in
+        # chunks afterwards). The URL of the Kleinanzeigen website is recorded instead of the URL of
+        # the scraper API, so the key of the scraper API does not end up in the corpus.
+        if self.rekorder != None:
+            self.rekorder.funk_aufnehmen(
+                arg_url=(arg_params or {}).get('url', arg_url),
+                arg_status=antwort.status_code,
+                arg_inhalt=antwort.content
+                )
+
+        return(antwort)
+
+
+
+# %%
+###################################################################################################
+@streamlit.cache_resource(show_spinner=False)
+def funk_http_client_erstellen():
+    """Returns the process-wide instance of HttpClient which is shared
+    by all users and all runs of the main script.
+    """
+    if constants.PFAD_AUFNAHME_KORPUS != None:
+        rekorder = replay.KorpusRekorder(init_pfad=constants.PFAD_AUFNAHME_KORPUS)
+    else:
+        rekorder = None
+
+    http_client = HttpClient(
+        init_pool_groesse=constants.HTTP_POOL_GROESSE,
+        init_timeout_verbindung=constants.HTTP_TIMEOUT_VERBINDUNG,
+        init_timeout_lesen=constants.HTTP_TIMEOUT_LESEN,
+        init_rekorder=rekorder
+        )
+
+    return(http_client)
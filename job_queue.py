@@ -0,0 +1,358 @@
+"""This module contains the local job queue which processes the orders
+of all users in a pool of worker processes. The script thread of a
+session only submits its order and collects the results in a later run
+of the main script, so it is never blocked by a slow order and the order
+is not lost if the browser disconnects in the meantime.
+
+Classes:\n
+    JobWarteschlange -- An instance of this class runs the orders of all
+    users in a pool of worker processes.
+
+Functions:\n
+    funk_job_warteschlange_erstellen -- Returns the process-wide
+    instance of JobWarteschlange.\n
+    funk_job_ausfuehren -- Processes one order in a worker process and
+    returns its results.
+"""
+
+# %%
+###################################################################################################
+import streamlit
+
+import time
+import uuid
+import threading
+import multiprocessing
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
+
+import folium
+
+##################################################
+# Import modules from folder
+import helpers
+import constants
+
+
+# %%
+###################################################################################################
+def _funk_prozess_einrichten(arg_n_prozesse: int):
+    """Loads the necessary files once in a new worker process, so the
+    first order in the process does not have to wait for them, and gives
+    the Taktgeber of the process its share of the budget of the
+    Kleinanzeigen website.
+
+    Keyword arguments:\n
+    arg_n_prozesse -- Number of worker processes
+    """
+    import pacing
+    import data_context
+
+    pacing.funk_prozesse_festlegen(arg_n_prozesse)
+    data_context.funk_datenkontext_erstellen()
+
+
+def _funk_karte_rendern(arg_karte):
+    """Returns the folium map in argument arg_karte as HTML string or
+    None. Folium maps cannot be passed between processes.
+
+    Keyword arguments:\n
+    arg_karte -- Folium map object or None
+    """
+    if arg_karte == None:
+        return(None)
+
+    return(folium.Figure().add_child(arg_karte).render())
+
+
+def funk_job_ausfuehren(
+        arg_auftrag_suchbegriff: str,
+        arg_auftrag_stichprobe: int,
+        arg_auftrag_max_anzeigenalter: int,
+        arg_auftrag_nur_anzahlen: bool = False,
+        arg_sitzung_id: str = None
+        ):
+    """Processes one order (scraping and analyzing) in a worker process
+    with pipeline.funk_pipeline_ausfuehren and returns a dict with keys
+    'Art' ('Erfolg' or 'Fehler'), 'Nachricht' and 'Ergebnisse' (the
+    results like in streamlit.session_state['Ergebnisse'], but with the
+    maps as HTML strings).
+
+    Keyword arguments:\n
+    arg_auftrag_suchbegriff -- Search term of the order\n
+    arg_auftrag_stichprobe -- Number of offers that should be scraped\n
+    arg_auftrag_max_anzeigenalter -- Maximum age of offers (in days)\n
+    arg_auftrag_nur_anzahlen -- Whether the order is a counts-only order\n
+    arg_sitzung_id -- Id of the session which sent the order
+    """
+    # Imported here, because pipeline imports workers which imports user_interface which imports
+    # this module
+    import pipeline
+
+    buch_job = pipeline.funk_pipeline_ausfuehren(
+        arg_auftrag_suchbegriff=arg_auftrag_suchbegriff,
+        arg_auftrag_stichprobe=arg_auftrag_stichprobe,
+        arg_auftrag_max_anzeigenalter=arg_auftrag_max_anzeigenalter,
+        arg_auftrag_nur_anzahlen=arg_auftrag_nur_anzahlen,
+        arg_sitzung_id=arg_sitzung_id
+        )
+
+    for buch_ergebnis_x in buch_job['Ergebnisse'].values():
+        buch_ergebnis_x['Karte_Standorte'] = _funk_karte_rendern(
+            buch_ergebnis_x['Karte_Standorte']
+            )
+        buch_ergebnis_x['Karte_Anzeigenquote'] = _funk_karte_rendern(
+            buch_ergebnis_x['Karte_Anzeigenquote']
+            )
+
+    return(buch_job)
+
+
+
+# %%
+###################################################################################################
+class JobWarteschlange:
+    """An instance of this class runs the orders of all users in a pool
+    of worker processes, so orders of different sessions are processed
+    at the same time on all cores. The number of orders which are
+    waiting or being processed is bounded. Every order gets a job id
+    with which its status can be checked and its results can be
+    collected.
+
+    The instance is thread-safe and meant to be shared by all users (see
+    function funk_job_warteschlange_erstellen).
+
+    Attributes:\n
+        CAUTION!: All attributes should be used as private ones despite
+        not being prefixed with an underscore.\n
+        n_prozesse -- Number of worker processes\n
+        max_jobs -- Upper boundary for the number of orders which are
+        waiting or being processed\n
+        ttl_sekunden -- Seconds after which the results of a finished
+        order are deleted if they were not collected\n
+        pool_prozesse -- ProcessPoolExecutor with the worker processes\n
+        buch_jobs -- Dict with the job ids as keys and dicts with keys
+        'Future', 'Eingang' and 'Ende' as values\n
+        sperre -- Lock for attributes pool_prozesse and buch_jobs
+
+    Public methods:\n
+        funk_job_einreichen -- Submits an order and returns its job id.\n
+        funk_status -- Returns the status of an order.\n
+        funk_ergebnis_abholen -- Returns the results of a finished order
+        and forgets the order.
+
+    Private methods:\n
+        _funk_pool_erstellen -- Returns a new pool of worker processes.\n
+        _funk_ende_merken -- Records the time at which an order was
+        finished.\n
+        _funk_aufraeumen -- Deletes the results which were not
+        collected in time.
+    """
+
+    def __init__(
+            self,
+            init_n_prozesse: int,
+            init_max_jobs: int,
+            init_ttl_sekunden: float
+            ):
+        """Inits JobWarteschlange.
+
+        Keyword arguments:\n
+        init_n_prozesse -- Number of worker processes (None means one
+        per CPU core)\n
+        init_max_jobs -- Upper boundary for the number of orders which
+        are waiting or being processed\n
+        init_ttl_sekunden -- Seconds after which the results of a
+        finished order are deleted if they were not collected
+        """
+        if init_n_prozesse == None:
+            self.n_prozesse = multiprocessing.cpu_count()
+        else:
+            self.n_prozesse = init_n_prozesse
+        self.max_jobs = init_max_jobs
+        self.ttl_sekunden = init_ttl_sekunden
+
+        self.sperre = threading.Lock()
+        self.buch_jobs = {}
+        self.pool_prozesse = self._funk_pool_erstellen()
+
+
+    def funk_job_einreichen(
+            self,
+            arg_auftrag_suchbegriff: str,
+            arg_auftrag_stichprobe: int,
+            arg_auftrag_max_anzeigenalter: int,
+            arg_auftrag_nur_anzahlen: bool = False,
+            arg_sitzung_id: str = None
+            ):
+        """Submits an order and returns its job id or None if the queue
+        is full.
+
+        Keyword arguments:\n
+        arg_auftrag_suchbegriff -- Search term of the order\n
+        arg_auftrag_stichprobe -- Number of offers that should be scraped\n
+        arg_auftrag_max_anzeigenalter -- Maximum age of offers (in days)\n
+        arg_auftrag_nur_anzahlen -- Whether only the numbers of offers per
+        state are scraped from the first page (counts-only order)\n
+        arg_sitzung_id -- Id of the session which sent the order (for its
+        share of the rate limit)
+        """
+        with self.sperre:
+            self._funk_aufraeumen()
+
+            anzahl_offen = sum(
+                1 for buch_job_x in self.buch_jobs.values() if buch_job_x['Future'].done() == False
+                )
+            if anzahl_offen >= self.max_jobs:
+                return(None)
+
+            argumente = (arg_auftrag_suchbegriff, arg_auftrag_stichprobe,
+                         arg_auftrag_max_anzeigenalter, arg_auftrag_nur_anzahlen, arg_sitzung_id)
+            try:
+                future = self.pool_prozesse.submit(funk_job_ausfuehren, *argumente)
+            except BrokenProcessPool:
+                # A worker process died (e. g. out of memory), so the pool cannot be used anymore
+                helpers.funk_drucken('ACHTUNG!: Pool der Job-Prozesse defekt, wird neu erstellt')
+                self.pool_prozesse.shutdown(wait=False, cancel_futures=True)
+                self.pool_prozesse = self._funk_pool_erstellen()
+                future = self.pool_prozesse.submit(funk_job_ausfuehren, *argumente)
+
+            job_id = uuid.uuid4().hex
+            self.buch_jobs[job_id] = {'Future': future, 'Eingang': time.time(), 'Ende': None}
+
+        # Outside of the lock, because the callback is called at once if the order is done already
+        future.add_done_callback(
+            lambda arg_future, arg_job_id=job_id: self._funk_ende_merken(arg_job_id=arg_job_id)
+            )
+
+        return(job_id)
+
+
+    def funk_status(
+            self,
+            arg_job_id: str
+            ):
+        """Returns a dict with keys 'Status' ('Wartend', 'Laeuft' or
+        'Fertig'), 'Position' (number of orders waiting in front of it)
+        and 'Sekunden' (seconds since submitting) or None if the job id
+        is unknown (e. g. after a restart of the web app).
+
+        Keyword arguments:\n
+        arg_job_id -- Job id from funk_job_einreichen
+        """
+        with self.sperre:
+            buch_job = self.buch_jobs.get(arg_job_id)
+            if buch_job == None:
+                return(None)
+
+            future = buch_job['Future']
+            if future.done() == True:
+                status = 'Fertig'
+            elif future.running() == True:
+                status = 'Laeuft'
+            else:
+                status = 'Wartend'
+
+            position = 0
+            if status == 'Wartend':
+                for buch_job_x in self.buch_jobs.values():
+                    if (buch_job_x['Eingang'] < buch_job['Eingang']
+                            and buch_job_x['Future'].running() == False
+                            and buch_job_x['Future'].done() == False):
+                        position += 1
+
+            return({
+                'Status': status,
+                'Position': position,
+                'Sekunden': time.time() - buch_job['Eingang']
+                })
+
+
+    def funk_ergebnis_abholen(
+            self,
+            arg_job_id: str
+            ):
+        """Returns the dict from funk_job_ausfuehren for a finished order
+        and forgets the order. Returns None if the job id is unknown or
+        the order is not finished yet.
+
+        Keyword arguments:\n
+        arg_job_id -- Job id from funk_job_einreichen
+        """
+        with self.sperre:
+            buch_job = self.buch_jobs.get(arg_job_id)
+            if buch_job == None or buch_job['Future'].done() == False:
+                return(None)
+
+            del(self.buch_jobs[arg_job_id])
+
+        try:
+            return(buch_job['Future'].result())
+        except Exception as fehler:
+            helpers.funk_drucken('ACHTUNG!: Fehler in Job', arg_job_id)
+            helpers.funk_drucken('Exception:', str(type(fehler).__name__))
+            helpers.funk_drucken('Fehler:', fehler)
+            return({
+                'Art': 'Fehler',
+                'Nachricht': '''ACHTUNG!: Bei der Bearbeitung deines Auftrags ist ein Fehler
+                    aufgetreten. Bitte versuche es erneut!''',
+                'Ergebnisse': {}
+                })
+
+
+    def _funk_pool_erstellen(self):
+        """Returns a new pool of worker processes. The processes are
+        started with spawn, because forking the multithreaded server
+        process is not safe.
+        """
+        return(concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.n_prozesse,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_funk_prozess_einrichten,
+            initargs=(self.n_prozesse,)
+            ))
+
+
+    def _funk_ende_merken(
+            self,
+            arg_job_id: str
+            ):
+        """Records the time at which the order was finished.
+
+        Keyword arguments:\n
+        arg_job_id -- Job id from funk_job_einreichen
+        """
+        with self.sperre:
+            buch_job = self.buch_jobs.get(arg_job_id)
+            if buch_job != None:
+                buch_job['Ende'] = time.time()
+
+
+    def _funk_aufraeumen(self):
+        """Deletes the results of finished orders which were not collected
+        within attribute ttl_sekunden. Must be called while holding
+        attribute sperre.
+        """
+        zeit_jetzt = time.time()
+
+        for job_id_x in list(self.buch_jobs.keys()):
+            ende = self.buch_jobs[job_id_x]['Ende']
+            if ende != None and zeit_jetzt - ende > self.ttl_sekunden:
+                del(self.buch_jobs[job_id_x])
+
+
+
+# %%
+###################################################################################################
+@streamlit.cache_resource(show_spinner=False)
+def funk_job_warteschlange_erstellen():
+    """Returns the process-wide instance of JobWarteschlange which is
+    shared by all users and all runs of the main script.
+    """
+    job_warteschlange = JobWarteschlange(
+        init_n_prozesse=constants.N_JOB_PROZESSE,
+        init_max_jobs=constants.MAX_JOBS_WARTESCHLANGE,
+        init_ttl_sekunden=constants.TTL_SEKUNDEN_JOB
+        )
+
+    return(job_warteschlange)
@@ -0,0 +1,313 @@
+"""This module contains the parsing engine for the result pages of the
+Kleinanzeigen website. All selectors are compiled to XPath only once
+when the module is imported.
+
+Classes:\n
+    Anzeige -- Typed record of one scraped offer.\n
+    Seite -- Typed record of one parsed result page.\n
+    StromParser -- An instance of this class parses a result page
+    incrementally while it is still being downloaded.
+
+Functions:\n
+    funk_seite_parsen -- Parses the content of a response (as bytes) and
+    returns an instance of Seite.\n
+    funk_anzeige_parsen -- Returns an instance of Anzeige for the HTML
+    element of one offer.\n
+    funk_ort_filter_parsen -- Returns the number of offers per state
+    from the "Ort" filter of a result page.
+"""
+
+# %%
+###################################################################################################
+import threading
+from typing import NamedTuple
+
+from lxml import etree
+from lxml import html
+from cssselect import HTMLTranslator
+
+
+# %%
+###################################################################################################
+class Anzeige(NamedTuple):
+    """Typed record of one scraped offer.
+
+    Attributes:\n
+        href -- Direct URL to the offer (relative to the Kleinanzeigen
+        website)\n
+        ort -- Location of the offer beginning with the PLZ\n
+        preis -- Price of the offer as shown on the website\n
+        zeit -- Date of the offer as shown on the website
+    """
+    href: str
+    ort: str
+    preis: str
+    zeit: str
+
+
+class Seite(NamedTuple):
+    """Typed record of one parsed result page.
+
+    Attributes:\n
+        liste_anzeigen -- List of instances of Anzeige in the order of
+        the page\n
+        buch_ort_filter -- Dict with the names of the states as keys and
+        the number of offers from the "Ort" filter as values or None if
+        there is no such filter on the page
+    """
+    liste_anzeigen: list
+    buch_ort_filter: dict
+
+
+
+# %%
+###################################################################################################
+_UEBERSETZER = HTMLTranslator()
+
+
+def _funk_css_kompilieren(
+        arg_css: str,
+        arg_praefix: str = 'descendant-or-self::'
+        ):
+    """Returns the XPath expression (as string) for a CSS selector.
+
+    Keyword arguments:\n
+    arg_css -- CSS selector\n
+    arg_praefix -- XPath axis in front of the expression
+    """
+    return(_UEBERSETZER.css_to_xpath(arg_css, prefix=arg_praefix))
+
+
+# XPath expressions which are evaluated once per page
+_XPATH_ANZEIGEN = etree.XPath(_funk_css_kompilieren('article.aditem'))
+_XPATH_ORT_FILTER = etree.XPath(
+    f"{_funk_css_kompilieren('section')}"
+    f"[{_funk_css_kompilieren('h3.sectionheadline', arg_praefix='descendant::')}[. = 'Ort']]"
+    )
+_XPATH_LAENDER = etree.XPath('descendant::li')
+
+# XPath expressions which are evaluated once per offer and directly return the text content of the
+# first matching element (or an empty string)
+_XPATH_ANZEIGE_ORT = etree.XPath(
+    f"string(({_funk_css_kompilieren('div.aditem-main--top--left')})[1])"
+    )
+_XPATH_ANZEIGE_PREIS = etree.XPath(
+    f"string(({_funk_css_kompilieren('p.aditem-main--middle--price-shipping--price')})[1])"
+    )
+_XPATH_ANZEIGE_ZEIT = etree.XPath(
+    f"string(({_funk_css_kompilieren('div.aditem-main--top > div.aditem-main--top--right')})[1])"
+    )
+
+# lxml parsers must not be used by several threads at the same time, so every thread gets its own
+_LOKAL = threading.local()
+
+
+def _funk_parser_holen():
+    """Returns the HTML parser of the current thread."""
+    parser = getattr(_LOKAL, 'parser', None)
+    if parser == None:
+        parser = html.HTMLParser(encoding='utf-8')
+        _LOKAL.parser = parser
+
+    return(parser)
+
+
+
+# %%
+###################################################################################################
+def funk_seite_parsen(arg_inhalt: bytes):
+    """Parses the content of a response (as bytes, without decoding it
+    to a string first) and returns an instance of Seite with all offers
+    and the "Ort" filter of the page.
+
+    Keyword arguments:\n
+    arg_inhalt -- Content of the response as bytes
+    """
+    if len(arg_inhalt.strip()) == 0:
+        return(Seite(liste_anzeigen=[], buch_ort_filter=None))
+
+    baum_html = etree.fromstring(arg_inhalt, parser=_funk_parser_holen())
+    if baum_html == None:
+        return(Seite(liste_anzeigen=[], buch_ort_filter=None))
+
+    liste_anzeigen = [funk_anzeige_parsen(x) for x in _XPATH_ANZEIGEN(baum_html)]
+    buch_ort_filter = funk_ort_filter_parsen(baum_html)
+
+    return(Seite(liste_anzeigen=liste_anzeigen, buch_ort_filter=buch_ort_filter))
+
+
+def funk_anzeige_parsen(arg_element):
+    """Returns an instance of Anzeige for the HTML element of one offer
+    (i. e. an element article.aditem).
+
+    Keyword arguments:\n
+    arg_element -- HTML element of the offer
+    """
+    return(Anzeige(
+        href=str(arg_element.get('data-href')),
+        ort=_XPATH_ANZEIGE_ORT(arg_element).lstrip(),
+        preis=_XPATH_ANZEIGE_PREIS(arg_element).lstrip(),
+        zeit=_XPATH_ANZEIGE_ZEIT(arg_element).lstrip()
+        ))
+
+
+def funk_ort_filter_parsen(arg_baum_html):
+    """Returns a dict with the names of the states as keys and the
+    number of offers from the "Ort" filter of a result page as values or
+    None if there is no such filter.
+
+    Keyword arguments:\n
+    arg_baum_html -- HTML tree of the result page
+    """
+    liste_sections = _XPATH_ORT_FILTER(arg_baum_html)
+    if len(liste_sections) == 0:
+        return(None)
+
+    buch_ort_filter = {}
+
+    # If sections are nested, the innermost one contains the filter
+    for land_x in _XPATH_LAENDER(liste_sections[-1]):
+        text = land_x.text_content()
+        text = text.replace('.', '')
+        text = text.replace('(', '')
+        text = text.replace(')', '')
+        text = text.replace('\n', '')
+
+        land_str, anzahl_str = text.split()
+        buch_ort_filter[land_str] = int(anzahl_str)
+
+    return(buch_ort_filter)
+
+
+
+# %%
+###################################################################################################
+class StromParser:
+    """An instance of this class parses a result page incrementally from
+    the chunks of a streamed response. Every offer is emitted as soon as
+    its element article.aditem is closed, so the caller can stop reading
+    (and abort the transfer) as soon as it has got enough offers.
+
+    Attributes:\n
+        CAUTION!: All attributes should be used as private ones despite
+        not being prefixed with an underscore.\n
+        chunks -- Iterator over the chunks (as bytes) of the response\n
+        parser -- Incremental lxml parser which is fed with the chunks\n
+        liste_chunks -- List of all chunks read so far\n
+        buch_ort_filter -- Dict from the "Ort" filter (see function
+        funk_ort_filter_parsen) or None if it was not read (yet)\n
+        anzahl_anzeigen -- Number of offers emitted so far\n
+        flagge_vollstaendig -- Flag which becomes True when the whole
+        response was read
+
+    Public methods:\n
+        funk_anzeigen_lesen -- Generator which yields an instance of
+        Anzeige for every offer on the page.\n
+        funk_bis_ort_filter_lesen -- Reads the remaining chunks until
+        the "Ort" filter is found.\n
+        funk_inhalt -- Returns the content of all chunks read so far.
+
+    Private methods:\n
+        _funk_chunk_fuettern -- Feeds the next chunk to the parser.\n
+        _funk_element_verarbeiten -- Processes a closed element.
+    """
+
+    def __init__(
+            self,
+            init_chunks
+            ):
+        """Inits StromParser.
+
+        Keyword arguments:\n
+        init_chunks -- Iterable over the chunks (as bytes) of the
+        response, e. g. from requests.Response.iter_content
+        """
+        self.chunks = iter(init_chunks)
+        self.parser = etree.HTMLPullParser(
+            events=('end',),
+            tag=('article', 'section'),
+            encoding='utf-8'
+            )
+        # The elements get the same methods (e. g. text_content) as with lxml.html
+        self.parser.set_element_class_lookup(html.HtmlElementClassLookup())
+        self.liste_chunks = []
+        self.buch_ort_filter = None
+        self.anzahl_anzeigen = 0
+        self.flagge_vollstaendig = False
+
+
+    def funk_anzeigen_lesen(self):
+        """Generator which yields an instance of Anzeige for every offer
+        on the page as soon as its element is closed. The chunks are only
+        read as far as the caller keeps iterating.
+        """
+        while True:
+            for _, element_x in self.parser.read_events():
+                anzeige = self._funk_element_verarbeiten(element_x)
+                if anzeige != None:
+                    self.anzahl_anzeigen += 1
+                    yield anzeige
+
+            if self.flagge_vollstaendig == True:
+                return
+
+            self._funk_chunk_fuettern()
+
+
+    def funk_bis_ort_filter_lesen(self):
+        """Reads the remaining chunks (without emitting any more offers)
+        until the "Ort" filter is found or the whole response is read.
+        """
+        while self.buch_ort_filter == None:
+            for _, element_x in self.parser.read_events():
+                self._funk_element_verarbeiten(element_x)
+                if self.buch_ort_filter != None:
+                    return()
+
+            if self.flagge_vollstaendig == True:
+                return()
+
+            self._funk_chunk_fuettern()
+
+
+    def funk_inhalt(self):
+        """Returns the content (as bytes) of all chunks read so far."""
+        return(b''.join(self.liste_chunks))
+
+
+    def _funk_chunk_fuettern(self):
+        """Feeds the next chunk to the parser or closes the parser if
+        there are no chunks left.
+        """
+        chunk = next(self.chunks, None)
+
+        if chunk == None:
+            self.parser.close()
+            self.flagge_vollstaendig = True
+        elif len(chunk) > 0:
+            self.liste_chunks.append(chunk)
+            self.parser.feed(chunk)
+
+
+    def _funk_element_verarbeiten(self, arg_element):
+        """Returns an instance of Anzeige if the closed element in
+        argument arg_element is an offer, otherwise returns None. Reads
+        the "Ort" filter if the element is the section containing it.
+
+        Keyword arguments:\n
+        arg_element -- Closed element article or section
+        """
+        if arg_element.tag == 'article':
+            if 'aditem' not in (arg_element.get('class') or '').split():
+                return(None)
+
+            anzeige = funk_anzeige_parsen(arg_element)
+
+            # The offer is not needed in the tree anymore
+            arg_element.clear(keep_tail=True)
+            return(anzeige)
+
+        if arg_element.tag == 'section' and self.buch_ort_filter == None:
+            self.buch_ort_filter = funk_ort_filter_parsen(arg_element)
+
+        return(None)
@@ -0,0 +1,331 @@
+"""This module contains the class AnzeigenTabelle which holds the scraped
+offers of one order in typed columns.
+
+Classes:\n
+    AnzeigenTabelle -- An instance of this class stores the offers of
+    one order column by column with a hash index on the URL.\n
+    Zeile -- Typed record of one row of AnzeigenTabelle.
+
+Functions:\n
+    funk_preis_umwandeln -- Returns the price shown on the website as
+    number.
+"""
+
+# %%
+###################################################################################################
+import re
+import json
+import zlib
+import array
+from typing import NamedTuple
+
+import numpy
+import pandas
+
+##################################################
+# Import modules from folder
+from plz_index import PLZIndex
+
+
+# %%
+###################################################################################################
+_MUSTER_PREIS = re.compile(r'\d[\d.]*(,\d+)?')
+
+
+def funk_preis_umwandeln(arg_preis: str):
+    """Returns the price shown on the Kleinanzeigen website (e. g.
+    "1.200 € VB") as float or NaN if there is no number in it (e. g. "Zu
+    verschenken").
+
+    Keyword arguments:\n
+    arg_preis -- Price as shown on the website
+    """
+    treffer = _MUSTER_PREIS.search(arg_preis)
+    if treffer == None:
+        return(float('nan'))
+
+    return(float(treffer.group(0).replace('.', '').replace(',', '.')))
+
+
+class Zeile(NamedTuple):
+    """Typed record of one row of AnzeigenTabelle.
+
+    Attributes:\n
+        href -- Direct URL to the offer\n
+        ort -- Location of the offer beginning with the PLZ\n
+        preis -- Price of the offer as shown on the website\n
+        zeit -- Date of the offer as shown on the website\n
+        zeitstempel -- Date of the offer as timestamp\n
+        preis_zahl -- Price as float (NaN if there is no number)\n
+        plz -- PLZ as string with five digits ('' if not yet added)\n
+        land -- Name of the state ('' if not yet added)\n
+        breitengrad -- Latitude of the PLZ (NaN if not yet added)\n
+        laengengrad -- Longitude of the PLZ (NaN if not yet added)
+    """
+    href: str
+    ort: str
+    preis: str
+    zeit: str
+    zeitstempel: float
+    preis_zahl: float
+    plz: str
+    land: str
+    breitengrad: float
+    laengengrad: float
+
+
+
+# %%
+###################################################################################################
+class AnzeigenTabelle:
+    """An instance of this class stores the offers of one order column by
+    column. Texts are kept in lists, numbers in typed arrays (8 bytes per
+    value for floats, 4 or 2 bytes for codes) which can be used as NumPy
+    arrays without copying (see funk_spalte). A dict from the URL of the
+    offer to its row is the hash index for the duplicate check, so adding
+    an offer costs the same no matter how many offers are stored.
+
+    The same instance is passed from Scraper_Worker to AnalyzerWorker
+    (which adds the location data) and stored for the user interface.
+
+    Attributes:\n
+        CAUTION!: All attributes should be used as private ones despite
+        not being prefixed with an underscore.\n
+        buch_index -- Dict with the URLs of the offers as keys and their
+        rows as values\n
+        liste_href -- Column with the URLs of the offers\n
+        liste_ort -- Column with the locations as shown on the website\n
+        liste_preis -- Column with the prices as shown on the website\n
+        liste_zeit -- Column with the dates as shown on the website\n
+        array_zeitstempel -- Column with the dates as timestamps\n
+        array_preis -- Column with the prices as floats\n
+        array_plz -- Column with the PLZs as integers (-1 if not yet
+        added)\n
+        array_land -- Column with the codes of the states, i. e. the
+        index in attribute liste_laender (-1 if not yet added)\n
+        array_breitengrad -- Column with the latitudes\n
+        array_laengengrad -- Column with the longitudes\n
+        liste_laender -- Names of the states in the order of their codes\n
+        buch_land_code -- Dict with the names of the states as keys and
+        their codes as values
+
+    Public methods:\n
+        funk_hinzufuegen -- Adds an offer if its URL is not stored yet.\n
+        funk_orte_hinzufuegen -- Adds PLZ, state, latitude and longitude
+        to all offers from the index of the PLZs.\n
+        funk_spalte -- Returns a numeric column as NumPy array.\n
+        funk_anzahl_je_land -- Returns the number of offers per state.\n
+        funk_zeilen -- Returns an iterator over all rows.\n
+        funk_zu_frame -- Returns the table as pandas dataframe.\n
+        funk_zu_bytes -- Returns the offers as compressed bytes.\n
+        funk_aus_bytes -- Returns a new instance with the offers from
+        funk_zu_bytes.
+    """
+
+    __slots__ = (
+        'buch_index', 'liste_href', 'liste_ort', 'liste_preis', 'liste_zeit',
+        'array_zeitstempel', 'array_preis', 'array_plz', 'array_land', 'array_breitengrad',
+        'array_laengengrad', 'liste_laender', 'buch_land_code'
+        )
+
+    def __init__(self):
+        """Inits AnzeigenTabelle."""
+        self.buch_index = {}
+        self.liste_href = []
+        self.liste_ort = []
+        self.liste_preis = []
+        self.liste_zeit = []
+        self.array_zeitstempel = array.array('d')
+        self.array_preis = array.array('d')
+        self.array_plz = array.array('i')
+        self.array_land = array.array('h')
+        self.array_breitengrad = array.array('d')
+        self.array_laengengrad = array.array('d')
+        self.liste_laender = []
+        self.buch_land_code = {}
+
+
+    def __len__(self):
+        """Returns the number of stored offers."""
+        return(len(self.liste_href))
+
+
+    def __contains__(self, arg_href):
+        """Returns True if an offer with the URL in argument arg_href is
+        stored.
+        """
+        return(arg_href in self.buch_index)
+
+
+    def funk_hinzufuegen(
+            self,
+            arg_href: str,
+            arg_ort: str,
+            arg_preis: str,
+            arg_zeit: str,
+            arg_zeitstempel: float
+            ):
+        """Adds an offer and returns True if its URL is not stored yet,
+        otherwise returns False without changing anything.
+
+        Keyword arguments:\n
+        arg_href -- Direct URL to the offer\n
+        arg_ort -- Location of the offer beginning with the PLZ\n
+        arg_preis -- Price of the offer as shown on the website\n
+        arg_zeit -- Date of the offer as shown on the website\n
+        arg_zeitstempel -- Date of the offer as timestamp
+        """
+        if arg_href in self.buch_index:
+            return(False)
+
+        self.buch_index[arg_href] = len(self.liste_href)
+        self.liste_href.append(arg_href)
+        self.liste_ort.append(arg_ort)
+        self.liste_preis.append(arg_preis)
+        self.liste_zeit.append(arg_zeit)
+        self.array_zeitstempel.append(arg_zeitstempel)
+        self.array_preis.append(funk_preis_umwandeln(arg_preis))
+        self.array_plz.append(-1)
+        self.array_land.append(-1)
+        self.array_breitengrad.append(float('nan'))
+        self.array_laengengrad.append(float('nan'))
+
+        return(True)
+
+
+    def funk_orte_hinzufuegen(self, arg_plz_index: PLZIndex):
+        """Adds PLZ, state, latitude and longitude to all offers at once
+        with a lookup of all PLZs in the index. The PLZ is the first word
+        of the location of an offer. Raises KeyError if a PLZ is not in
+        argument arg_plz_index.
+
+        Keyword arguments:\n
+        arg_plz_index -- Instance of PLZIndex with the location data of
+        the PLZs
+        """
+        if len(self.liste_ort) == 0:
+            return
+
+        liste_plzs = [ort_x.split(' ')[0] for ort_x in self.liste_ort]
+        try:
+            plzs = numpy.array([int(x) for x in liste_plzs], dtype=numpy.int32)
+        except ValueError:
+            raise KeyError(next(x for x in liste_plzs if x.isdigit() == False))
+
+        positionen = arg_plz_index.funk_positionen(plzs)
+        codes_index = arg_plz_index.array_land[positionen]
+
+        # The states get their codes of the table in the order in which they first occur
+        codes_unique, erste_zeilen = numpy.unique(codes_index, return_index=True)
+        for code_x in codes_unique[numpy.argsort(erste_zeilen)]:
+            land = arg_plz_index.liste_laender[code_x]
+            if land not in self.buch_land_code:
+                self.buch_land_code[land] = len(self.liste_laender)
+                self.liste_laender.append(land)
+
+        codes_tabelle = numpy.array(
+            [self.buch_land_code.get(x, -1) for x in arg_plz_index.liste_laender],
+            dtype=numpy.int16
+            )
+
+        self.funk_spalte('plz')[:] = plzs
+        self.funk_spalte('land')[:] = codes_tabelle[codes_index]
+        self.funk_spalte('breitengrad')[:] = arg_plz_index.array_breitengrad[positionen]
+        self.funk_spalte('laengengrad')[:] = arg_plz_index.array_laengengrad[positionen]
+
+
+    def funk_spalte(self, arg_name: str):
+        """Returns the numeric column in argument arg_name as NumPy array
+        which shares its memory with the table (i. e. without copying).
+        The array must not be used anymore after adding further offers.
+
+        Keyword arguments:\n
+        arg_name -- 'zeitstempel', 'preis', 'plz', 'land', 'breitengrad'
+        or 'laengengrad'
+        """
+        spalte = getattr(self, f'array_{arg_name}')
+        return(numpy.frombuffer(spalte, dtype=spalte.typecode))
+
+
+    def funk_anzahl_je_land(self):
+        """Returns a dict with the names of the states as keys and the
+        number of offers as values (only states with offers).
+        """
+        codes = self.funk_spalte('land')
+        codes = codes[codes >= 0]
+        anzahlen = numpy.bincount(codes, minlength=len(self.liste_laender))
+
+        return({land_x: int(anzahlen[i]) for i, land_x in enumerate(self.liste_laender)})
+
+
+    def funk_zeilen(self):
+        """Returns an iterator over all rows as instances of Zeile."""
+        for i in range(len(self.liste_href)):
+            if self.array_plz[i] >= 0:
+                plz = f'{self.array_plz[i]:05d}'
+            else:
+                plz = ''
+
+            if self.array_land[i] >= 0:
+                land = self.liste_laender[self.array_land[i]]
+            else:
+                land = ''
+
+            yield Zeile(
+                href=self.liste_href[i],
+                ort=self.liste_ort[i],
+                preis=self.liste_preis[i],
+                zeit=self.liste_zeit[i],
+                zeitstempel=self.array_zeitstempel[i],
+                preis_zahl=self.array_preis[i],
+                plz=plz,
+                land=land,
+                breitengrad=self.array_breitengrad[i],
+                laengengrad=self.array_laengengrad[i]
+                )
+
+
+    def funk_zu_frame(self):
+        """Returns the table as pandas dataframe with one row per offer."""
+        return(pandas.DataFrame(list(self.funk_zeilen()), columns=Zeile._fields))
+
+
+    def funk_zu_bytes(
+            self,
+            arg_max_anzeigen: int = None
+            ):
+        """Returns the first offers (without the location data) as
+        compressed JSON, e. g. for storing them in the database.
+
+        Keyword arguments:\n
+        arg_max_anzeigen -- Upper boundary for the number of offers or
+        None for all offers
+        """
+        ende = len(self.liste_href) if arg_max_anzeigen == None else arg_max_anzeigen
+        buch_spalten = {
+            'href': self.liste_href[:ende],
+            'ort': self.liste_ort[:ende],
+            'preis': self.liste_preis[:ende],
+            'zeit': self.liste_zeit[:ende],
+            'zeitstempel': self.array_zeitstempel[:ende].tolist()
+            }
+
+        return(zlib.compress(json.dumps(buch_spalten).encode('utf-8')))
+
+
+    @staticmethod
+    def funk_aus_bytes(arg_bytes: bytes):
+        """Returns a new instance of AnzeigenTabelle with the offers from
+        funk_zu_bytes.
+
+        Keyword arguments:\n
+        arg_bytes -- Compressed offers from funk_zu_bytes
+        """
+        buch_spalten = json.loads(zlib.decompress(arg_bytes).decode('utf-8'))
+
+        tabelle_anzeigen = AnzeigenTabelle()
+        for zeile_x in zip(buch_spalten['href'], buch_spalten['ort'], buch_spalten['preis'],
+                           buch_spalten['zeit'], buch_spalten['zeitstempel']):
+            tabelle_anzeigen.funk_hinzufuegen(*zeile_x)
+
+        return(tabelle_anzeigen)
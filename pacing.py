@@ -0,0 +1,414 @@
+"""This module contains the class Taktgeber which paces the requests to
+the Kleinanzeigen website.
+
+Classes:\n
+    Taktgeber -- An instance of this class paces the requests with a
+    token bucket whose rate adapts to the blocks of the website.
+
+Functions:\n
+    funk_prozesse_festlegen -- Sets the number of processes which share
+    the budget.\n
+    funk_taktgeber_erstellen -- Returns the process-wide instance of
+    Taktgeber.
+"""
+
+# %%
+###################################################################################################
+import streamlit
+
+import os
+import json
+import time
+import random
+import threading
+
+##################################################
+# Import modules from folder
+import helpers
+import constants
+
+
+# %%
+###################################################################################################
+class Taktgeber:
+    """An instance of this class paces the requests to the Kleinanzeigen
+    website with a token bucket. A request may be sent as soon as there
+    is a token in the bucket, so there is no idle time as long as the
+    budget allows it.
+
+    The rate of the bucket adapts to the reactions of the website: it
+    grows additively with every successful request and is decreased
+    multiplicatively with every block (status code 418, 429 or 5xx).
+    Additionally no request is sent for an exponentially growing backoff
+    time with jitter after a block. The highest rate which sustained
+    N_ERFOLGE_SICHER successful requests in a row is recorded as safe
+    rate and used as start rate after a restart of the web app. After
+    every recorded rate the count starts again, so a higher rate needs
+    N_ERFOLGE_SICHER further successful requests.
+
+    The instance is thread-safe and meant to be shared by all users (see
+    function funk_taktgeber_erstellen), because the Kleinanzeigen
+    website blocks all requests of the web app together. If the requests
+    are sent by several processes with an instance each (see
+    job_queue.py), every instance only gets its share of the rates and
+    of the capacity, so the processes together keep to the budget. The
+    safe rate is stored in the JSON file as rate of all processes
+    together, so all processes store the same value.
+
+    Attributes:\n
+        CAUTION!: All attributes should be used as private ones despite
+        not being prefixed with an underscore.\n
+        rate -- Current rate of the bucket (requests per second)\n
+        rate_min -- Lower boundary for attribute rate\n
+        rate_max -- Upper boundary for attribute rate\n
+        rate_schritt -- Additive increase of attribute rate after every
+        successful request\n
+        faktor_blockierung -- Factor for attribute rate after a block\n
+        kapazitaet -- Maximum number of tokens in the bucket\n
+        backoff_basis_sekunden -- Backoff after the first block (in
+        seconds)\n
+        backoff_max_sekunden -- Upper boundary for the backoff (in
+        seconds)\n
+        n_erfolge_sicher -- Number of successful requests in a row after
+        which attribute rate is recorded as safe\n
+        n_prozesse -- Number of processes which share the budget\n
+        pfad_zustand -- Path of the JSON file for attribute rate_sicher
+        or None\n
+        sekunden_speichern -- Minimum seconds between two writes of the
+        JSON file for a higher safe rate\n
+        zeit_speicherung -- Time of the last write of the JSON file (from
+        time.monotonic) or None\n
+        tokens -- Current number of tokens in the bucket\n
+        zeit_auffuellung -- Time of the last refill of the bucket (from
+        time.monotonic)\n
+        gesperrt_bis -- Time until which no request may be sent because
+        of a block (from time.monotonic)\n
+        stufe_backoff -- Number of blocks in a row\n
+        zaehler_erfolge -- Number of successful requests in a row since
+        the last block or the last recorded safe rate\n
+        rate_sicher -- Observed safe rate or None\n
+        anzahl_anfragen -- Counter for all reported responses\n
+        anzahl_blockierungen -- Counter for all reported blocks\n
+        zufall -- Random generator for the jitter\n
+        sperre -- Lock for all attributes
+
+    Public methods:\n
+        funk_ist_blockierung -- Returns True if a status code means that
+        the request was blocked.\n
+        funk_token_versuchen -- Takes a token if possible, otherwise
+        returns the seconds to wait.\n
+        funk_token_holen -- Waits until a token can be taken.\n
+        funk_antwort_melden -- Adapts the rate to the status code of a
+        response.\n
+        funk_zustand -- Returns the current state as dict.
+
+    Private methods:\n
+        _funk_auffuellen -- Refills the bucket.\n
+        _funk_zustand_laden -- Loads the safe rate from the JSON file.\n
+        _funk_zustand_speichern -- Stores the safe rate in the JSON file.
+    """
+
+    def __init__(
+            self,
+            init_rate_start: float,
+            init_rate_min: float,
+            init_rate_max: float,
+            init_rate_schritt: float,
+            init_faktor_blockierung: float,
+            init_kapazitaet: float,
+            init_backoff_basis_sekunden: float,
+            init_backoff_max_sekunden: float,
+            init_n_erfolge_sicher: int,
+            init_pfad_zustand: str = None,
+            init_n_prozesse: int = 1,
+            init_sekunden_speichern: float = 0
+            ):
+        """Inits Taktgeber.
+
+        Keyword arguments:\n
+        init_rate_start -- Rate (requests per second) if no safe rate was
+        recorded yet\n
+        init_rate_min -- Lower boundary for the rate\n
+        init_rate_max -- Upper boundary for the rate\n
+        init_rate_schritt -- Additive increase of the rate after every
+        successful request\n
+        init_faktor_blockierung -- Factor for the rate after a block\n
+        init_kapazitaet -- Maximum number of tokens in the bucket, i. e.
+        requests which may be sent at once after idle time\n
+        init_backoff_basis_sekunden -- Backoff after the first block (in
+        seconds)\n
+        init_backoff_max_sekunden -- Upper boundary for the backoff (in
+        seconds)\n
+        init_n_erfolge_sicher -- Number of successful requests in a row
+        after which the rate is recorded as safe\n
+        init_pfad_zustand -- Path of the JSON file for the safe rate or
+        None for not storing it\n
+        init_n_prozesse -- Number of processes which send requests with
+        an instance each (the rates and the capacity are divided by it)\n
+        init_sekunden_speichern -- Minimum seconds between two writes of
+        the JSON file for a higher safe rate
+        """
+        self.n_prozesse = max(int(init_n_prozesse), 1)
+
+        init_rate_start = init_rate_start/self.n_prozesse
+        self.rate_min = init_rate_min/self.n_prozesse
+        self.rate_max = init_rate_max/self.n_prozesse
+        self.rate_schritt = init_rate_schritt/self.n_prozesse
+        self.faktor_blockierung = init_faktor_blockierung
+        # At least one token, otherwise no request could ever be sent
+        self.kapazitaet = max(init_kapazitaet/self.n_prozesse, 1)
+        self.backoff_basis_sekunden = init_backoff_basis_sekunden
+        self.backoff_max_sekunden = init_backoff_max_sekunden
+        self.n_erfolge_sicher = init_n_erfolge_sicher
+        self.pfad_zustand = init_pfad_zustand
+        self.sekunden_speichern = init_sekunden_speichern
+        self.zeit_speicherung = None
+
+        self.rate_sicher = self._funk_zustand_laden()
+        if self.rate_sicher != None:
+            self.rate = self.rate_sicher
+        else:
+            self.rate = init_rate_start
+        self.rate = min(max(self.rate, self.rate_min), self.rate_max)
+
+        self.tokens = 1.0
+        self.zeit_auffuellung = time.monotonic()
+        self.gesperrt_bis = 0.0
+        self.stufe_backoff = 0
+        self.zaehler_erfolge = 0
+        self.anzahl_anfragen = 0
+        self.anzahl_blockierungen = 0
+
+        self.zufall = random.Random()
+        self.sperre = threading.Lock()
+
+
+    @staticmethod
+    def funk_ist_blockierung(arg_status: int):
+        """Returns True if the status code in argument arg_status means
+        that the request was blocked or the website is under pressure.
+
+        Keyword arguments:\n
+        arg_status -- Status code of the response
+        """
+        return(arg_status in [418, 429] or arg_status >= 500)
+
+
+    def funk_token_versuchen(self):
+        """Takes a token and returns 0 if a request may be sent right
+        now, otherwise returns the seconds to wait (without taking a
+        token).
+        """
+        with self.sperre:
+            zeit_jetzt = time.monotonic()
+
+            if zeit_jetzt < self.gesperrt_bis:
+                return(self.gesperrt_bis - zeit_jetzt)
+
+            self._funk_auffuellen(arg_zeit_jetzt=zeit_jetzt)
+
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return(0)
+
+            return((1 - self.tokens)/self.rate)
+
+
+    def funk_token_holen(self):
+        """Waits until a token can be taken and takes it."""
+        while True:
+            wartezeit = self.funk_token_versuchen()
+            if wartezeit == 0:
+                return()
+            time.sleep(wartezeit)
+
+
+    def funk_antwort_melden(
+            self,
+            arg_status: int,
+            arg_retry_after: str = None
+            ):
+        """Adapts the rate to the status code of a response. Returns True
+        if the request was blocked.
+
+        Keyword arguments:\n
+        arg_status -- Status code of the response\n
+        arg_retry_after -- Value of header Retry-After of the response
+        """
+        flagge_blockierung = Taktgeber.funk_ist_blockierung(arg_status)
+
+        with self.sperre:
+            self.anzahl_anfragen += 1
+
+            if flagge_blockierung == False:
+                self.stufe_backoff = 0
+                self.zaehler_erfolge += 1
+
+                if self.zaehler_erfolge >= self.n_erfolge_sicher:
+                    self.zaehler_erfolge = 0
+
+                    if self.rate_sicher == None or self.rate > self.rate_sicher:
+                        self.rate_sicher = self.rate
+                        self._funk_zustand_speichern(arg_flagge_sofort=False)
+
+                self.rate = min(self.rate + self.rate_schritt, self.rate_max)
+                return(False)
+
+            self.anzahl_blockierungen += 1
+            self.zaehler_erfolge = 0
+            self.stufe_backoff += 1
+
+            rate_vorher = self.rate
+            self.rate = max(self.rate*self.faktor_blockierung, self.rate_min)
+
+            # A block at a rate below the safe one means that the safe rate is not safe anymore
+            if self.rate_sicher != None and rate_vorher <= self.rate_sicher:
+                self.rate_sicher = self.rate
+                self._funk_zustand_speichern(arg_flagge_sofort=True)
+
+            # Exponential backoff with jitter, so several users do not retry at the same time
+            backoff = min(
+                self.backoff_basis_sekunden*2**(self.stufe_backoff - 1),
+                self.backoff_max_sekunden
+                )
+            wartezeit = backoff/2 + self.zufall.uniform(0, backoff/2)
+
+            try:
+                wartezeit = max(wartezeit, float(arg_retry_after))
+            except (TypeError, ValueError):
+                pass
+
+            self.gesperrt_bis = max(self.gesperrt_bis, time.monotonic() + wartezeit)
+            self.tokens = 0.0
+
+            helpers.funk_drucken(
+                f'ACHTUNG!: Anfrage blockiert (Status {arg_status}). Pause fuer '
+                f'{wartezeit:.1f} s, Rate jetzt {self.rate:.3f} Anfragen pro s.'
+                )
+
+        return(True)
+
+
+    def funk_zustand(self):
+        """Returns the current state (rates and counters) as dict."""
+        with self.sperre:
+            return({
+                'rate': self.rate,
+                'rate_sicher': self.rate_sicher,
+                'anzahl_anfragen': self.anzahl_anfragen,
+                'anzahl_blockierungen': self.anzahl_blockierungen
+                })
+
+
+    def _funk_auffuellen(
+            self,
+            arg_zeit_jetzt: float
+            ):
+        """Refills the bucket according to the time since the last refill.
+        Must be called while holding attribute sperre.
+
+        Keyword arguments:\n
+        arg_zeit_jetzt -- Current time (from time.monotonic)
+        """
+        # The bucket does not fill up during the backoff after a block
+        zeit_start = max(self.zeit_auffuellung, self.gesperrt_bis)
+        if arg_zeit_jetzt > zeit_start:
+            self.tokens = min(
+                self.tokens + (arg_zeit_jetzt - zeit_start)*self.rate,
+                self.kapazitaet
+                )
+        self.zeit_auffuellung = arg_zeit_jetzt
+
+
+    def _funk_zustand_laden(self):
+        """Returns the safe rate from the JSON file or None."""
+        if self.pfad_zustand == None:
+            return(None)
+
+        try:
+            with open(self.pfad_zustand, encoding='utf-8') as datei:
+                return(float(json.load(datei)['rate_sicher'])/self.n_prozesse)
+        except FileNotFoundError:
+            return(None)
+        except (OSError, ValueError, KeyError, TypeError) as fehler:
+            helpers.funk_drucken(f'ACHTUNG!: Zustand des Taktgebers nicht lesbar: {fehler}')
+            return(None)
+
+
+    def _funk_zustand_speichern(
+            self,
+            arg_flagge_sofort: bool
+            ):
+        """Stores the safe rate (of all processes together) in the JSON
+        file. The file is replaced at once, so other processes never read
+        a file which is only partly written. Must be called while holding
+        attribute sperre.
+
+        Keyword arguments:\n
+        arg_flagge_sofort -- Whether the file is written even if the last
+        write was less than attribute sekunden_speichern ago (otherwise
+        the rate is written with the next safe rate after that time)
+        """
+        if self.pfad_zustand == None or self.rate_sicher == None:
+            return()
+
+        zeit_jetzt = time.monotonic()
+        if (arg_flagge_sofort == False and self.zeit_speicherung != None
+                and zeit_jetzt - self.zeit_speicherung < self.sekunden_speichern):
+            return()
+        self.zeit_speicherung = zeit_jetzt
+
+        pfad_temp = f'{self.pfad_zustand}.{os.getpid()}'
+        try:
+            with open(pfad_temp, 'w', encoding='utf-8') as datei:
+                json.dump({
+                    'rate_sicher': self.rate_sicher*self.n_prozesse,
+                    'zeit': time.time()
+                    }, datei)
+            os.replace(pfad_temp, self.pfad_zustand)
+        except OSError as fehler:
+            helpers.funk_drucken(f'ACHTUNG!: Zustand des Taktgebers nicht speicherbar: {fehler}')
+
+
+
+# %%
+###################################################################################################
+# Number of processes which send requests with a Taktgeber each (see funk_prozesse_festlegen)
+_N_PROZESSE = 1
+
+
+def funk_prozesse_festlegen(arg_n_prozesse: int):
+    """Sets the number of processes which send requests with a Taktgeber
+    each, so the instance from funk_taktgeber_erstellen only gets its
+    share of the budget. Must be called before funk_taktgeber_erstellen
+    (e. g. in the initializer of the worker processes of job_queue.py).
+
+    Keyword arguments:\n
+    arg_n_prozesse -- Number of processes
+    """
+    global _N_PROZESSE
+    _N_PROZESSE = arg_n_prozesse
+
+
+@streamlit.cache_resource(show_spinner=False)
+def funk_taktgeber_erstellen():
+    """Returns the process-wide instance of Taktgeber which is shared by
+    all users and all runs of the main script. Its budget is divided by
+    the number of processes from funk_prozesse_festlegen.
+    """
+    taktgeber = Taktgeber(
+        init_rate_start=constants.TAKT_RATE_START,
+        init_rate_min=constants.TAKT_RATE_MIN,
+        init_rate_max=constants.TAKT_RATE_MAX,
+        init_rate_schritt=constants.TAKT_RATE_SCHRITT,
+        init_faktor_blockierung=constants.TAKT_FAKTOR_BLOCKIERUNG,
+        init_kapazitaet=constants.TAKT_KAPAZITAET,
+        init_backoff_basis_sekunden=constants.TAKT_BACKOFF_BASIS_SEKUNDEN,
+        init_backoff_max_sekunden=constants.TAKT_BACKOFF_MAX_SEKUNDEN,
+        init_n_erfolge_sicher=constants.TAKT_N_ERFOLGE_SICHER,
+        init_pfad_zustand=constants.PFAD_TAKT_ZUSTAND,
+        init_n_prozesse=_N_PROZESSE,
+        init_sekunden_speichern=constants.TAKT_SEKUNDEN_SPEICHERN
+        )
+
+    return(taktgeber)
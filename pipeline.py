@@ -0,0 +1,341 @@
+"""This module contains the headless pipeline which processes one order
+(scraping, enriching with the location data, aggregating on the level of
+the 16 states and rendering the maps and plots) without a Streamlit
+session. It is used by the worker processes of the job queue and can be
+run from the command line, e. g. from the main folder of the
+repository:\n
+    python pipeline.py Fahrrad --stichprobe 50 --ordner Ergebnisse_Fahrrad
+
+Run with --help for all options.
+
+Classes:\n
+    AuftragAbgebrochen -- Exception which is raised instead of stopping
+    the script when an order is aborted.\n
+    UserInterfaceOhneAnzeige -- Replaces UserInterface where there is no
+    browser.
+
+Functions:\n
+    funk_abbrechen -- Subscriber function for event
+    Vorzeitig_abgebrochen which raises AuftragAbgebrochen.\n
+    funk_pipeline_ausfuehren -- Processes one order and returns its
+    results.\n
+    funk_ergebnisse_schreiben -- Writes the results of an order into a
+    folder.
+"""
+
+# %%
+###################################################################################################
+import json
+import pathlib
+import argparse
+import contextlib
+
+##################################################
+# Import modules from folder
+import constants
+import data_context
+from data_context import Datenkontext
+from workers import sqlWorker
+from workers import Scraper_Worker
+from workers import AnalyzerWorker
+from eventmanager import Eventmanager
+
+
+# %%
+###################################################################################################
+class AuftragAbgebrochen(Exception):
+    """Exception which is raised instead of stopping the script when an
+    order is aborted (event Vorzeitig_abgebrochen).
+
+    Attributes:\n
+        art -- Kind of the message ('Fehler')\n
+        nachricht -- Message for the user
+    """
+
+    def __init__(
+            self,
+            init_art: str,
+            init_nachricht: str
+            ):
+        """Inits AuftragAbgebrochen.
+
+        Keyword arguments:\n
+        init_art -- Kind of the message\n
+        init_nachricht -- Message for the user
+        """
+        super().__init__(init_nachricht)
+        self.art = init_art
+        self.nachricht = init_nachricht
+
+
+class UserInterfaceOhneAnzeige:
+    """Replaces UserInterface where there is no browser to show anything
+    in.
+    """
+
+    platzhalter_ausgabe_spinner_02 = contextlib.nullcontext()
+
+
+
+# %%
+###################################################################################################
+def funk_abbrechen(
+        arg_art: str,
+        arg_nachricht: str
+        ):
+    """Subscriber function for event Vorzeitig_abgebrochen.
+
+    Keyword arguments:\n
+    arg_art -- Kind of the message\n
+    arg_nachricht -- Message for the user
+    """
+    raise AuftragAbgebrochen(init_art=arg_art, init_nachricht=arg_nachricht)
+
+
+def _funk_fertig_analysiert(**kwargs):
+    """Subscriber function for event Fertig_analysiert. The results are
+    taken from the data context afterwards.
+    """
+    pass
+
+
+def funk_pipeline_ausfuehren(
+        arg_auftrag_suchbegriff: str,
+        arg_auftrag_stichprobe: int,
+        arg_auftrag_max_anzeigenalter: int,
+        arg_auftrag_nur_anzahlen: bool = False,
+        arg_datenkontext: Datenkontext = None,
+        arg_sql_worker: sqlWorker = None,
+        arg_flagge_darstellen: bool = True,
+        arg_url_scraper_api: str = None,
+        arg_sitzung_id: str = None
+        ):
+    """Processes one order (scraping and analyzing) with the same chain
+    of events as the main script and returns a dict with keys 'Art'
+    ('Erfolg' or 'Fehler'), 'Nachricht' and 'Ergebnisse' (the results of
+    the order with the order id as key, like in
+    streamlit.session_state['Ergebnisse']).
+
+    Keyword arguments:\n
+    arg_auftrag_suchbegriff -- Search term of the order\n
+    arg_auftrag_stichprobe -- Number of offers that should be scraped\n
+    arg_auftrag_max_anzeigenalter -- Maximum age of offers (in days)\n
+    arg_auftrag_nur_anzahlen -- Whether only the numbers of offers per
+    state are scraped from the first page (counts-only order)\n
+    arg_datenkontext -- Instance of Datenkontext with the external data
+    (None means the files in the main folder). The results are also
+    saved into its dict buch_ergebnisse_auftraege.\n
+    arg_sql_worker -- Instance of sqlWorker or of a class with the same
+    public methods (None means a new instance whose SQL session is
+    closed at the end)\n
+    arg_flagge_darstellen -- Whether the maps and plots are created\n
+    arg_url_scraper_api -- URL of the external scraper API or of a
+    local stub server (None means URL_SCRAPER_API from constants.py)\n
+    arg_sitzung_id -- Id of the session which sent the order for the
+    rate limit (only for a new instance of sqlWorker)
+    """
+    if arg_datenkontext == None:
+        arg_datenkontext = data_context.funk_datenkontext_erstellen()
+
+    buch_pipeline = {
+        'Art': 'Erfolg',
+        'Nachricht': 'NEUER AUFTRAG FERTIG BEARBEITET!',
+        'Ergebnisse': {}
+        }
+
+    eventmanager = Eventmanager()
+    user_interface = UserInterfaceOhneAnzeige()
+
+    flagge_sql_worker_eigen = arg_sql_worker == None
+    if flagge_sql_worker_eigen == True:
+        arg_sql_worker = sqlWorker(
+            init_eventmanager=eventmanager,
+            init_user_interface=user_interface,
+            init_sitzung_id=arg_sitzung_id
+            )
+
+    scraper_worker = Scraper_Worker(
+        init_eventmanager=eventmanager,
+        init_sql_worker=arg_sql_worker,
+        init_user_interface=user_interface,
+        init_datenkontext=arg_datenkontext,
+        init_url_scraper_api=arg_url_scraper_api
+        )
+
+    # The results of this order are collected in a dict of its own and copied into the data context
+    # at the end, so results of earlier orders in the data context are not returned again
+    datenkontext_auftrag = Datenkontext(
+        init_buch_laender=arg_datenkontext.buch_laender,
+        init_laender_kern=arg_datenkontext.laender_kern,
+        init_plz_index=arg_datenkontext.plz_index,
+        init_geojson_laender=arg_datenkontext.geojson_laender,
+        init_frame_geojson_laender=arg_datenkontext.frame_geojson_laender,
+        init_buch_frames_geometrie=arg_datenkontext.buch_frames_geometrie
+        )
+
+    analyzer_worker = AnalyzerWorker(
+        init_eventmanager=eventmanager,
+        init_user_interface=user_interface,
+        init_datenkontext=datenkontext_auftrag,
+        init_flagge_darstellen=arg_flagge_darstellen
+        )
+
+    eventmanager.funk_abonnent_hinzufuegen(
+        arg_event_name='Button_gedrueckt',
+        arg_abonnent=scraper_worker.funk_auftrag_annehmen,
+        arg_argumente_vom_abonnieren={}
+        )
+
+    eventmanager.funk_abonnent_hinzufuegen(
+        arg_event_name='Fertig_geschuerft',
+        arg_abonnent=analyzer_worker.funk_auftrag_annehmen,
+        arg_argumente_vom_abonnieren={}
+        )
+
+    eventmanager.funk_abonnent_hinzufuegen(
+        arg_event_name='Fertig_analysiert',
+        arg_abonnent=_funk_fertig_analysiert,
+        arg_argumente_vom_abonnieren={}
+        )
+
+    eventmanager.funk_abonnent_hinzufuegen(
+        arg_event_name='Vorzeitig_abgebrochen',
+        arg_abonnent=funk_abbrechen,
+        arg_argumente_vom_abonnieren={}
+        )
+
+    try:
+        eventmanager.funk_event_eingetreten(
+            arg_event_name='Button_gedrueckt',
+            arg_argumente_von_event={
+                'arg_auftrag_suchbegriff': arg_auftrag_suchbegriff,
+                'arg_auftrag_stichprobe': arg_auftrag_stichprobe,
+                'arg_auftrag_max_anzeigenalter': arg_auftrag_max_anzeigenalter,
+                'arg_auftrag_nur_anzahlen': arg_auftrag_nur_anzahlen
+                }
+            )
+    except AuftragAbgebrochen as abbruch:
+        buch_pipeline['Art'] = abbruch.art
+        buch_pipeline['Nachricht'] = abbruch.nachricht
+        return(buch_pipeline)
+    finally:
+        if flagge_sql_worker_eigen == True:
+            arg_sql_worker._funk_sql_session_schliessen()
+
+    buch_pipeline['Ergebnisse'] = datenkontext_auftrag.buch_ergebnisse_auftraege
+    arg_datenkontext.buch_ergebnisse_auftraege.update(datenkontext_auftrag.buch_ergebnisse_auftraege)
+
+    return(buch_pipeline)
+
+
+def _funk_json_wert(arg_wert):
+    """Returns NumPy scalars in argument arg_wert as Python numbers (for
+    json.dump).
+
+    Keyword arguments:\n
+    arg_wert -- Value which cannot be serialized by json.dump
+    """
+    return(arg_wert.item())
+
+
+def funk_ergebnisse_schreiben(
+        arg_buch_ergebnis: dict,
+        arg_pfad_ordner: str
+        ):
+    """Writes the results of one order (one value of the dict
+    'Ergebnisse' returned by funk_pipeline_ausfuehren) into the folder in
+    argument arg_pfad_ordner: Anzeigen.csv (not for counts-only orders),
+    Bericht.csv, Chi_Quadrat.json and, if they were created, the maps as
+    HTML files and the plots as PNG files. Returns the list of the
+    written paths.
+
+    Keyword arguments:\n
+    arg_buch_ergebnis -- Dict with the results of one order\n
+    arg_pfad_ordner -- Folder for the files (created if necessary)
+    """
+    ordner = pathlib.Path(arg_pfad_ordner)
+    ordner.mkdir(parents=True, exist_ok=True)
+    liste_pfade = []
+
+    if arg_buch_ergebnis['Nur_Anzahlen'] == False:
+        pfad = ordner / 'Anzeigen.csv'
+        arg_buch_ergebnis['Tabelle_Anzeigen'].funk_zu_frame().to_csv(pfad, index=False)
+        liste_pfade.append(pfad)
+
+    if arg_buch_ergebnis['Frame_Bericht'] is not None:
+        pfad = ordner / 'Bericht.csv'
+        arg_buch_ergebnis['Frame_Bericht'].to_csv(pfad)
+        liste_pfade.append(pfad)
+
+    pfad = ordner / 'Chi_Quadrat.json'
+    with open(pfad, 'w', encoding='utf-8') as datei:
+        json.dump(arg_buch_ergebnis['Chi_Quadrat'], datei, indent=4, default=_funk_json_wert)
+    liste_pfade.append(pfad)
+
+    for name_x in ['Karte_Standorte', 'Karte_Anzeigenquote']:
+        if arg_buch_ergebnis[name_x] != None:
+            pfad = ordner / f'{name_x}.html'
+            arg_buch_ergebnis[name_x].save(str(pfad))
+            liste_pfade.append(pfad)
+
+    for name_x in ['Heatmap', 'Clustermap', 'Scatterplots']:
+        if arg_buch_ergebnis[name_x] != None:
+            pfad = ordner / f'{name_x}.png'
+            pfad.write_bytes(arg_buch_ergebnis[name_x])
+            liste_pfade.append(pfad)
+
+    return(liste_pfade)
+
+
+
+# %%
+###################################################################################################
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Scrapes the offers for a search term and analyzes them without the web app.'
+        )
+    parser.add_argument('suchbegriff', help='Search term of the order')
+    parser.add_argument('--stichprobe', type=int, default=constants.N_DEFAULT_STICHPROBE_AUFTRAG,
+                        help='Number of offers that should be scraped')
+    parser.add_argument('--max-anzeigenalter', type=int,
+                        default=constants.DEFAULT_MAX_ANZEIGENALTER_AUFTRAG,
+                        help='Maximum age of offers (in days)')
+    parser.add_argument('--nur-anzahlen', action='store_true',
+                        help='Only scrape the numbers of offers per state from the first page')
+    parser.add_argument('--ordner', default=None,
+                        help='Folder for the result files (default: Ergebnisse_<Suchbegriff>)')
+    parser.add_argument('--daten', default='.',
+                        help='Folder with Buch_Laender.json, Buch_PLZs.json and '
+                             'Geojson_Laender.geojson')
+    parser.add_argument('--url-scraper-api', default=None,
+                        help='URL of the external scraper API or of a local stub server')
+    parser.add_argument('--ohne-darstellung', action='store_true',
+                        help='Do not create the maps and plots')
+    argumente = parser.parse_args()
+
+    buch_pipeline = funk_pipeline_ausfuehren(
+        arg_auftrag_suchbegriff=argumente.suchbegriff,
+        arg_auftrag_stichprobe=min(argumente.stichprobe, constants.N_GRENZE_STICHPROBE_AUFTRAG),
+        arg_auftrag_max_anzeigenalter=min(argumente.max_anzeigenalter,
+                                          constants.GRENZE_ANZEIGENALTER_AUFTRAG),
+        arg_auftrag_nur_anzahlen=argumente.nur_anzahlen,
+        arg_datenkontext=data_context.funk_datenkontext_erstellen(argumente.daten),
+        arg_flagge_darstellen=not argumente.ohne_darstellung,
+        arg_url_scraper_api=argumente.url_scraper_api
+        )
+
+    print(buch_pipeline['Nachricht'])
+
+    if buch_pipeline['Art'] != 'Erfolg':
+        raise SystemExit(1)
+
+    pfad_ordner = argumente.ordner
+    if pfad_ordner == None:
+        pfad_ordner = f'Ergebnisse_{argumente.suchbegriff}'
+
+    for buch_ergebnis_x in buch_pipeline['Ergebnisse'].values():
+        for pfad_x in funk_ergebnisse_schreiben(
+                arg_buch_ergebnis=buch_ergebnis_x,
+                arg_pfad_ordner=pfad_ordner
+                ):
+            print(pfad_x)
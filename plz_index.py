@@ -0,0 +1,210 @@
+"""This module contains the class PLZIndex which holds the location data
+of all PLZs as compact binary index, compiled once from Buch_PLZs.json
+and memory-mapped by every process.
+
+Classes:\n
+    PLZIndex -- An instance of this class holds the PLZs in sorted order
+    together with typed columns for their location data.
+
+Functions:\n
+    funk_plz_index_kompilieren -- Compiles Buch_PLZs.json into the files
+    of the binary index.\n
+    funk_plz_index_laden -- Returns the process-wide instance of PLZIndex
+    for a folder.
+"""
+
+# %%
+###################################################################################################
+import streamlit
+
+import os
+import json
+import pathlib
+
+import numpy
+
+
+# %%
+###################################################################################################
+# Columns of the index with their types (one .npy file per column)
+_BUCH_SPALTEN = {
+    'plz': numpy.int32,
+    'breitengrad': numpy.float64,
+    'laengengrad': numpy.float64,
+    'land': numpy.int16,
+    'kreis': numpy.int16
+    }
+
+
+class PLZIndex:
+    """An instance of this class holds the PLZs in sorted order together
+    with typed columns for their latitudes, longitudes, states and
+    districts (states and districts as codes, i. e. indices in the lists
+    of their names). The columns are memory-mapped from the files of the
+    index, so all processes share the same pages of memory and creating
+    an instance does not parse anything.
+
+    A whole batch of PLZs is looked up at once with a binary search on
+    the sorted PLZs (see funk_positionen).
+
+    Attributes:\n
+        CAUTION!: All attributes should be used as private ones despite
+        not being prefixed with an underscore.\n
+        array_plz -- Sorted PLZs as integers\n
+        array_breitengrad -- Latitudes of the PLZs\n
+        array_laengengrad -- Longitudes of the PLZs\n
+        array_land -- Codes of the states of the PLZs, i. e. the index
+        in attribute liste_laender\n
+        array_kreis -- Codes of the districts of the PLZs, i. e. the
+        index in attribute liste_kreise\n
+        liste_laender -- Names of the states in the order of their codes\n
+        liste_kreise -- Names of the districts in the order of their
+        codes
+
+    Public methods:\n
+        funk_positionen -- Returns the rows of a batch of PLZs.
+    """
+
+    __slots__ = (
+        'array_plz', 'array_breitengrad', 'array_laengengrad', 'array_land', 'array_kreis',
+        'liste_laender', 'liste_kreise'
+        )
+
+    def __init__(self, init_pfad_index: str):
+        """Inits PLZIndex.
+
+        Keyword arguments:\n
+        init_pfad_index -- Folder with the files of the index (see
+        function funk_plz_index_kompilieren)
+        """
+        ordner_index = pathlib.Path(init_pfad_index)
+
+        for spalte_x in _BUCH_SPALTEN:
+            setattr(self, f'array_{spalte_x}',
+                    numpy.load(ordner_index / f'{spalte_x}.npy', mmap_mode='r'))
+
+        with open(ordner_index / 'namen.json', encoding='utf-8') as datei:
+            buch_namen = json.load(datei)
+
+        self.liste_laender = buch_namen['Laender']
+        self.liste_kreise = buch_namen['Kreise']
+
+
+    def __len__(self):
+        """Returns the number of PLZs."""
+        return(len(self.array_plz))
+
+
+    def funk_positionen(self, arg_plzs: numpy.ndarray):
+        """Returns the rows of the PLZs in argument arg_plzs as NumPy
+        array, which can be used as index for all columns. Raises KeyError
+        with the first PLZ which is not in the index.
+
+        Keyword arguments:\n
+        arg_plzs -- PLZs as integers
+        """
+        positionen = numpy.searchsorted(self.array_plz, arg_plzs)
+        # PLZs greater than the last one get the position after the end
+        positionen_begrenzt = numpy.minimum(positionen, len(self.array_plz) - 1)
+        flaggen_fehlend = self.array_plz[positionen_begrenzt] != arg_plzs
+
+        if flaggen_fehlend.any() == True:
+            raise KeyError(f'{int(arg_plzs[flaggen_fehlend.argmax()]):05d}')
+
+        return(positionen_begrenzt)
+
+
+
+# %%
+###################################################################################################
+def funk_plz_index_kompilieren(
+        arg_pfad_json: str,
+        arg_pfad_index: str
+        ):
+    """Compiles the file in argument arg_pfad_json (i. e. Buch_PLZs.json)
+    into the files of the binary index in the folder in argument
+    arg_pfad_index: one .npy file per column and namen.json with the
+    names of the states and districts as well as the modification time
+    of the source. Every file is replaced at once, so other processes
+    never read a file which is only partly written.
+
+    Keyword arguments:\n
+    arg_pfad_json -- Path of Buch_PLZs.json\n
+    arg_pfad_index -- Folder for the files of the index
+    """
+    with open(arg_pfad_json, encoding='utf-8') as datei:
+        buch_plzs = json.load(datei)
+
+    liste_plzs = sorted(buch_plzs.keys(), key=int)
+    liste_laender = sorted({x['Land'] for x in buch_plzs.values()})
+    liste_kreise = sorted({x['Kreis_zusammengesetzt'] for x in buch_plzs.values()})
+    buch_land_code = {x: i for i, x in enumerate(liste_laender)}
+    buch_kreis_code = {x: i for i, x in enumerate(liste_kreise)}
+
+    buch_arrays = {
+        'plz': [int(x) for x in liste_plzs],
+        'breitengrad': [buch_plzs[x]['Breitengrad'] for x in liste_plzs],
+        'laengengrad': [buch_plzs[x]['Laengengrad'] for x in liste_plzs],
+        'land': [buch_land_code[buch_plzs[x]['Land']] for x in liste_plzs],
+        'kreis': [buch_kreis_code[buch_plzs[x]['Kreis_zusammengesetzt']] for x in liste_plzs]
+        }
+
+    ordner_index = pathlib.Path(arg_pfad_index)
+    ordner_index.mkdir(parents=True, exist_ok=True)
+
+    for spalte_x, typ_x in _BUCH_SPALTEN.items():
+        pfad_temp = ordner_index / f'{spalte_x}.{os.getpid()}.npy'
+        numpy.save(pfad_temp, numpy.array(buch_arrays[spalte_x], dtype=typ_x))
+        os.replace(pfad_temp, ordner_index / f'{spalte_x}.npy')
+
+    # The names are written last, since they mark the index as complete
+    pfad_temp = ordner_index / f'namen.{os.getpid()}.json'
+    with open(pfad_temp, 'w', encoding='utf-8') as datei:
+        json.dump({
+            'Laender': liste_laender,
+            'Kreise': liste_kreise,
+            'Quelle_mtime_ns': os.stat(arg_pfad_json).st_mtime_ns
+            }, datei, ensure_ascii=False)
+    os.replace(pfad_temp, ordner_index / 'namen.json')
+
+
+def _funk_plz_index_aktuell(
+        arg_pfad_json: pathlib.Path,
+        arg_pfad_index: pathlib.Path
+        ):
+    """Returns True if the index in the folder in argument arg_pfad_index
+    was compiled from the current version of the file in argument
+    arg_pfad_json.
+
+    Keyword arguments:\n
+    arg_pfad_json -- Path of Buch_PLZs.json\n
+    arg_pfad_index -- Folder with the files of the index
+    """
+    try:
+        with open(arg_pfad_index / 'namen.json', encoding='utf-8') as datei:
+            quelle_mtime_ns = json.load(datei)['Quelle_mtime_ns']
+    except (OSError, ValueError, KeyError):
+        return(False)
+
+    flagge_spalten = all((arg_pfad_index / f'{x}.npy').exists() for x in _BUCH_SPALTEN)
+
+    return(flagge_spalten == True and quelle_mtime_ns == os.stat(arg_pfad_json).st_mtime_ns)
+
+
+@streamlit.cache_resource(show_spinner=False)
+def funk_plz_index_laden(arg_pfad_ordner: str):
+    """Returns the process-wide instance of PLZIndex for Buch_PLZs.json in
+    the folder in argument arg_pfad_ordner. The index is compiled into
+    the folder PLZ_Index next to it if it does not exist yet or if
+    Buch_PLZs.json was changed since.
+
+    Keyword arguments:\n
+    arg_pfad_ordner -- Folder with Buch_PLZs.json
+    """
+    pfad_json = pathlib.Path(arg_pfad_ordner) / 'Buch_PLZs.json'
+    pfad_index = pathlib.Path(arg_pfad_ordner) / 'PLZ_Index'
+
+    if _funk_plz_index_aktuell(arg_pfad_json=pfad_json, arg_pfad_index=pfad_index) == False:
+        funk_plz_index_kompilieren(arg_pfad_json=pfad_json, arg_pfad_index=pfad_index)
+
+    return(PLZIndex(init_pfad_index=pfad_index))
@@ -0,0 +1,322 @@
+"""This module contains the class QuotenLeasing which admits orders from
+a block of the rate limit leased by the process, so most orders do not
+need a round trip to the database.
+
+Classes:\n
+    QuotenLeasing -- An instance of this class holds the quota which the
+    process leased from the tracker in the database.
+
+Functions:\n
+    funk_quoten_leasing_erstellen -- Returns the process-wide instance
+    of QuotenLeasing.
+"""
+
+# %%
+###################################################################################################
+import streamlit
+
+import time
+import atexit
+import threading
+
+##################################################
+# Import modules from folder
+import constants
+
+
+# %%
+###################################################################################################
+class QuotenLeasing:
+    """An instance of this class holds the quota (number of offers) which
+    the process leased from the tracker in the database (see
+    sqlWorker.funk_sql_tracker_updaten) and admits orders from it with an
+    in-memory counter.
+
+    The leased quota is booked on the tracker in the timeframe of the
+    rate limit in which it was leased, so it may only be used until that
+    timeframe is over. This way the sum of all admitted offers of all
+    processes never exceeds N_FUER_RATELIMIT per timeframe. Quota which
+    was not used after SEKUNDEN_QUOTEN_LEASING is given back to the
+    tracker by a timer as soon as the lease expires (and at the latest
+    when the process ends), so other processes can use it.
+
+    The instance is thread-safe and meant to be shared by all users of
+    the process (see function funk_quoten_leasing_erstellen).
+
+    Attributes:\n
+        CAUTION!: All attributes should be used as private ones despite
+        not being prefixed with an underscore.\n
+        zeitraum -- Timeframe of the rate limit (in seconds)\n
+        sekunden_lease -- Seconds after which unused quota is given
+        back\n
+        rest -- Leased quota which is not used yet\n
+        nullung_stamp -- Start of the timeframe in which the quota was
+        leased (column letzte_nullung_stamp of the tracker) or None\n
+        gueltig_bis -- Timestamp until which the quota may be used\n
+        anzahl_lokal -- Counter for the orders admitted from the leased
+        quota\n
+        anzahl_leases -- Counter for the leases from the database\n
+        funk_rueckgabe -- Function which gives unused quota back to the
+        tracker (see funk_lease_uebernehmen) or None\n
+        timer_ablauf -- threading.Timer which gives the unused quota back
+        when the current lease expires or None\n
+        sperre -- Lock for all attributes\n
+        sperre_datenbank -- Lock which is held while quota is leased
+        from the database, so the threads of the process do not lease at
+        the same time
+
+    Public methods:\n
+        funk_zulassen -- Admits an order from the leased quota if
+        possible.\n
+        funk_lease_uebernehmen -- Adds newly leased quota and admits the
+        order it was leased for.\n
+        funk_rest_abgelaufen_entnehmen -- Takes the unused quota out
+        after the lease expired, so it can be given back.\n
+        funk_beenden -- Gives the unused quota back when the process
+        ends.\n
+        funk_zustand -- Returns the current state as dict.
+
+    Private methods:\n
+        _funk_rest_entnehmen -- Takes the unused quota out.\n
+        _funk_lease_ablaufen -- Gives the unused quota back when the
+        lease expired (called by attribute timer_ablauf).\n
+        _funk_zurueckgeben -- Calls attribute funk_rueckgabe.
+    """
+
+    def __init__(
+            self,
+            init_zeitraum: int,
+            init_sekunden_lease: float
+            ):
+        """Inits QuotenLeasing.
+
+        Keyword arguments:\n
+        init_zeitraum -- Timeframe of the rate limit (in seconds)\n
+        init_sekunden_lease -- Seconds after which unused quota is given
+        back
+        """
+        self.zeitraum = init_zeitraum
+        self.sekunden_lease = init_sekunden_lease
+
+        self.rest = 0
+        self.nullung_stamp = None
+        self.gueltig_bis = 0.0
+        self.anzahl_lokal = 0
+        self.anzahl_leases = 0
+        self.funk_rueckgabe = None
+        self.timer_ablauf = None
+
+        self.sperre = threading.Lock()
+        self.sperre_datenbank = threading.Lock()
+
+
+    def funk_zulassen(
+            self,
+            arg_stichprobe: int,
+            arg_zeit_jetzt_stamp: float
+            ):
+        """Returns True and takes the quota if the order can be admitted
+        from the leased quota, otherwise returns False.
+
+        Keyword arguments:\n
+        arg_stichprobe -- Number of offers that should be scraped\n
+        arg_zeit_jetzt_stamp -- Current time as timestamp
+        """
+        with self.sperre:
+            if arg_zeit_jetzt_stamp >= self.gueltig_bis or self.rest < arg_stichprobe:
+                return(False)
+
+            self.rest -= arg_stichprobe
+            self.anzahl_lokal += 1
+            return(True)
+
+
+    def funk_lease_uebernehmen(
+            self,
+            arg_n_geleast: int,
+            arg_nullung_stamp: int,
+            arg_stichprobe: int,
+            arg_zeit_jetzt_stamp: float,
+            arg_funk_rueckgabe=None
+            ):
+        """Adds the quota in argument arg_n_geleast which was just booked
+        on the tracker and takes the quota for the order it was leased
+        for. Quota left from an earlier timeframe is dropped. A timer is
+        started which gives the unused quota back with the function in
+        argument arg_funk_rueckgabe as soon as the lease expires.
+
+        Keyword arguments:\n
+        arg_n_geleast -- Booked quota (at least arg_stichprobe)\n
+        arg_nullung_stamp -- Start of the timeframe in which the quota
+        was booked (from the updated row of the tracker)\n
+        arg_stichprobe -- Number of offers of the order\n
+        arg_zeit_jetzt_stamp -- Current time as timestamp\n
+        arg_funk_rueckgabe -- Function which is called with the unused
+        quota and the start of its timeframe to give the quota back to
+        the tracker (None means that it is only given back by
+        funk_rest_abgelaufen_entnehmen)
+        """
+        with self.sperre:
+            if arg_nullung_stamp != self.nullung_stamp:
+                self.rest = 0
+                self.nullung_stamp = arg_nullung_stamp
+
+            self.rest += arg_n_geleast - arg_stichprobe
+            self.gueltig_bis = min(arg_zeit_jetzt_stamp + self.sekunden_lease,
+                                   arg_nullung_stamp + self.zeitraum)
+            self.anzahl_leases += 1
+
+            if arg_funk_rueckgabe != None:
+                self.funk_rueckgabe = arg_funk_rueckgabe
+
+            # The timer of the previous lease is replaced, the new lease includes its quota
+            if self.timer_ablauf != None:
+                self.timer_ablauf.cancel()
+            self.timer_ablauf = None
+
+            if self.funk_rueckgabe != None and self.rest > 0:
+                self.timer_ablauf = threading.Timer(
+                    self.gueltig_bis - arg_zeit_jetzt_stamp,
+                    self._funk_lease_ablaufen,
+                    args=(self.gueltig_bis,)
+                    )
+                # The timer must not keep the process alive, funk_beenden gives the quota back
+                self.timer_ablauf.daemon = True
+                self.timer_ablauf.start()
+
+
+    def funk_rest_abgelaufen_entnehmen(
+            self,
+            arg_zeit_jetzt_stamp: float
+            ):
+        """Returns a tuple with the unused quota and the start of its
+        timeframe and sets the unused quota to zero if the lease expired
+        while its timeframe is not over yet. Otherwise returns (0, None)
+        (quota of a timeframe which is over does not need to be given
+        back, since the sum of the tracker starts from zero again).
+
+        Keyword arguments:\n
+        arg_zeit_jetzt_stamp -- Current time as timestamp
+        """
+        with self.sperre:
+            if arg_zeit_jetzt_stamp < self.gueltig_bis:
+                return((0, None))
+
+            return(self._funk_rest_entnehmen(arg_zeit_jetzt_stamp=arg_zeit_jetzt_stamp))
+
+
+    def funk_beenden(self):
+        """Ends the current lease and gives its unused quota back (see
+        function funk_quoten_leasing_erstellen, which registers this
+        method to run when the process ends).
+        """
+        with self.sperre:
+            if self.timer_ablauf != None:
+                self.timer_ablauf.cancel()
+                self.timer_ablauf = None
+
+            zeit_jetzt_stamp = time.time()
+            self.gueltig_bis = min(self.gueltig_bis, zeit_jetzt_stamp)
+            rest, nullung_stamp = self._funk_rest_entnehmen(arg_zeit_jetzt_stamp=zeit_jetzt_stamp)
+
+        self._funk_zurueckgeben(arg_rest=rest, arg_nullung_stamp=nullung_stamp)
+
+
+    def funk_zustand(self):
+        """Returns the current state (quota and counters) as dict."""
+        with self.sperre:
+            return({
+                'rest': self.rest,
+                'gueltig_bis': self.gueltig_bis,
+                'anzahl_lokal': self.anzahl_lokal,
+                'anzahl_leases': self.anzahl_leases
+                })
+
+
+    def _funk_rest_entnehmen(
+            self,
+            arg_zeit_jetzt_stamp: float
+            ):
+        """Returns a tuple with the unused quota and the start of its
+        timeframe and sets the unused quota to zero. Returns (0, None) if
+        there is none or its timeframe is over. Must be called while
+        holding attribute sperre.
+
+        Keyword arguments:\n
+        arg_zeit_jetzt_stamp -- Current time as timestamp
+        """
+        if self.rest == 0:
+            return((0, None))
+
+        rest = self.rest
+        self.rest = 0
+
+        if arg_zeit_jetzt_stamp >= self.nullung_stamp + self.zeitraum:
+            return((0, None))
+
+        return((rest, self.nullung_stamp))
+
+
+    def _funk_lease_ablaufen(
+            self,
+            arg_gueltig_bis: float
+            ):
+        """Gives the unused quota back when the lease which was valid
+        until the timestamp in argument arg_gueltig_bis expired. Called by
+        attribute timer_ablauf in a thread of its own.
+
+        Keyword arguments:\n
+        arg_gueltig_bis -- Attribute gueltig_bis when the timer was
+        started
+        """
+        with self.sperre:
+            # A newer lease replaced this one in the meantime
+            if self.gueltig_bis != arg_gueltig_bis:
+                return()
+
+            self.timer_ablauf = None
+            # The timer may wake up a little before the clock reaches the end of the lease
+            rest, nullung_stamp = self._funk_rest_entnehmen(
+                arg_zeit_jetzt_stamp=max(time.time(), arg_gueltig_bis)
+                )
+
+        self._funk_zurueckgeben(arg_rest=rest, arg_nullung_stamp=nullung_stamp)
+
+
+    def _funk_zurueckgeben(
+            self,
+            arg_rest: int,
+            arg_nullung_stamp: int
+            ):
+        """Gives the quota in argument arg_rest back to the tracker with
+        attribute funk_rueckgabe (outside of attribute sperre, since it
+        needs a round trip to the database).
+
+        Keyword arguments:\n
+        arg_rest -- Unused quota\n
+        arg_nullung_stamp -- Start of the timeframe of the quota
+        """
+        if arg_rest == 0 or self.funk_rueckgabe == None:
+            return()
+
+        self.funk_rueckgabe(arg_rest, arg_nullung_stamp)
+
+
+
+# %%
+###################################################################################################
+@streamlit.cache_resource(show_spinner=False)
+def funk_quoten_leasing_erstellen():
+    """Returns the process-wide instance of QuotenLeasing which is shared
+    by all users and all runs of the main script. Its unused quota is
+    given back when the process ends.
+    """
+    quoten_leasing = QuotenLeasing(
+        init_zeitraum=constants.ZEITRAUM_FUER_RATELIMIT,
+        init_sekunden_lease=constants.SEKUNDEN_QUOTEN_LEASING
+        )
+
+    # Quota which is still leased when the process ends would be lost until its timeframe is over
+    atexit.register(quoten_leasing.funk_beenden)
+
+    return(quoten_leasing)
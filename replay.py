@@ -0,0 +1,351 @@
+"""This module contains the record/replay subsystem for the responses of
+the external scraper API. Real result pages (including the "Ort" filter
+and the responses of the Kleinanzeigen website blocking the request) are
+recorded into a compressed fixture corpus which can be served afterwards
+by a local stub server, so the scraper can be benchmarked without the
+rate-limited live services.
+
+Classes:\n
+    KorpusRekorder -- An instance of this class appends responses to a
+    fixture corpus.\n
+    ReplayServer -- An instance of this class serves a fixture corpus as
+    local stub of the external scraper API.
+
+Functions:\n
+    funk_korpus_laden -- Returns the content of a fixture corpus.
+"""
+
+# %%
+###################################################################################################
+import gzip
+import json
+import time
+import base64
+import random
+import threading
+import http.server
+import urllib.parse
+
+##################################################
+# Import modules from folder
+import helpers
+from response_cache import AntwortCache
+
+
+# %%
+###################################################################################################
+class KorpusRekorder:
+    """An instance of this class appends responses to a fixture corpus.
+    The corpus is a gzip compressed file with one JSON object per line
+    containing the requested URL of the Kleinanzeigen website (never the
+    key of the scraper API), the status code and the content of the
+    response. Every record is written as gzip member of its own, so the
+    corpus can be extended over several runs of the web app.
+
+    Attributes:\n
+        CAUTION!: All attributes should be used as private ones despite
+        not being prefixed with an underscore.\n
+        pfad -- Path of the fixture corpus\n
+        sperre -- Lock for writing from several threads
+
+    Public methods:\n
+        funk_aufnehmen -- Appends one response to the fixture corpus.
+    """
+
+    def __init__(
+            self,
+            init_pfad: str
+            ):
+        """Inits KorpusRekorder.
+
+        Keyword arguments:\n
+        init_pfad -- Path of the fixture corpus
+        """
+        self.pfad = init_pfad
+        self.sperre = threading.Lock()
+
+
+    def funk_aufnehmen(
+            self,
+            arg_url: str,
+            arg_status: int,
+            arg_inhalt: bytes
+            ):
+        """Appends one response to the fixture corpus.
+
+        Keyword arguments:\n
+        arg_url -- Requested URL of the Kleinanzeigen website\n
+        arg_status -- Status code of the response\n
+        arg_inhalt -- Content of the response as bytes
+        """
+        zeile = json.dumps({
+            'url': AntwortCache.funk_url_normalisieren(arg_url),
+            'status': arg_status,
+            'zeit': time.time(),
+            'inhalt': base64.b64encode(arg_inhalt).decode('ascii')
+            })
+
+        with self.sperre:
+            with gzip.open(self.pfad, 'ab') as datei:
+                datei.write(zeile.encode('utf-8') + b'\n')
+
+
+
+# %%
+###################################################################################################
+def funk_korpus_laden(arg_pfad: str):
+    """Returns a dict with the normalized URLs of the Kleinanzeigen
+    website as keys and lists of tuples with status code and content (as
+    bytes) of the recorded responses as values (in the order of
+    recording).
+
+    Keyword arguments:\n
+    arg_pfad -- Path of the fixture corpus
+    """
+    buch_korpus = {}
+
+    with gzip.open(arg_pfad, 'rt', encoding='utf-8') as datei:
+        for zeile_x in datei:
+            if zeile_x.strip() == '':
+                continue
+
+            eintrag = json.loads(zeile_x)
+            buch_korpus.setdefault(eintrag['url'], []).append((
+                eintrag['status'],
+                base64.b64decode(eintrag['inhalt'])
+                ))
+
+    return(buch_korpus)
+
+
+
+# %%
+###################################################################################################
+class _ReplayHandler(http.server.BaseHTTPRequestHandler):
+    """Handler for the requests to an instance of ReplayServer."""
+
+    # Keep-alive connections, so the connection pool of the HttpClient is used like in production
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        """Passes the request to the instance of ReplayServer."""
+        self.server.replay_server._funk_anfrage_beantworten(self)
+
+
+    def log_message(self, format, *args):
+        """Suppresses the log of every single request."""
+        pass
+
+
+
+# %%
+###################################################################################################
+class ReplayServer:
+    """An instance of this class serves a fixture corpus as local stub
+    of the external scraper API. Like the scraper API it takes the
+    requested URL of the Kleinanzeigen website from query parameter url.
+    If a URL was recorded several times, the recorded responses are
+    served in turns. URLs which are not in the corpus are answered with
+    status code 404.
+
+    Attributes:\n
+        CAUTION!: All attributes should be used as private ones despite
+        not being prefixed with an underscore.\n
+        buch_korpus -- Dict from function funk_korpus_laden\n
+        latenz_sekunden -- Mean latency of every response (in seconds)\n
+        latenz_streuung -- Maximum deviation from the mean latency (in
+        seconds)\n
+        bytes_pro_sekunde -- Bandwidth for sending the content or None
+        for sending it at once\n
+        fehlerquote -- Share of requests (between 0 and 1) which are
+        answered with an injected error\n
+        fehler_status -- Status code of the injected errors\n
+        zufall -- Random generator for latency and errors\n
+        sperre -- Lock for attributes zufall, buch_zeiger and the
+        counters\n
+        buch_zeiger -- Dict with the index of the next response per URL\n
+        anzahl_anfragen -- Counter for the received requests\n
+        anzahl_fehler -- Counter for the injected errors\n
+        server -- Instance of ThreadingHTTPServer while running\n
+        thread -- Thread of the server while running\n
+        url -- URL of the server while running
+
+    Public methods:\n
+        funk_starten -- Starts the server in a thread of its own and
+        returns its URL.\n
+        funk_stoppen -- Stops the server.\n
+        funk_zuruecksetzen -- Resets the turns of the responses and the
+        counters.
+
+    Private methods:\n
+        _funk_antwort_waehlen -- Returns the response for a request.\n
+        _funk_anfrage_beantworten -- Answers one request.
+    """
+
+    def __init__(
+            self,
+            init_buch_korpus: dict,
+            init_latenz_sekunden: float = 0.0,
+            init_latenz_streuung: float = 0.0,
+            init_bytes_pro_sekunde: int = None,
+            init_fehlerquote: float = 0.0,
+            init_fehler_status: int = 418,
+            init_seed: int = None
+            ):
+        """Inits ReplayServer.
+
+        Keyword arguments:\n
+        init_buch_korpus -- Dict from function funk_korpus_laden\n
+        init_latenz_sekunden -- Mean latency of every response (in
+        seconds)\n
+        init_latenz_streuung -- Maximum deviation from the mean latency
+        (in seconds)\n
+        init_bytes_pro_sekunde -- Bandwidth for sending the content or
+        None for sending it at once\n
+        init_fehlerquote -- Share of requests (between 0 and 1) which are
+        answered with an injected error\n
+        init_fehler_status -- Status code of the injected errors\n
+        init_seed -- Seed for the random generator (for reproducible
+        runs)
+        """
+        self.buch_korpus = init_buch_korpus
+        self.latenz_sekunden = init_latenz_sekunden
+        self.latenz_streuung = init_latenz_streuung
+        self.bytes_pro_sekunde = init_bytes_pro_sekunde
+        self.fehlerquote = init_fehlerquote
+        self.fehler_status = init_fehler_status
+
+        self.zufall = random.Random(init_seed)
+        self.sperre = threading.Lock()
+        self.buch_zeiger = {}
+        self.anzahl_anfragen = 0
+        self.anzahl_fehler = 0
+
+        self.server = None
+        self.thread = None
+        self.url = None
+
+
+    def funk_starten(
+            self,
+            arg_host: str = '127.0.0.1',
+            arg_port: int = 0
+            ):
+        """Starts the server in a thread of its own and returns its URL
+        which can be used instead of URL_SCRAPER_API.
+
+        Keyword arguments:\n
+        arg_host -- Host to listen on\n
+        arg_port -- Port to listen on (0 means any free port)
+        """
+        self.server = http.server.ThreadingHTTPServer((arg_host, arg_port), _ReplayHandler)
+        self.server.daemon_threads = True
+        self.server.replay_server = self
+
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+        self.url = f'http://{arg_host}:{self.server.server_port}/'
+        helpers.funk_drucken(f'Replay-Server laeuft unter {self.url}')
+
+        return(self.url)
+
+
+    def funk_stoppen(self):
+        """Stops the server."""
+        if self.server == None:
+            return()
+
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+        self.server = None
+        self.thread = None
+        self.url = None
+
+
+    def funk_zuruecksetzen(self):
+        """Resets the turns of the responses and the counters, so the
+        next run gets the same responses as the first one.
+        """
+        with self.sperre:
+            self.buch_zeiger = {}
+            self.anzahl_anfragen = 0
+            self.anzahl_fehler = 0
+
+
+    def _funk_antwort_waehlen(
+            self,
+            arg_url: str
+            ):
+        """Returns a tuple with the latency (in seconds), the status code
+        and the content (as bytes) of the response for the URL of the
+        Kleinanzeigen website in argument arg_url.
+
+        Keyword arguments:\n
+        arg_url -- Requested URL of the Kleinanzeigen website
+        """
+        schluessel = AntwortCache.funk_url_normalisieren(arg_url)
+
+        with self.sperre:
+            self.anzahl_anfragen += 1
+
+            latenz = max(
+                0.0,
+                self.latenz_sekunden + self.zufall.uniform(-1, 1)*self.latenz_streuung
+                )
+
+            if self.zufall.random() < self.fehlerquote:
+                self.anzahl_fehler += 1
+                return((latenz, self.fehler_status, b'<html><body></body></html>'))
+
+            liste_antworten = self.buch_korpus.get(schluessel)
+            if liste_antworten == None:
+                return((latenz, 404, b''))
+
+            zeiger = self.buch_zeiger.get(schluessel, 0)
+            self.buch_zeiger[schluessel] = zeiger + 1
+
+        status, inhalt = liste_antworten[zeiger % len(liste_antworten)]
+
+        return((latenz, status, inhalt))
+
+
+    def _funk_anfrage_beantworten(
+            self,
+            arg_handler: _ReplayHandler
+            ):
+        """Answers one request.
+
+        Keyword arguments:\n
+        arg_handler -- Handler of the request
+        """
+        query = urllib.parse.urlsplit(arg_handler.path).query
+        buch_parameter = dict(urllib.parse.parse_qsl(query, keep_blank_values=True))
+
+        latenz, status, inhalt = self._funk_antwort_waehlen(
+            arg_url=buch_parameter.get('url', '')
+            )
+        time.sleep(latenz)
+
+        try:
+            arg_handler.send_response(status)
+            arg_handler.send_header('Content-Type', 'text/html; charset=utf-8')
+            arg_handler.send_header('Content-Length', str(len(inhalt)))
+            arg_handler.end_headers()
+
+            if self.bytes_pro_sekunde == None:
+                arg_handler.wfile.write(inhalt)
+                return()
+
+            # Send the content in slices of 1/20 second each
+            groesse_stueck = max(1, int(self.bytes_pro_sekunde/20))
+            for i in range(0, len(inhalt), groesse_stueck):
+                arg_handler.wfile.write(inhalt[i:i + groesse_stueck])
+                arg_handler.wfile.flush()
+                time.sleep(groesse_stueck/self.bytes_pro_sekunde)
+
+        except (BrokenPipeError, ConnectionResetError):
+            # The client aborted the transfer (e. g. when parsing while downloading)
+            arg_handler.close_connection = True
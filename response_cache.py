@@ -0,0 +1,278 @@
+"""This module contains the class AntwortCache which stores scraped
+result pages on the local disk.
+
+Classes:\n
+    AntwortCache -- An instance of this class stores responses in a
+    local SQLite file with a TTL and an upper boundary for its size.
+
+Functions:\n
+    funk_antwort_cache_erstellen -- Returns the process-wide instance of
+    AntwortCache.
+"""
+
+# %%
+###################################################################################################
+import streamlit
+
+import time
+import threading
+import sqlite3
+import urllib.parse
+
+##################################################
+# Import modules from folder
+import constants
+
+
+# %%
+###################################################################################################
+class AntwortCache:
+    """An instance of this class stores responses in a local SQLite file.
+    The entries are keyed by the normalized URL of the requested page,
+    expire after a TTL and are evicted in least recently used order as
+    soon as the sum of their sizes exceeds a byte budget. The SQLite file
+    can be shared by several processes.
+
+    Attributes:\n
+        CAUTION!: All attributes should be used as private ones despite
+        not being prefixed with an underscore.\n
+        pfad -- Path of the SQLite file\n
+        ttl_sekunden -- Seconds after which an entry expires\n
+        max_bytes -- Upper boundary for the sum of the sizes of all
+        entries (in bytes)\n
+        sperre -- Lock for the access to attribute verbindung from
+        several threads\n
+        verbindung -- Connection to the SQLite file
+
+    Public methods:\n
+        funk_url_normalisieren -- Returns the normalized URL which is
+        used as key.\n
+        funk_enthaelt -- Returns True if there is a valid entry for a
+        URL.\n
+        funk_laden -- Returns status code and content of the entry for a
+        URL.\n
+        funk_speichern -- Stores status code and content for a URL.
+
+    Private methods:\n
+        _funk_verdraengen -- Deletes expired entries and evicts the least
+        recently used entries until the byte budget is kept.
+    """
+
+    def __init__(
+            self,
+            init_pfad: str,
+            init_ttl_sekunden: int,
+            init_max_bytes: int
+            ):
+        """Inits AntwortCache.
+
+        Keyword arguments:\n
+        init_pfad -- Path of the SQLite file\n
+        init_ttl_sekunden -- Seconds after which an entry expires\n
+        init_max_bytes -- Upper boundary for the sum of the sizes of all
+        entries (in bytes)
+        """
+        self.pfad = init_pfad
+        self.ttl_sekunden = init_ttl_sekunden
+        self.max_bytes = init_max_bytes
+
+        self.sperre = threading.Lock()
+        self.verbindung = sqlite3.connect(
+            init_pfad,
+            timeout=30,
+            isolation_level=None,
+            check_same_thread=False
+            )
+
+        with self.sperre:
+            self.verbindung.execute('PRAGMA journal_mode=WAL')
+            self.verbindung.execute('''
+                CREATE TABLE IF NOT EXISTS Tabelle_Antworten (
+                    schluessel TEXT PRIMARY KEY,
+                    status INTEGER NOT NULL,
+                    inhalt BLOB NOT NULL,
+                    groesse INTEGER NOT NULL,
+                    erstellt_stamp REAL NOT NULL,
+                    zugriff_stamp REAL NOT NULL
+                    )
+                ''')
+            self.verbindung.execute('''
+                CREATE INDEX IF NOT EXISTS Index_Antworten_Zugriff
+                ON Tabelle_Antworten (zugriff_stamp)
+                ''')
+
+
+    @staticmethod
+    def funk_url_normalisieren(arg_url: str):
+        """Returns the normalized URL which is used as key: scheme and
+        host in lower case, without default port, fragment and trailing
+        slash and with sorted query parameters.
+
+        Keyword arguments:\n
+        arg_url -- URL to normalize
+        """
+        teile = urllib.parse.urlsplit(arg_url.strip())
+
+        schema = teile.scheme.lower()
+        host = (teile.hostname or '').lower()
+        if teile.port != None and (schema, teile.port) not in [('http', 80), ('https', 443)]:
+            host = f'{host}:{teile.port}'
+
+        pfad = teile.path
+        if len(pfad) > 1:
+            pfad = pfad.rstrip('/')
+
+        query = urllib.parse.urlencode(
+            sorted(urllib.parse.parse_qsl(teile.query, keep_blank_values=True))
+            )
+
+        return(urllib.parse.urlunsplit((schema, host, pfad, query, '')))
+
+
+    def funk_enthaelt(
+            self,
+            arg_url: str
+            ):
+        """Returns True if there is a valid entry for the URL in argument
+        arg_url. In contrast to funk_laden the time of the last access of
+        the entry is not changed.
+
+        Keyword arguments:\n
+        arg_url -- URL of the requested page
+        """
+        schluessel = AntwortCache.funk_url_normalisieren(arg_url)
+
+        with self.sperre:
+            zeile = self.verbindung.execute(
+                'SELECT 1 FROM Tabelle_Antworten WHERE schluessel = ? AND erstellt_stamp > ?',
+                (schluessel, time.time() - self.ttl_sekunden)
+                ).fetchone()
+
+        return(zeile != None)
+
+
+    def funk_laden(
+            self,
+            arg_url: str
+            ):
+        """Returns a tuple with status code and content (as bytes) of the
+        entry for the URL in argument arg_url or None if there is no
+        valid entry.
+
+        Keyword arguments:\n
+        arg_url -- URL of the requested page
+        """
+        schluessel = AntwortCache.funk_url_normalisieren(arg_url)
+        zeit_jetzt = time.time()
+
+        with self.sperre:
+            zeile = self.verbindung.execute(
+                'SELECT status, inhalt, erstellt_stamp FROM Tabelle_Antworten WHERE schluessel = ?',
+                (schluessel,)
+                ).fetchone()
+
+            if zeile == None:
+                return(None)
+
+            status, inhalt, erstellt_stamp = zeile
+
+            if zeit_jetzt - erstellt_stamp > self.ttl_sekunden:
+                self.verbindung.execute(
+                    'DELETE FROM Tabelle_Antworten WHERE schluessel = ?',
+                    (schluessel,)
+                    )
+                return(None)
+
+            self.verbindung.execute(
+                'UPDATE Tabelle_Antworten SET zugriff_stamp = ? WHERE schluessel = ?',
+                (zeit_jetzt, schluessel)
+                )
+
+        return((status, bytes(inhalt)))
+
+
+    def funk_speichern(
+            self,
+            arg_url: str,
+            arg_status: int,
+            arg_inhalt: bytes
+            ):
+        """Stores status code and content for the URL in argument
+        arg_url.
+
+        Keyword arguments:\n
+        arg_url -- URL of the requested page\n
+        arg_status -- Status code of the response\n
+        arg_inhalt -- Content of the response as bytes
+        """
+        if len(arg_inhalt) > self.max_bytes:
+            return()
+
+        schluessel = AntwortCache.funk_url_normalisieren(arg_url)
+        zeit_jetzt = time.time()
+
+        with self.sperre:
+            self.verbindung.execute(
+                '''INSERT OR REPLACE INTO Tabelle_Antworten
+                   (schluessel, status, inhalt, groesse, erstellt_stamp, zugriff_stamp)
+                   VALUES (?, ?, ?, ?, ?, ?)''',
+                (schluessel, arg_status, arg_inhalt, len(arg_inhalt), zeit_jetzt, zeit_jetzt)
+                )
+
+            self._funk_verdraengen(arg_zeit_jetzt=zeit_jetzt)
+
+
+    def _funk_verdraengen(
+            self,
+            arg_zeit_jetzt: float
+            ):
+        """Deletes expired entries and evicts the least recently used
+        entries until the sum of the sizes of all entries does not
+        exceed attribute max_bytes. Must be called while holding
+        attribute sperre.
+
+        Keyword arguments:\n
+        arg_zeit_jetzt -- Current time as timestamp
+        """
+        self.verbindung.execute(
+            'DELETE FROM Tabelle_Antworten WHERE erstellt_stamp <= ?',
+            (arg_zeit_jetzt - self.ttl_sekunden,)
+            )
+
+        bytes_gesamt = self.verbindung.execute(
+            'SELECT COALESCE(SUM(groesse), 0) FROM Tabelle_Antworten'
+            ).fetchone()[0]
+
+        if bytes_gesamt <= self.max_bytes:
+            return()
+
+        liste_schluessel_verdraengen = []
+        for schluessel_x, groesse_x in self.verbindung.execute(
+                'SELECT schluessel, groesse FROM Tabelle_Antworten ORDER BY zugriff_stamp'
+                ):
+            if bytes_gesamt <= self.max_bytes:
+                break
+            liste_schluessel_verdraengen.append((schluessel_x,))
+            bytes_gesamt -= groesse_x
+
+        self.verbindung.executemany(
+            'DELETE FROM Tabelle_Antworten WHERE schluessel = ?',
+            liste_schluessel_verdraengen
+            )
+
+
+
+# %%
+###################################################################################################
+@streamlit.cache_resource(show_spinner=False)
+def funk_antwort_cache_erstellen():
+    """Returns the process-wide instance of AntwortCache which is shared
+    by all users and all runs of the main script.
+    """
+    antwort_cache = AntwortCache(
+        init_pfad=constants.PFAD_ANTWORT_CACHE,
+        init_ttl_sekunden=constants.TTL_SEKUNDEN_ANTWORT_CACHE,
+        init_max_bytes=constants.MAX_BYTES_ANTWORT_CACHE
+        )
+
+    return(antwort_cache)
@@ -0,0 +1,311 @@
+"""This module contains the creation of the SQL engine with a
+configurable pool of database connections and the metrics of the pool.
+
+Classes:\n
+    PoolMetriken -- An instance of this class counts the checkouts of
+    connections from the pool and the time needed for them.
+
+Functions:\n
+    funk_engine_erstellen -- Returns a new SQL engine with the pool
+    configured in constants.py.\n
+    funk_sqlite_url_erstellen -- Returns the URL of the embedded SQLite
+    database.\n
+    funk_pool_metriken -- Returns the metrics and the current usage of
+    the pool of an engine as dict.
+
+The metrics and the usage are also written to the log every
+SQL_POOL_SEKUNDEN_PROTOKOLL seconds.
+"""
+
+# %%
+###################################################################################################
+import time
+import threading
+
+import sqlalchemy
+from sqlalchemy import create_engine
+
+##################################################
+# Import modules from folder
+import helpers
+import constants
+
+
+# %%
+###################################################################################################
+class PoolMetriken:
+    """An instance of this class counts the checkouts of connections from
+    the pool of an engine and the time needed for them (waiting for a
+    free connection and, if necessary, opening a new one) and tells when
+    they should be written to the log again. The instance is
+    thread-safe.
+
+    Attributes:\n
+        CAUTION!: All attributes should be used as private ones despite
+        not being prefixed with an underscore.\n
+        anzahl_checkouts -- Counter for all checkouts\n
+        anzahl_verbindungen_neu -- Counter for all newly opened database
+        connections\n
+        anzahl_verbindungen_ungueltig -- Counter for all connections
+        which were thrown away (e. g. failed pre-ping)\n
+        summe_checkout_sekunden -- Summed time of all checkouts\n
+        max_checkout_sekunden -- Longest time of a single checkout\n
+        sekunden_protokoll -- Minimum seconds between two log messages
+        (None means no log messages)\n
+        zeit_protokoll -- Time of the last log message (from
+        time.monotonic)\n
+        sperre -- Lock for all attributes
+
+    Public methods:\n
+        funk_checkout_melden -- Counts a checkout.\n
+        funk_verbindung_neu_melden -- Counts a newly opened connection.\n
+        funk_verbindung_ungueltig_melden -- Counts a connection which
+        was thrown away.\n
+        funk_protokoll_faellig -- Returns True if the metrics should be
+        written to the log again.\n
+        funk_zustand -- Returns the counters as dict.
+    """
+
+    def __init__(self, init_sekunden_protokoll: float = None):
+        """Inits PoolMetriken.
+
+        Keyword arguments:\n
+        init_sekunden_protokoll -- Minimum seconds between two log
+        messages (None means no log messages)
+        """
+        self.sekunden_protokoll = init_sekunden_protokoll
+        self.zeit_protokoll = time.monotonic()
+        self.anzahl_checkouts = 0
+        self.anzahl_verbindungen_neu = 0
+        self.anzahl_verbindungen_ungueltig = 0
+        self.summe_checkout_sekunden = 0.0
+        self.max_checkout_sekunden = 0.0
+        self.sperre = threading.Lock()
+
+
+    def funk_checkout_melden(
+            self,
+            arg_sekunden: float
+            ):
+        """Counts a checkout.
+
+        Keyword arguments:\n
+        arg_sekunden -- Time needed for the checkout
+        """
+        with self.sperre:
+            self.anzahl_checkouts += 1
+            self.summe_checkout_sekunden += arg_sekunden
+            self.max_checkout_sekunden = max(self.max_checkout_sekunden, arg_sekunden)
+
+
+    def funk_verbindung_neu_melden(self, *args):
+        """Counts a newly opened connection (listener for event
+        'connect' of the pool).
+        """
+        with self.sperre:
+            self.anzahl_verbindungen_neu += 1
+
+
+    def funk_verbindung_ungueltig_melden(self, *args):
+        """Counts a connection which was thrown away (listener for event
+        'invalidate' of the pool).
+        """
+        with self.sperre:
+            self.anzahl_verbindungen_ungueltig += 1
+
+
+    def funk_protokoll_faellig(self):
+        """Returns True (once) if attribute sekunden_protokoll passed since
+        the last log message.
+        """
+        if self.sekunden_protokoll == None:
+            return(False)
+
+        with self.sperre:
+            zeit_jetzt = time.monotonic()
+            if zeit_jetzt - self.zeit_protokoll < self.sekunden_protokoll:
+                return(False)
+
+            self.zeit_protokoll = zeit_jetzt
+            return(True)
+
+
+    def funk_zustand(self):
+        """Returns the counters as dict."""
+        with self.sperre:
+            if self.anzahl_checkouts > 0:
+                mittel_checkout_ms = self.summe_checkout_sekunden / self.anzahl_checkouts * 1000
+            else:
+                mittel_checkout_ms = 0.0
+
+            return({
+                'anzahl_checkouts': self.anzahl_checkouts,
+                'anzahl_verbindungen_neu': self.anzahl_verbindungen_neu,
+                'anzahl_verbindungen_ungueltig': self.anzahl_verbindungen_ungueltig,
+                'mittel_checkout_ms': mittel_checkout_ms,
+                'max_checkout_ms': self.max_checkout_sekunden * 1000
+                })
+
+
+class _PoolMitMetriken:
+    """Mixin for the pool classes of SQLAlchemy which measures the time of
+    every checkout with the instance of PoolMetriken in attribute
+    metriken and writes the metrics to the log from time to time.
+    """
+
+    metriken = None
+
+    def connect(self):
+        """Returns a connection from the pool like the pool class and
+        reports the time needed for it.
+        """
+        zeit_start = time.perf_counter()
+        verbindung = super().connect()
+        self.metriken.funk_checkout_melden(arg_sekunden=time.perf_counter() - zeit_start)
+
+        if self.metriken.funk_protokoll_faellig() == True:
+            _funk_pool_protokollieren(arg_pool=self)
+
+        return(verbindung)
+
+
+class _QueuePoolMitMetriken(_PoolMitMetriken, sqlalchemy.pool.QueuePool):
+    """QueuePool which measures the time of every checkout."""
+
+
+class _NullPoolMitMetriken(_PoolMitMetriken, sqlalchemy.pool.NullPool):
+    """NullPool which measures the time of every checkout."""
+
+
+
+# %%
+###################################################################################################
+def _funk_sqlite_einrichten(arg_dbapi_verbindung, *args):
+    """Switches every new connection to an SQLite file to WAL mode, so
+    reading connections are not blocked by a writing one (listener for
+    event 'connect' of the engine).
+
+    Keyword arguments:\n
+    arg_dbapi_verbindung -- New connection of the sqlite3 module
+    """
+    cursor = arg_dbapi_verbindung.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    # With WAL, NORMAL only risks the last commits on a power failure, not the consistency
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.close()
+
+
+def funk_sqlite_url_erstellen():
+    """Returns the URL of the embedded SQLite database in PFAD_SQLITE."""
+    return('sqlite:///' + constants.PFAD_SQLITE)
+
+
+def funk_engine_erstellen(arg_db_pfad: str):
+    """Returns a new SQL engine for the database in argument arg_db_pfad
+    with the pool configured in constants.py. The metrics of the pool can
+    be read with function funk_pool_metriken.
+
+    Keyword arguments:\n
+    arg_db_pfad -- URL of the database
+    """
+    metriken = PoolMetriken(init_sekunden_protokoll=constants.SQL_POOL_SEKUNDEN_PROTOKOLL)
+    connect_args = {}
+
+    if constants.SQL_POOL_KLASSE == 'NullPool':
+        # One pool class per engine, because the pool is recreated with its class (e. g. after
+        # dispose) and keeps its metrics this way
+        pool_klasse = type('NullPoolMitMetriken', (_NullPoolMitMetriken,), {'metriken': metriken})
+        pool_argumente = {}
+    else:
+        pool_klasse = type('QueuePoolMitMetriken', (_QueuePoolMitMetriken,),
+                           {'metriken': metriken})
+        pool_argumente = {
+            'pool_size': constants.SQL_POOL_GROESSE,
+            'max_overflow': constants.SQL_POOL_UEBERLAUF,
+            'pool_timeout': constants.SQL_POOL_TIMEOUT_SEKUNDEN,
+            'pool_recycle': constants.SQL_POOL_RECYCLE_SEKUNDEN
+            }
+
+    # The statement timeout is set for every new connection (only supported by PostgreSQL)
+    if (constants.SQL_STATEMENT_TIMEOUT_MS != None
+            and arg_db_pfad.startswith('postgresql') == True):
+        connect_args['options'] = f'-c statement_timeout={constants.SQL_STATEMENT_TIMEOUT_MS}'
+
+    # The connections to an SQLite file are shared by the threads of the process via the pool and
+    # wait for each other while one of them writes (the rate limit relies on this lock)
+    flagge_sqlite = arg_db_pfad.startswith('sqlite') == True
+    if flagge_sqlite == True:
+        connect_args['timeout'] = constants.SQLITE_TIMEOUT_SEKUNDEN
+        connect_args['check_same_thread'] = False
+
+    sql_engine = create_engine(
+        arg_db_pfad,
+        echo=False,
+        poolclass=pool_klasse,
+        pool_pre_ping=constants.SQL_POOL_PRE_PING,
+        connect_args=connect_args,
+        **pool_argumente
+        )
+
+    if flagge_sqlite == True:
+        sqlalchemy.event.listen(sql_engine, 'connect', _funk_sqlite_einrichten)
+    sqlalchemy.event.listen(sql_engine.pool, 'connect', metriken.funk_verbindung_neu_melden)
+    sqlalchemy.event.listen(sql_engine.pool, 'invalidate',
+                            metriken.funk_verbindung_ungueltig_melden)
+
+    return(sql_engine)
+
+
+def funk_pool_metriken(arg_engine: sqlalchemy.Engine):
+    """Returns the metrics of the pool of the engine in argument
+    arg_engine (see PoolMetriken.funk_zustand) together with its current
+    usage as dict.
+
+    Keyword arguments:\n
+    arg_engine -- Engine from function funk_engine_erstellen
+    """
+    return(_funk_pool_zustand(arg_pool=arg_engine.pool))
+
+
+def _funk_pool_zustand(arg_pool: sqlalchemy.pool.Pool):
+    """Returns the metrics of the pool in argument arg_pool together with
+    its current usage as dict (see funk_pool_metriken).
+
+    Keyword arguments:\n
+    arg_pool -- Pool of an engine from function funk_engine_erstellen
+    """
+    buch_metriken = arg_pool.metriken.funk_zustand()
+    buch_metriken['pool_klasse'] = constants.SQL_POOL_KLASSE
+
+    # NullPool does not keep any connections, so there is no usage to report
+    if isinstance(arg_pool, sqlalchemy.pool.QueuePool) == True:
+        buch_metriken['pool_groesse'] = arg_pool.size()
+        buch_metriken['verbindungen_ausgeliehen'] = arg_pool.checkedout()
+        buch_metriken['verbindungen_frei'] = arg_pool.checkedin()
+        buch_metriken['verbindungen_ueberlauf'] = max(arg_pool.overflow(), 0)
+
+    return(buch_metriken)
+
+
+def _funk_pool_protokollieren(arg_pool: sqlalchemy.pool.Pool):
+    """Writes the metrics and the current usage of the pool in argument
+    arg_pool to the log.
+
+    Keyword arguments:\n
+    arg_pool -- Pool of an engine from function funk_engine_erstellen
+    """
+    buch_metriken = _funk_pool_zustand(arg_pool=arg_pool)
+
+    text_auslastung = ''
+    if 'pool_groesse' in buch_metriken:
+        text_auslastung = (f', {buch_metriken["verbindungen_ausgeliehen"]} ausgeliehen, '
+                           f'{buch_metriken["verbindungen_frei"]} frei, '
+                           f'{buch_metriken["verbindungen_ueberlauf"]} Ueberlauf')
+
+    helpers.funk_drucken(
+        f'SQL-Pool ({buch_metriken["pool_klasse"]}): {buch_metriken["anzahl_checkouts"]} '
+        f'Checkouts, {buch_metriken["anzahl_verbindungen_neu"]} neue und '
+        f'{buch_metriken["anzahl_verbindungen_ungueltig"]} ungueltige Verbindungen, Checkout '
+        f'Mittel: {buch_metriken["mittel_checkout_ms"]:.2f} ms, Max: '
+        f'{buch_metriken["max_checkout_ms"]:.2f} ms{text_auslastung}'
+        )
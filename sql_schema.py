@@ -1,8 +1,15 @@
-"""This module contains the SQL class sqlKlasseTracker.
+"""This module contains the SQL classes sqlKlasseTracker,
+sqlKlasseBuchung, sqlKlasseWartend and sqlKlasseSuchbegriff.
 
 Classes:\n
     sqlKlasseTracker -- An instance of this class represents an entry
-    in the SQL table with the name Tabelle_Tracker.
+    in the SQL table with the name Tabelle_Tracker.\n
+    sqlKlasseBuchung -- An instance of this class represents an entry
+    in the SQL table with the name Tabelle_Buchungen.\n
+    sqlKlasseWartend -- An instance of this class represents an entry
+    in the SQL table with the name Tabelle_Warteschlange.\n
+    sqlKlasseSuchbegriff -- An instance of this class represents an
+    entry in the SQL table with the name Tabelle_Suchbegriffe.
 """
 
 # %%
@@ -44,4 +51,118 @@ class sqlKlasseTracker(sql_basis):
                 letzter_job_zeit_stamp={self.letzter_job_zeit_stamp},\
                 summe_n_aktuell_in_zeitraum={self.summe_n_aktuell_in_zeitraum},\
                 letzte_nullung_stamp={self.letzte_nullung_stamp},)>'
-            ) 
+            )
+
+
+###################################################################################################
+class sqlKlasseBuchung(sql_basis):
+    """An instance of this class represents an entry in the SQL table
+    with the tablename Tabelle_Buchungen, i. e. one admitted order for
+    the sliding window of the rate limit (see constants.ART_RATELIMIT).
+    The sums of the last ZEITRAUM_FUER_RATELIMIT seconds over all
+    sessions (global bucket) and over the orders of one session (bucket
+    of the session) are read from this table.
+    """
+    __tablename__ = 'Tabelle_Buchungen'
+    __table_args__ = (
+        sqlalchemy.Index('ix_Tabelle_Buchungen_sitzung_zeit', 'sitzung_id', 'zeit_stamp'),
+        )
+
+    buchung_id: Mapped[int] = mapped_column(
+        sqlalchemy.Integer,
+        primary_key=True,
+        autoincrement=True
+        )
+
+    # Id of the session (user of the web app, batch mode, ...) which sent the order
+    sitzung_id: Mapped[str] = mapped_column(sqlalchemy.String(200))
+    # Time of admission as timestamp (with fractions of a second)
+    zeit_stamp: Mapped[float] = mapped_column(sqlalchemy.Float, index=True)
+    # Number of offers of the order
+    anzahl: Mapped[int] = mapped_column(sqlalchemy.Integer)
+
+    def __repr__(self):
+        return(
+            f'<sqlKlasseBuchung(buchung_id={self.buchung_id},\
+                sitzung_id={self.sitzung_id},\
+                zeit_stamp={self.zeit_stamp},\
+                anzahl={self.anzahl},)>'
+            )
+
+
+###################################################################################################
+class sqlKlasseWartend(sql_basis):
+    """An instance of this class represents an entry in the SQL table
+    with the tablename Tabelle_Warteschlange, i. e. one order which waits
+    in the admission queue until the sliding window of the rate limit
+    has room for it (see constants.FLAGGE_WARTESCHLANGE_RATELIMIT).
+    """
+    __tablename__ = 'Tabelle_Warteschlange'
+
+    warte_id: Mapped[int] = mapped_column(
+        sqlalchemy.Integer,
+        primary_key=True,
+        autoincrement=True
+        )
+
+    # Id of the session (user of the web app, batch mode, ...) which sent the order
+    sitzung_id: Mapped[str] = mapped_column(sqlalchemy.String(200), index=True)
+    # Number of offers of the order
+    anzahl: Mapped[int] = mapped_column(sqlalchemy.Integer)
+    # Time of entering the queue as timestamp
+    eingang_stamp: Mapped[float] = mapped_column(sqlalchemy.Float, index=True)
+    # Time of the last check of the waiting order as timestamp (orders which are not checked
+    # anymore are removed from the queue)
+    abfrage_stamp: Mapped[float] = mapped_column(sqlalchemy.Float, index=True)
+    # Position in the queue at the last check (1 means next)
+    position: Mapped[int] = mapped_column(sqlalchemy.Integer)
+    # Expected time of admission at the last check as timestamp
+    frei_ab_stamp: Mapped[float] = mapped_column(sqlalchemy.Float)
+
+    def __repr__(self):
+        return(
+            f'<sqlKlasseWartend(warte_id={self.warte_id},\
+                sitzung_id={self.sitzung_id},\
+                anzahl={self.anzahl},\
+                eingang_stamp={self.eingang_stamp},\
+                abfrage_stamp={self.abfrage_stamp},\
+                position={self.position},\
+                frei_ab_stamp={self.frei_ab_stamp},)>'
+            )
+
+
+###################################################################################################
+class sqlKlasseSuchbegriff(sql_basis):
+    """An instance of this class represents an entry in the SQL table
+    with the tablename Tabelle_Suchbegriffe, i. e. the stored offers of
+    one search term for delta scraping.
+    """
+    __tablename__ = 'Tabelle_Suchbegriffe'
+
+    suchbegriff: Mapped[str] = mapped_column(
+        sqlalchemy.String(200),
+        primary_key=True
+        )
+
+    # URL of the newest stored offer (high-water mark)
+    hoch_href: Mapped[str] = mapped_column(sqlalchemy.String(500))
+    # Date of the newest stored offer as timestamp
+    hoch_zeitstempel: Mapped[int] = mapped_column(sqlalchemy.Integer)
+    # All offers on the website with a date from this timestamp on are stored
+    vollstaendig_ab_stamp: Mapped[int] = mapped_column(sqlalchemy.Integer)
+    # Number of stored offers
+    anzahl_anzeigen: Mapped[int] = mapped_column(sqlalchemy.Integer)
+    # Stored offers from offer_table.AnzeigenTabelle.funk_zu_bytes
+    daten: Mapped[bytes] = mapped_column(sqlalchemy.LargeBinary)
+    # Time of storing as timestamp
+    gespeichert_stamp: Mapped[int] = mapped_column(sqlalchemy.Integer)
+
+    def __repr__(self):
+        return(
+            f'<sqlKlasseSuchbegriff(suchbegriff={self.suchbegriff},\
+                hoch_href={self.hoch_href},\
+                hoch_zeitstempel={self.hoch_zeitstempel},\
+                vollstaendig_ab_stamp={self.vollstaendig_ab_stamp},\
+                anzahl_anzeigen={self.anzahl_anzeigen},\
+                gespeichert_stamp={self.gespeichert_stamp},)>'
+            )
@@ -9,12 +9,11 @@ Classes:\n
 ###################################################################################################
 import streamlit
 import streamlit.components.v1 as import_komponenten
-from streamlit_folium import folium_static
 
 import datetime
 import time
+import uuid
 import random
-import json
 import seaborn
 import matplotlib
 import matplotlib.pyplot as plt
@@ -22,6 +21,7 @@ import matplotlib.pyplot as plt
 ##################################################
 # Import modules from folder
 import constants
+import job_queue
 from eventmanager import Eventmanager
 import helpers
 
@@ -54,6 +54,8 @@ class UserInterface:
         input_max_anzeigenalter -- Maximum age of offers (in days) which
         should be included in the scraped sample selected by the user
         in the UI\n
+        input_nur_anzahlen -- Whether the user selected a counts-only
+        order in the UI\n
         liste_tabs -- List with tabs, each for one of the last three
         successfully processed orders sent by the user
         
@@ -64,13 +66,12 @@ class UserInterface:
         funk_ergebnisse_ausgeben -- Creates all result tabs: one tab for
         each of the last three successfully processed orders sent by the
         user.\n
-        funk_jobs_pruefen -- Checks whether there are open jobs, i. e.
-        the button was pressed by the user.\n
+        funk_jobs_pruefen -- Submits the order to the job queue when the
+        button was pressed by the user and collects its results when it
+        is done.\n
         funk_aufraeumen -- Cleans up and stops the script from running.
 
     Private methods:\n
-        _funk_dateien_abfragen -- Loads necessary files into
-        streamlit.session_state.\n
         _funk_header_erstellen -- Returns new header for web requests.
         _funk_startseite_einrichten -- Sets up basic user interface
         template.\n
@@ -110,6 +111,7 @@ class UserInterface:
         self.input_suchbegriff = None
         self.input_stichprobe = None
         self.input_max_anzeigenalter = None
+        self.input_nur_anzahlen = None
         self.liste_tabs = None
 
 
@@ -120,11 +122,12 @@ class UserInterface:
             self._funk_startseite_einrichten()
 
             # Create variables in streamlit.session_state for storing between runs
-            UserInterface._funk_dateien_abfragen()
             streamlit.session_state['Header'] = UserInterface._funk_header_erstellen()
             streamlit.session_state['Button_gedrueckt'] = False
             streamlit.session_state['Flagge_Ergebnis_gespeichert'] = False
             streamlit.session_state['Ergebnisse'] = {}
+            streamlit.session_state['Job_ID'] = None
+            streamlit.session_state['Sitzung_ID'] = uuid.uuid4().hex
 
             streamlit.session_state['User_Interface_eingerichtet'] = 'Startseite'
 
@@ -135,23 +138,6 @@ class UserInterface:
             self._funk_startseite_einrichten()
 
 
-    @staticmethod
-    def _funk_dateien_abfragen():
-        """Loads necessary files into streamlit.session_state."""
-        with open('Buch_PLZs.json', encoding='utf-8') as datei:
-            Buch_PLZs = json.load(datei)
-            streamlit.session_state['Buch_PLZs'] = Buch_PLZs
-        
-        with open('Geojson_Laender.geojson', encoding='utf-8') as datei:
-            geojson_laender = json.load(datei)
-            geojson_laender = json.dumps(geojson_laender)
-            streamlit.session_state['Geojson_Laender'] = geojson_laender
-
-        with open('Buch_Laender.json', encoding='utf-8') as datei:
-            buch_laender = json.load(datei)
-            streamlit.session_state['Buch_Laender'] = buch_laender
-
-
     @staticmethod
     def _funk_header_erstellen():
         """Returns new header for web requests."""
@@ -439,7 +425,13 @@ class UserInterface:
                     min_value=0, max_value=constants.GRENZE_ANZEIGENALTER_AUFTRAG,
                     value=constants.DEFAULT_MAX_ANZEIGENALTER_AUFTRAG, step=1
                     )
-                
+
+                streamlit.markdown('##### **Schnellmodus:**')
+                self.input_nur_anzahlen = streamlit.checkbox(
+                    '''Nur Anzeigenanzahlen je Bundesland (schneller, aber ohne Karte 1 und ohne
+                    Anzeigenanzahl und Anzeigenalter aus den Optionen oben)'''
+                    )
+
                 # The code of the if block is only executed in a run of the script if the user
                 # pressed the button in the previous run
                 if streamlit.form_submit_button(
@@ -506,7 +498,10 @@ class UserInterface:
 
         for key_x, value_x in streamlit.session_state['Ergebnisse'].items():
             suchbegriff = value_x['Suchbegriff']
-            liste_namen_tabs.append(f':red[{suchbegriff}]')
+            if value_x['Nur_Anzahlen'] == True:
+                liste_namen_tabs.append(f':red[{suchbegriff}] (nur Anzahlen)')
+            else:
+                liste_namen_tabs.append(f':red[{suchbegriff}]')
             liste_fuer_loop.append(key_x)
 
         liste_namen_tabs.reverse()
@@ -537,41 +532,54 @@ class UserInterface:
                                                 ['Stichprobe']
                     aufgetragen_max_anzeigenalter = streamlit.session_state['Ergebnisse'][x]\
                                                         ['Max_Anzeigenalter']
-                    anzeigenanzahl_manuell_gefunden = streamlit.session_state['Ergebnisse'][x]\
-                                                        ['Frame_Bericht']['Anzeigenanzahl'].\
-                                                        sum()
+                    flagge_nur_anzahlen = streamlit.session_state['Ergebnisse'][x]\
+                                            ['Nur_Anzahlen']
                     anzeigen_in_filtern_gefunden = streamlit.session_state['Ergebnisse'][x]\
                                                         ['Frame_Bericht']['Anzeigenanzahl_total']\
                                                         .sum()
                     
-                    if anzeigenanzahl_manuell_gefunden == aufgetragen_stichprobe:
-                        streamlit.write(f'''Du hast für deinen Suchbegriff
-                            "_{aufgetragen_suchbegriff}_" nach **{aufgetragen_stichprobe}**
-                            Anzeigen gesucht, die maximal {aufgetragen_max_anzeigenalter} Tage alt
-                            sein dürfen. Es wurden **{anzeigenanzahl_manuell_gefunden}** Anzeigen
-                            gefunden. Wahrscheinlich existieren auf Kleinanzeigen also noch mehr
-                            Anzeigen als die von dir angeforderte Menge auf. Es wird jedoch nur die
-                            angeforderte Menge in Karte 1 (Anzeigenstandorte) abgebildet.''')
-                    elif anzeigenanzahl_manuell_gefunden < aufgetragen_stichprobe:
-                        streamlit.write(f'''Du hast für deinen Suchbegriff
-                            "_{aufgetragen_suchbegriff}_" nach **{aufgetragen_stichprobe}**
-                            Anzeigen gesucht, die maximal {aufgetragen_max_anzeigenalter} Tage alt
-                            sein dürfen. Es wurden **{anzeigenanzahl_manuell_gefunden}** Anzeigen
-                            gefunden. Somit handelt es sich tatsächlich um die Gesamtmenge aller
-                            Anzeigen auf der Kleinanzeigen-Website, die _momentan_ mit den von dir
-                            gewählten Suchparametern gefunden werden kann! Diese werden in Karte 1
-                            (Anzeigenstandorte) abgebildet.''')
-
-                    streamlit.write('''Für Karte 2 (ANZEIGENQUOTE_TOTAL in Bundesländern) und die
-                        weiteren Auswertungen werden jedoch nicht die Daten aus Karte 1
-                        genutzt. Anstatt dessen werden die Angaben aus den Filtern der
-                        Kleinanzeigen-Website genutzt, mit welchen die Anzeigen nach
-                        (Bundes-)ländern gefiltert werden können. Die Anzahl der Anzeigen in diesen
-                        Filtern ist in der Regel größer als die der Anzeigen aus Karte 1
-                        (Anzeigenstandorte). Es werden in den Filtern nämlich _alle_ Anzeigen auf
-                        Kleinanzeigen unabhängig deiner Einstellungen in den Optionen dieser Web
-                        App berücksichtigt. Durch Verwendung dieser größeren Zahlen sind die
-                        Auswertungen in Karte 2 und die weiteren Berechnungen aussagekräftiger:''')
+                    if flagge_nur_anzahlen == True:
+                        streamlit.write('''Du hast für deinen Suchbegriff im Schnellmodus nur die
+                            Anzeigenanzahlen je Bundesland angefordert. Es wurden deshalb keine
+                            einzelnen Anzeigen gesammelt und Karte 1 (Anzeigenstandorte) entfällt.
+                            Karte 2 (ANZEIGENQUOTE_TOTAL in Bundesländern) und die weiteren
+                            Auswertungen beruhen auf den Angaben aus den Filtern der
+                            Kleinanzeigen-Website, mit welchen die Anzeigen nach (Bundes-)ländern
+                            gefiltert werden können.''')
+                    else:
+                        anzeigenanzahl_manuell_gefunden = streamlit.session_state['Ergebnisse'][x]\
+                                                            ['Frame_Bericht']['Anzeigenanzahl'].\
+                                                            sum()
+                        if anzeigenanzahl_manuell_gefunden == aufgetragen_stichprobe:
+                            streamlit.write(f'''Du hast für deinen Suchbegriff
+                                "_{aufgetragen_suchbegriff}_" nach **{aufgetragen_stichprobe}**
+                                Anzeigen gesucht, die maximal {aufgetragen_max_anzeigenalter} Tage
+                                alt sein dürfen. Es wurden **{anzeigenanzahl_manuell_gefunden}**
+                                Anzeigen gefunden. Wahrscheinlich existieren auf Kleinanzeigen also
+                                noch mehr Anzeigen als die von dir angeforderte Menge auf. Es wird
+                                jedoch nur die angeforderte Menge in Karte 1 (Anzeigenstandorte)
+                                abgebildet.''')
+                        elif anzeigenanzahl_manuell_gefunden < aufgetragen_stichprobe:
+                            streamlit.write(f'''Du hast für deinen Suchbegriff
+                                "_{aufgetragen_suchbegriff}_" nach **{aufgetragen_stichprobe}**
+                                Anzeigen gesucht, die maximal {aufgetragen_max_anzeigenalter} Tage
+                                alt sein dürfen. Es wurden **{anzeigenanzahl_manuell_gefunden}**
+                                Anzeigen gefunden. Somit handelt es sich tatsächlich um die
+                                Gesamtmenge aller Anzeigen auf der Kleinanzeigen-Website, die
+                                _momentan_ mit den von dir gewählten Suchparametern gefunden werden
+                                kann! Diese werden in Karte 1 (Anzeigenstandorte) abgebildet.''')
+
+                        streamlit.write('''Für Karte 2 (ANZEIGENQUOTE_TOTAL in Bundesländern) und
+                            die weiteren Auswertungen werden jedoch nicht die Daten aus Karte 1
+                            genutzt. Anstatt dessen werden die Angaben aus den Filtern der
+                            Kleinanzeigen-Website genutzt, mit welchen die Anzeigen nach
+                            (Bundes-)ländern gefiltert werden können. Die Anzahl der Anzeigen in
+                            diesen Filtern ist in der Regel größer als die der Anzeigen aus Karte 1
+                            (Anzeigenstandorte). Es werden in den Filtern nämlich _alle_ Anzeigen
+                            auf Kleinanzeigen unabhängig deiner Einstellungen in den Optionen
+                            dieser Web App berücksichtigt. Durch Verwendung dieser größeren Zahlen
+                            sind die Auswertungen in Karte 2 und die weiteren Berechnungen
+                            aussagekräftiger:''')
                         
                     streamlit.write(f'''Für deinen Suchbegriff "_{aufgetragen_suchbegriff}_" wurden
                         in den Filtern **{anzeigen_in_filtern_gefunden}** Anzeigen gefunden. Im
@@ -580,17 +588,26 @@ class UserInterface:
                         Kleinanzeigen für deinen Suchbegriff. Für jedes Bundesland exisitiert also
                         solch ein Wert, der die totale Menge der Anzeigen in diesem Bundesland
                         darstellt.''')
-                    streamlit.write('''Mit "_Anzeigenanzahl_" wird lediglich die Menge bezeichnet,
-                        die mittels der Suche für Karte 1 gefunden wurde.''')
+                    if flagge_nur_anzahlen == False:
+                        streamlit.write('''Mit "_Anzeigenanzahl_" wird lediglich die Menge bezeichnet,
+                            die mittels der Suche für Karte 1 gefunden wurde.''')
                     streamlit.markdown('''Eine weitere Erläuterung dieser und weiterer Variablen
                         findest du [unten in der Anleitung](#erlaeuterung-der-variablen).''')
 
-                    streamlit.markdown('### **Karte 1 (Anzeigenstandorte):**')
-                    if streamlit.session_state['Ergebnisse'][x]['Karte_Standorte'] != None:
+                    # There is no map with the locations of the offers for counts-only orders
+                    if flagge_nur_anzahlen == False:
+                        streamlit.markdown('### **Karte 1 (Anzeigenstandorte):**')
+
+                    if flagge_nur_anzahlen == True:
+                        pass
+                    elif streamlit.session_state['Ergebnisse'][x]['Karte_Standorte'] != None:
                         streamlit.write('''Klicke auf einen Marker, um den vollen Titel der Anzeige
                             zu lesen! Klickst du dann noch auf diesen vollen Titel, wird sich ein
                             Link zu der Anzeige in einem neuen Tab öffnen!''')
-                        folium_static(streamlit.session_state['Ergebnisse'][x]['Karte_Standorte'])
+                        import_komponenten.html(
+                            streamlit.session_state['Ergebnisse'][x]['Karte_Standorte'],
+                            width=700, height=510
+                            )
                     elif streamlit.session_state['Ergebnisse'][x]['Karte_Standorte'] == None:
                         streamlit.write('ACHTUNG!: Fehler bei Erstellung von Karte 1!')
       
@@ -618,9 +635,10 @@ class UserInterface:
                             2011 und entsprechen nicht den Daten, die in dieser Web App verwendet
                             wurden!).''')
                         
-                        folium_static(streamlit.session_state['Ergebnisse'][x]\
-                                      ['Karte_Anzeigenquote']
-                                      )
+                        import_komponenten.html(
+                            streamlit.session_state['Ergebnisse'][x]['Karte_Anzeigenquote'],
+                            width=700, height=510
+                            )
                     elif streamlit.session_state['Ergebnisse'][x]['Karte_Anzeigenquote'] == None:
                         streamlit.write('ACHTUNG!: Fehler bei Erstellung von Karte 2!')
 
@@ -734,7 +752,10 @@ class UserInterface:
                                       'Anzeigenanzahl_erwartet': '{:.2f}',
                                       'Gewicht_Einwohnerzahl': '{:.3f}'
                                       }
-                            
+                            # Counts-only orders have no columns for the scraped offers
+                            format = {k: v for k, v in format.items()
+                                      if k in frame_bericht_geladen.columns}
+
                             def funk_schriftfarbe_anpassen(arg_x):
                                 """Function for setting font color in streamlit.dataframe."""
                                 if type(arg_x) == str:
@@ -753,19 +774,111 @@ class UserInterface:
             
     
     def funk_jobs_pruefen(self):
-        """Checks whether there are open jobs, i. e. whether the button
-        was pressed by the user.
-        """    
+        """Checks whether there are open jobs. If the button was pressed
+        by the user, the order is submitted to the job queue. As long as
+        the order is waiting or being processed, the script is run again
+        every JOB_ABFRAGE_SEKUNDEN seconds. When it is done, its results
+        are collected and the eventmanager is told about it.
+        """
+        job_warteschlange = job_queue.funk_job_warteschlange_erstellen()
+
         if streamlit.session_state['Button_gedrueckt'] == True:
-            # Tell the eventmanager that the button was pressed by the user
+            streamlit.session_state['Button_gedrueckt'] = False
+
+            if streamlit.session_state['Job_ID'] != None:
+                self.funk_feedback_ausgeben(
+                    arg_art='Fehler',
+                    arg_nachricht='''ACHTUNG!: Dein vorheriger Auftrag wird noch bearbeitet.
+                        Bitte warte, bis er fertig ist, bevor du einen neuen Auftrag sendest!'''
+                    )
+            else:
+                streamlit.session_state['Job_ID'] = job_warteschlange.funk_job_einreichen(
+                    arg_auftrag_suchbegriff=self.input_suchbegriff,
+                    arg_auftrag_stichprobe=self.input_stichprobe,
+                    arg_auftrag_max_anzeigenalter=self.input_max_anzeigenalter,
+                    arg_auftrag_nur_anzahlen=self.input_nur_anzahlen,
+                    arg_sitzung_id=streamlit.session_state['Sitzung_ID']
+                    )
+
+                if streamlit.session_state['Job_ID'] == None:
+                    self.eventmanager.funk_event_eingetreten(
+                        arg_event_name='Vorzeitig_abgebrochen',
+                        arg_argumente_von_event={
+                            'arg_art': 'Fehler',
+                            'arg_nachricht': '''ACHTUNG!: Gerade werden (von möglicherweise
+                                verschiedenen Personen) bereits zu viele Aufträge bearbeitet.
+                                Bitte versuche es in ein paar Sekunden erneut!'''
+                            }
+                        )
+
+        if streamlit.session_state['Job_ID'] == None:
+            return()
+
+        buch_status = job_warteschlange.funk_status(arg_job_id=streamlit.session_state['Job_ID'])
+
+        # Wait a moment and run the script again as long as the order is not done
+        if buch_status != None and buch_status['Status'] != 'Fertig':
+            buch_warteschlange = None
+            if (buch_status['Status'] == 'Laeuft'
+                    and constants.FLAGGE_WARTESCHLANGE_RATELIMIT == True
+                    and constants.ART_RATELIMIT == 'Gleitend'):
+                # Imported here, because workers imports this module
+                from workers import sqlWorker
+
+                buch_warteschlange = sqlWorker.funk_warteschlange_abfragen(
+                    arg_sitzung_id=streamlit.session_state['Sitzung_ID']
+                    )
+
+            if buch_status['Status'] == 'Wartend':
+                nachricht_spinner = f'''Dein Auftrag wartet auf seine Bearbeitung (Aufträge vor
+                    dir: {buch_status['Position']}).'''
+            elif buch_warteschlange != None:
+                nachricht_spinner = f'''Das Rate Limit ist gerade ausgeschöpft, dein Auftrag
+                    wartet auf freies Kontingent (Position {buch_warteschlange['Position']},
+                    voraussichtlich noch {buch_warteschlange['Sekunden']} Sekunden).'''
+            else:
+                nachricht_spinner = 'Deine Daten werden gerade gesammelt und analysiert.'
+
+            with self.platzhalter_ausgabe_spinner_02:
+                with streamlit.spinner(nachricht_spinner):
+                    time.sleep(constants.JOB_ABFRAGE_SEKUNDEN)
+
+            streamlit.rerun()
+
+        buch_job = job_warteschlange.funk_ergebnis_abholen(
+            arg_job_id=streamlit.session_state['Job_ID']
+            )
+        streamlit.session_state['Job_ID'] = None
+
+        # The order is unknown, e. g. after a restart of the web app
+        if buch_job == None:
             self.eventmanager.funk_event_eingetreten(
-                arg_event_name='Button_gedrueckt',
+                arg_event_name='Vorzeitig_abgebrochen',
                 arg_argumente_von_event={
-                    'arg_auftrag_suchbegriff': self.input_suchbegriff,
-                    'arg_auftrag_stichprobe': self.input_stichprobe,
-                    'arg_auftrag_max_anzeigenalter': self.input_max_anzeigenalter,
+                    'arg_art': 'Fehler',
+                    'arg_nachricht': '''ACHTUNG!: Dein Auftrag ist leider verloren gegangen.
+                        Bitte sende ihn erneut!'''
                     }
                 )
+
+        # Results of an order with the same parameters replace the old ones and become the newest
+        for order_id_x, buch_ergebnis_x in buch_job['Ergebnisse'].items():
+            streamlit.session_state['Ergebnisse'].pop(order_id_x, None)
+            streamlit.session_state['Ergebnisse'][order_id_x] = buch_ergebnis_x
+
+        if buch_job['Art'] == 'Erfolg':
+            event_name = 'Fertig_analysiert'
+        else:
+            event_name = 'Vorzeitig_abgebrochen'
+
+        # Tell the eventmanager that the order is done
+        self.eventmanager.funk_event_eingetreten(
+            arg_event_name=event_name,
+            arg_argumente_von_event={
+                'arg_art': buch_job['Art'],
+                'arg_nachricht': buch_job['Nachricht']
+                }
+            )
             
 
     def funk_aufraeumen(
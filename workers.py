@@ -17,17 +17,17 @@ import streamlit
 
 import datetime
 import time
+import math
+import concurrent.futures
 from statistics import mean
 import socket
 import subprocess
 import copy
 import os
+import contextlib
+import warnings
 
-import psycopg2
-from psycopg2.errors import ProgrammingError
-from psycopg2.errors import UndefinedTable
 import sqlalchemy
-from sqlalchemy import create_engine
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.orm import Mapped
 from sqlalchemy.orm import mapped_column
@@ -39,20 +39,29 @@ import numpy
 import folium
 from branca.element import Figure
 import pandas
-import geopandas
-import matplotlib.pyplot as plt
-import PIL
+import matplotlib
+import matplotlib.figure
 import seaborn
 
-import requests
-from lxml import html
 
 ##################################################
 # Import modules from folder
 import helpers
 import constants
+import http_client
+import sql_pool
+import quota_lease
+import response_cache
+import figure_cache
+import pacing
+import offer_parser
+import offer_table
+from data_context import Datenkontext
 from sql_schema import sql_basis
 from sql_schema import sqlKlasseTracker
+from sql_schema import sqlKlasseBuchung
+from sql_schema import sqlKlasseWartend
+from sql_schema import sqlKlasseSuchbegriff
 from eventmanager import Eventmanager
 from user_interface import UserInterface
 
@@ -68,24 +77,58 @@ class sqlWorker:
         not being prefixed with an underscore.\n
         eventmanager -- Instance of Eventmanager to work with\n
         user_interface -- Instance of UserInterface to work with\n
-        engine_erstellt -- Engine for postgreSQL database\n
+        engine_erstellt -- Engine for the database (PostgreSQL or SQLite,
+        see SQL_BACKEND)\n
         sql_session_macher -- Instance of sessionmaker which works with
         attribute engine_erstellt\n
         sql_session_erstellt -- Active SQL session of the instance to
         work with\n
-        tracker_objekt -- Object from database query which holds
-        information about the current workload of the web app
-        caused by all users
+        tracker_objekt -- Row of the tracker table from the last check
+        of the rate limit which holds information about the current
+        workload of the web app caused by all users\n
+        sitzung_id -- Id of the session whose orders are checked (for
+        the share of the session in the sliding window of the rate
+        limit)\n
+        sekunden_bis_frei -- Seconds until the last order which was not
+        allowed would be allowed (None if unknown)\n
+        warte_id -- Id of the entry of the current order in the
+        admission queue or None if it does not wait\n
+        max_sekunden_warteschlange -- Maximum seconds which an order
+        waits in the admission queue (MAX_SEKUNDEN_WARTESCHLANGE)
         
     Public methods:\n
         funk_sql_tracker_updaten -- Checks if a scraping order is
-        allowed to be executed.
+        allowed to be executed.\n
+        funk_warteschlange_abfragen -- Returns position and expected
+        waiting time of the waiting order of a session.\n
+        funk_suchbegriff_laden -- Returns the stored offers of a search
+        term for delta scraping.\n
+        funk_suchbegriff_speichern -- Stores the offers of a search term
+        for delta scraping.
 
     Private methods:\n
-        _funk_sql_engine_erstellen -- Returns a created engine for a
-        postgreSQL database.\n
+        _funk_sql_engine_erstellen -- Returns a created engine for the
+        database.\n
         _funk_db_pfad_erstellen -- Returns the path of the postgreSQL
         database on the local machine.\n
+        _funk_sql_zeitraum_buchen -- Checks the rate limit in fixed
+        timeframes and books the order on the tracker.\n
+        _funk_sql_fenster_buchen -- Checks the rate limit in a sliding
+        window and books the order in table Tabelle_Buchungen.\n
+        _funk_fenster_auswerten -- Checks an order against the bookings
+        in the sliding window.\n
+        _funk_sql_warteschlange_pruefen -- Checks an order against the
+        sliding window and the admission queue.\n
+        _funk_sql_warteschlange_verlassen -- Removes the current order
+        from the admission queue.\n
+        _funk_sql_tracker_anlegen -- Creates the tracker if there is
+        none yet.\n
+        _funk_sql_tracker_buchen -- Books an order on the tracker in
+        one single atomic statement if the rate limit allows it.\n
+        _funk_sql_quote_zurueckgeben -- Gives the unused quota of an
+        expired lease back to the tracker.\n
+        _funk_sql_rest_zurueckgeben -- Subtracts unused quota from the
+        sum of the tracker.\n
         _funk_sql_add_und_commit_all -- Adds and commits all (changed)
         objects from a list to the database.\n
         _funk_sql_commit -- Executes a controlled commit to the
@@ -100,16 +143,27 @@ class sqlWorker:
     def __init__(
             self,
             init_eventmanager: Eventmanager,
-            init_user_interface: UserInterface
+            init_user_interface: UserInterface,
+            init_sitzung_id: str = None
             ):
         """Inits sqlWorker.
 
         Keyword arguments:\n
         init_eventmanager -- Active instance of class Eventmanager\n
-        init_user_interface -- Active instance of class UserInterface
+        init_user_interface -- Active instance of class UserInterface\n
+        init_sitzung_id -- Id of the session whose orders are checked
+        (None means that all orders without a session share one id)
         """
         self.eventmanager = init_eventmanager
         self.user_interface = init_user_interface
+
+        if init_sitzung_id == None:
+            self.sitzung_id = 'Ohne_Sitzung'
+        else:
+            self.sitzung_id = init_sitzung_id
+        self.sekunden_bis_frei = None
+        self.warte_id = None
+        self.max_sekunden_warteschlange = constants.MAX_SEKUNDEN_WARTESCHLANGE
         
         self.engine_erstellt = sqlWorker._funk_sql_engine_erstellen()
         self.sql_session_macher = sessionmaker(bind=self.engine_erstellt)
@@ -120,19 +174,21 @@ class sqlWorker:
 
 
     @staticmethod
-    @streamlit.cache_resource(ttl=3600, show_spinner=False)
+    @streamlit.cache_resource(show_spinner=False)
     def _funk_sql_engine_erstellen():
-        """Returns a created engine for a postgreSQL database."""
-        if socket.gethostbyname(socket.gethostname()) == constants.LOKALE_IP:
+        """Returns a created engine for the database set in SQL_BACKEND
+        (PostgreSQL or embedded SQLite) with the pool of connections
+        configured in constants.py (shared by all users, see
+        sql_pool.py).
+        """
+        if constants.SQL_BACKEND == 'SQLite':
+            db_pfad = sql_pool.funk_sqlite_url_erstellen()
+        elif socket.gethostbyname(socket.gethostname()) == constants.LOKALE_IP:
             db_pfad = sqlWorker._funk_db_pfad_erstellen()
         else:
             db_pfad = str(os.environ['DATABASE_URL']).replace('postgres', 'postgresql')
 
-        sql_engine = create_engine(
-            db_pfad,
-            echo=False,
-            poolclass=sqlalchemy.pool.NullPool
-            )
+        sql_engine = sql_pool.funk_engine_erstellen(arg_db_pfad=db_pfad)
 
         return(sql_engine)
     
@@ -162,65 +218,56 @@ class sqlWorker:
         
     def funk_sql_tracker_updaten(
             self,
-            arg_stichprobe: int
+            arg_stichprobe: int,
+            arg_flagge_abbrechen: bool = True
             ):
         """Returns True if a scraping order is allowed to be executed,
-        otherwise returns False.
+        otherwise returns False. The rate limit is checked in the kind
+        set in ART_RATELIMIT. With the admission queue, an order which
+        does not fit waits for its turn (at most attribute
+        max_sekunden_warteschlange seconds) before it is not allowed.
         
         Keyword arguments:\n
-        Arg_Stichprobe -- Number of offers that should be scraped
+        Arg_Stichprobe -- Number of offers that should be scraped\n
+        arg_flagge_abbrechen -- Whether the order is aborted (event
+        Vorzeitig_abgebrochen) if it is not allowed to be executed
+        (False e. g. for batch orders which wait for the next timeframe)
         """
         zeit_jetzt = datetime.datetime.now()
-        zeit_jetzt_stamp = int(zeit_jetzt.timestamp())
-        flagge_ausfuehren = True
 
-        # SQL query to get current status of the tracker_objekt
-        self.tracker_objekt = self.sql_session_erstellt.query(sqlKlasseTracker).first()
-        
-        # Create new object tracker_objekt if there is none in the database
-        if self.tracker_objekt == None:
-            self.tracker_objekt=sqlKlasseTracker(
-                tracker_id='Tracker_00',
-                letzter_job_zeit=str(zeit_jetzt),
-                letzter_job_zeit_stamp=zeit_jetzt_stamp,
-                summe_n_aktuell_in_zeitraum=arg_stichprobe,
-                letzte_nullung_stamp=zeit_jetzt_stamp
-                )
-        
-        # Check if the incoming order suceeds the limit for simultaneously processed orders over
-        # all users
-        elif self.tracker_objekt != None:
-            letzte_nullung_vor_sek = zeit_jetzt_stamp - self.tracker_objekt.letzte_nullung_stamp
-            naechste_nullung_in_sek = constants.ZEITRAUM_FUER_RATELIMIT - letzte_nullung_vor_sek
-
-            if letzte_nullung_vor_sek > constants.ZEITRAUM_FUER_RATELIMIT:
-                setattr(self.tracker_objekt, 'summe_n_aktuell_in_zeitraum', 0)
-                setattr(self.tracker_objekt, 'letzte_nullung_stamp', zeit_jetzt_stamp)
-                self._funk_sql_add_und_commit_all([self.tracker_objekt])
-
-            zeit_diff_letzter_job = zeit_jetzt_stamp - self.tracker_objekt.letzter_job_zeit_stamp
-
-            if zeit_diff_letzter_job <= constants.ZEITRAUM_FUER_RATELIMIT:
-                kontingent_offen = (constants.N_FUER_RATELIMIT
-                                    - self.tracker_objekt.summe_n_aktuell_in_zeitraum)
-                if kontingent_offen < arg_stichprobe:
-                    flagge_ausfuehren = False
+        if constants.ART_RATELIMIT == 'Fest':
+            funk_buchen = self._funk_sql_zeitraum_buchen
+        else:
+            funk_buchen = self._funk_sql_fenster_buchen
 
-            # If the rate limit is not reached, allow the processing of the order
-            if flagge_ausfuehren == True:
-                setattr(self.tracker_objekt, 'summe_n_aktuell_in_zeitraum',
-                        self.tracker_objekt.summe_n_aktuell_in_zeitraum + arg_stichprobe)
-                setattr(self.tracker_objekt, 'letzter_job_zeit', str(zeit_jetzt))
-                setattr(self.tracker_objekt, 'letzter_job_zeit_stamp', zeit_jetzt_stamp)
+        flagge_ausfuehren, self.sekunden_bis_frei, kontingent_offen = funk_buchen(
+            arg_stichprobe=arg_stichprobe,
+            arg_zeit_jetzt=zeit_jetzt
+            )
+
+        # The order is in the admission queue and is checked again until it is its turn. It is not
+        # kept waiting if it would not be its turn within attribute max_sekunden_warteschlange.
+        if self.warte_id != None:
+            zeit_ende = time.time() + self.max_sekunden_warteschlange
+
+            while (flagge_ausfuehren == False
+                   and self.sekunden_bis_frei <= zeit_ende - time.time()):
+                time.sleep(constants.SEKUNDEN_WARTESCHLANGE_ABFRAGE)
+
+                flagge_ausfuehren, self.sekunden_bis_frei, kontingent_offen = funk_buchen(
+                    arg_stichprobe=arg_stichprobe,
+                    arg_zeit_jetzt=datetime.datetime.now()
+                    )
+
+            if flagge_ausfuehren == False:
+                self._funk_sql_warteschlange_verlassen()
 
-        self._funk_sql_add_und_commit_all([self.tracker_objekt])
-        
         # If the rate limit is reached, do not allow the processing of the order and stop script
         # from running
-        if flagge_ausfuehren == False:                    
+        if flagge_ausfuehren == False and arg_flagge_abbrechen == True:
             nachricht_fehler = f'''ACHTUNG!: In den letzten {constants.ZEITRAUM_FUER_RATELIMIT}
                 Sekunden wurden (von möglicherweise verschiedenen Personen) bereits zu viele
-                Aufträge an diese Web App gesendet. Bitte versuche es in {naechste_nullung_in_sek}
+                Aufträge an diese Web App gesendet. Bitte versuche es in {self.sekunden_bis_frei}
                 Sekunden erneut oder verringere die gesuchte Anzeigenanzahl in den Optionen auf
                 höchstens {kontingent_offen} Anzeigen!
                 [Hier](#hinweis-zum-rate-limiting) findest du einen Hinweis zum Rate Limiting.
@@ -233,8 +280,715 @@ class sqlWorker:
                                         'arg_nachricht': nachricht_fehler
                                         }
                 )
-    
-    
+
+        return(flagge_ausfuehren)
+
+
+    @staticmethod
+    def funk_warteschlange_abfragen(arg_sitzung_id: str):
+        """Returns a dict with keys 'Position' (1 means next) and
+        'Sekunden' (expected waiting time) for the order of the session
+        which waits in the admission queue or None if there is none.
+
+        Keyword arguments:\n
+        arg_sitzung_id -- Id of the session
+        """
+        tabelle_warteschlange = sqlKlasseWartend.__table__
+
+        try:
+            with sqlWorker._funk_sql_engine_erstellen().connect() as verbindung:
+                wartend_objekt = verbindung.execute(
+                    sqlalchemy.select(tabelle_warteschlange).\
+                        where(tabelle_warteschlange.c.sitzung_id == arg_sitzung_id).\
+                        order_by(tabelle_warteschlange.c.eingang_stamp)
+                    ).first()
+        except Exception as fehler:
+            helpers.funk_drucken('ACHTUNG!: Fehler in sqlWorker.funk_warteschlange_abfragen')
+            helpers.funk_drucken('Exception:', str(type(fehler).__name__))
+            return(None)
+
+        if wartend_objekt == None:
+            return(None)
+
+        return({
+            'Position': wartend_objekt.position,
+            'Sekunden': max(math.ceil(wartend_objekt.frei_ab_stamp - time.time()), 0)
+            })
+
+
+    def funk_suchbegriff_laden(
+            self,
+            arg_suchbegriff: str
+            ):
+        """Returns a dict with the stored offers of the search term (as
+        instance of offer_table.AnzeigenTabelle) and their high-water
+        mark for delta scraping or None if there are none or they are
+        older than TTL_SEKUNDEN_DELTA.
+
+        Keyword arguments:\n
+        arg_suchbegriff -- Normalized search term
+        """
+        try:
+            suchbegriff_objekt = self.sql_session_erstellt.get(sqlKlasseSuchbegriff, arg_suchbegriff)
+        except Exception as fehler:
+            helpers.funk_drucken('ACHTUNG!: Fehler in sqlWorker.funk_suchbegriff_laden')
+            helpers.funk_drucken('Exception:', str(type(fehler).__name__))
+            self.sql_session_erstellt.rollback()
+            return(None)
+
+        # End the reading transaction, so the connection goes back to the pool while the order is
+        # scraped (the expunged object keeps its loaded attributes)
+        if suchbegriff_objekt != None:
+            self.sql_session_erstellt.expunge(suchbegriff_objekt)
+        self.sql_session_erstellt.rollback()
+
+        if suchbegriff_objekt == None:
+            return(None)
+
+        zeit_jetzt_stamp = int(datetime.datetime.now().timestamp())
+        if zeit_jetzt_stamp - suchbegriff_objekt.gespeichert_stamp > constants.TTL_SEKUNDEN_DELTA:
+            return(None)
+
+        return({
+            'tabelle_anzeigen': offer_table.AnzeigenTabelle.funk_aus_bytes(suchbegriff_objekt.daten),
+            'hoch_href': suchbegriff_objekt.hoch_href,
+            'hoch_zeitstempel': suchbegriff_objekt.hoch_zeitstempel,
+            'vollstaendig_ab_stamp': suchbegriff_objekt.vollstaendig_ab_stamp
+            })
+
+
+    def funk_suchbegriff_speichern(
+            self,
+            arg_suchbegriff: str,
+            arg_tabelle_anzeigen: offer_table.AnzeigenTabelle,
+            arg_vollstaendig_ab_stamp: int
+            ):
+        """Stores the offers of the search term (sorted from new to old)
+        for delta scraping. Only the newest MAX_ANZEIGEN_DELTA offers are
+        kept.
+
+        Keyword arguments:\n
+        arg_suchbegriff -- Normalized search term\n
+        arg_tabelle_anzeigen -- Instance of offer_table.AnzeigenTabelle
+        with at least one offer\n
+        arg_vollstaendig_ab_stamp -- All offers on the website with a
+        date from this timestamp on are in argument arg_tabelle_anzeigen
+        """
+        anzahl_anzeigen = min(len(arg_tabelle_anzeigen), constants.MAX_ANZEIGEN_DELTA)
+
+        # Without the cut off offers the stored ones are only complete down to the date of the last
+        # one (offers of that very date may be missing)
+        if anzahl_anzeigen < len(arg_tabelle_anzeigen):
+            arg_vollstaendig_ab_stamp = max(
+                arg_vollstaendig_ab_stamp,
+                int(arg_tabelle_anzeigen.array_zeitstempel[anzahl_anzeigen - 1]) + 1
+                )
+
+        try:
+            suchbegriff_objekt = self.sql_session_erstellt.get(sqlKlasseSuchbegriff, arg_suchbegriff)
+        except Exception as fehler:
+            helpers.funk_drucken('ACHTUNG!: Fehler in sqlWorker.funk_suchbegriff_speichern')
+            helpers.funk_drucken('Exception:', str(type(fehler).__name__))
+            self.sql_session_erstellt.rollback()
+            return()
+
+        if suchbegriff_objekt == None:
+            suchbegriff_objekt = sqlKlasseSuchbegriff(suchbegriff=arg_suchbegriff)
+
+        suchbegriff_objekt.hoch_href = arg_tabelle_anzeigen.liste_href[0]
+        suchbegriff_objekt.hoch_zeitstempel = int(arg_tabelle_anzeigen.array_zeitstempel[0])
+        suchbegriff_objekt.vollstaendig_ab_stamp = int(arg_vollstaendig_ab_stamp)
+        suchbegriff_objekt.anzahl_anzeigen = anzahl_anzeigen
+        suchbegriff_objekt.daten = arg_tabelle_anzeigen.funk_zu_bytes(arg_max_anzeigen=anzahl_anzeigen)
+        suchbegriff_objekt.gespeichert_stamp = int(datetime.datetime.now().timestamp())
+
+        self._funk_sql_add_und_commit_all([suchbegriff_objekt])
+
+
+    def _funk_sql_zeitraum_buchen(
+            self,
+            arg_stichprobe: int,
+            arg_zeit_jetzt: datetime.datetime
+            ):
+        """Checks the rate limit in fixed timeframes (ART_RATELIMIT =
+        'Fest') and books the order on the tracker if it is allowed.
+        Returns a tuple with a flag whether the order is allowed, the
+        seconds until the next timeframe and the number of offers which
+        are still allowed in the current timeframe (both None if the
+        order is allowed).
+
+        Keyword arguments:\n
+        arg_stichprobe -- Number of offers that should be scraped\n
+        arg_zeit_jetzt -- Current time
+        """
+        zeit_jetzt_stamp = int(arg_zeit_jetzt.timestamp())
+        flagge_ausfuehren = True
+        naechste_nullung_in_sek = None
+        kontingent_offen = None
+
+        # Most orders are admitted from the quota leased by this process without a round trip to the
+        # database (see quota_lease.py). Only if it is not enough, a new block is leased.
+        if constants.FLAGGE_QUOTEN_LEASING == True:
+            quoten_leasing = quota_lease.funk_quoten_leasing_erstellen()
+            sperre_leasing = quoten_leasing.sperre_datenbank
+            n_buchen = max(arg_stichprobe, constants.N_QUOTEN_LEASING_BLOCK)
+
+            if quoten_leasing.funk_zulassen(
+                    arg_stichprobe=arg_stichprobe,
+                    arg_zeit_jetzt_stamp=arg_zeit_jetzt.timestamp()
+                    ) == True:
+                return((True, None, None))
+        else:
+            quoten_leasing = None
+            sperre_leasing = contextlib.nullcontext()
+            n_buchen = arg_stichprobe
+
+        with sperre_leasing:
+            # Another thread of the process may have leased a new block in the meantime
+            if quoten_leasing != None:
+                if quoten_leasing.funk_zulassen(
+                        arg_stichprobe=arg_stichprobe,
+                        arg_zeit_jetzt_stamp=arg_zeit_jetzt.timestamp()
+                        ) == True:
+                    return((True, None, None))
+
+            # The check and the update of the tracker are one single statement in autocommit mode,
+            # so concurrent orders cannot be admitted with the same sum and an admitted order costs
+            # only one round trip to the database
+            with self.engine_erstellt.connect() as verbindung:
+                verbindung.execution_options(isolation_level='AUTOCOMMIT')
+
+                if quoten_leasing != None:
+                    self._funk_sql_quote_zurueckgeben(
+                        arg_verbindung=verbindung,
+                        arg_quoten_leasing=quoten_leasing,
+                        arg_zeit_jetzt_stamp=arg_zeit_jetzt.timestamp()
+                        )
+
+                self.tracker_objekt = self._funk_sql_tracker_buchen(
+                    arg_verbindung=verbindung,
+                    arg_stichprobe=n_buchen,
+                    arg_zeit_jetzt=arg_zeit_jetzt
+                    )
+
+                # Create the tracker if there is none in the database yet (if another order creates
+                # it at the same time, the insert fails and the tracker of the other order is used)
+                if self.tracker_objekt == None:
+                    self._funk_sql_tracker_anlegen(arg_verbindung=verbindung,
+                                                   arg_zeit_jetzt=arg_zeit_jetzt)
+
+                    self.tracker_objekt = self._funk_sql_tracker_buchen(
+                        arg_verbindung=verbindung,
+                        arg_stichprobe=n_buchen,
+                        arg_zeit_jetzt=arg_zeit_jetzt
+                        )
+
+                # Close to the limit there may be enough quota left for the order, but not for a
+                # whole block
+                if self.tracker_objekt == None and n_buchen > arg_stichprobe:
+                    n_buchen = arg_stichprobe
+                    self.tracker_objekt = self._funk_sql_tracker_buchen(
+                        arg_verbindung=verbindung,
+                        arg_stichprobe=n_buchen,
+                        arg_zeit_jetzt=arg_zeit_jetzt
+                        )
+
+                if self.tracker_objekt != None and quoten_leasing != None:
+                    quoten_leasing.funk_lease_uebernehmen(
+                        arg_n_geleast=n_buchen,
+                        arg_nullung_stamp=self.tracker_objekt.letzte_nullung_stamp,
+                        arg_stichprobe=arg_stichprobe,
+                        arg_zeit_jetzt_stamp=arg_zeit_jetzt.timestamp(),
+                        arg_funk_rueckgabe=sqlWorker._funk_sql_rest_zurueckgeben
+                        )
+
+                # Only if the order is not admitted, the tracker is read for the message to the user
+                if self.tracker_objekt == None:
+                    flagge_ausfuehren = False
+
+                    self.tracker_objekt = verbindung.execute(
+                        sqlalchemy.select(sqlKlasseTracker.__table__).where(
+                            sqlKlasseTracker.__table__.c.tracker_id == 'Tracker_00'
+                            )
+                        ).first()
+
+                    letzte_nullung_vor_sek = (zeit_jetzt_stamp
+                                              - self.tracker_objekt.letzte_nullung_stamp)
+                    naechste_nullung_in_sek = (constants.ZEITRAUM_FUER_RATELIMIT
+                                               - letzte_nullung_vor_sek)
+                    kontingent_offen = (constants.N_FUER_RATELIMIT
+                                        - self.tracker_objekt.summe_n_aktuell_in_zeitraum)
+
+        return((flagge_ausfuehren, naechste_nullung_in_sek, kontingent_offen))
+
+
+    def _funk_sql_fenster_buchen(
+            self,
+            arg_stichprobe: int,
+            arg_zeit_jetzt: datetime.datetime
+            ):
+        """Checks the rate limit in a sliding window (ART_RATELIMIT =
+        'Gleitend') and adds the order to table Tabelle_Buchungen if it is
+        allowed. Returns a tuple like _funk_sql_zeitraum_buchen, but with
+        the exact seconds until the order would be allowed (see
+        _funk_fenster_auswerten) or, with the admission queue, the
+        expected waiting time (see _funk_sql_warteschlange_pruefen).
+
+        Keyword arguments:\n
+        arg_stichprobe -- Number of offers that should be scraped\n
+        arg_zeit_jetzt -- Current time
+        """
+        zeit_jetzt_stamp = arg_zeit_jetzt.timestamp()
+        fenster_start_stamp = zeit_jetzt_stamp - constants.ZEITRAUM_FUER_RATELIMIT
+        tabelle_buchungen = sqlKlasseBuchung.__table__
+        spalten_tracker = sqlKlasseTracker.__table__.c
+
+        # Second try only if the tracker had to be created first
+        for _ in range(2):
+            with self.engine_erstellt.begin() as verbindung:
+                # Updating the tracker first locks its row (the database in SQLite) until the
+                # commit, so the bookings of concurrent orders are checked one after another
+                self.tracker_objekt = verbindung.execute(
+                    sqlalchemy.update(sqlKlasseTracker.__table__).\
+                        where(spalten_tracker.tracker_id == 'Tracker_00').\
+                        values(
+                            letzter_job_zeit=str(arg_zeit_jetzt),
+                            letzter_job_zeit_stamp=int(zeit_jetzt_stamp)
+                            ).\
+                        returning(*spalten_tracker)
+                    ).first()
+
+                if self.tracker_objekt != None:
+                    verbindung.execute(
+                        sqlalchemy.delete(tabelle_buchungen).where(
+                            tabelle_buchungen.c.zeit_stamp <= fenster_start_stamp
+                            )
+                        )
+
+                    liste_buchungen = verbindung.execute(
+                        sqlalchemy.select(
+                            tabelle_buchungen.c.sitzung_id,
+                            tabelle_buchungen.c.zeit_stamp,
+                            tabelle_buchungen.c.anzahl
+                            ).\
+                            where(tabelle_buchungen.c.zeit_stamp > fenster_start_stamp).\
+                            order_by(tabelle_buchungen.c.zeit_stamp)
+                        ).all()
+
+                    if constants.FLAGGE_WARTESCHLANGE_RATELIMIT == True:
+                        ergebnis = self._funk_sql_warteschlange_pruefen(
+                            arg_verbindung=verbindung,
+                            arg_liste_buchungen=liste_buchungen,
+                            arg_stichprobe=arg_stichprobe,
+                            arg_zeit_jetzt_stamp=zeit_jetzt_stamp
+                            )
+                    else:
+                        ergebnis = sqlWorker._funk_fenster_auswerten(
+                            arg_liste_buchungen=liste_buchungen,
+                            arg_sitzung_id=self.sitzung_id,
+                            arg_stichprobe=arg_stichprobe,
+                            arg_zeit_jetzt_stamp=zeit_jetzt_stamp
+                            )
+
+                    if ergebnis[0] == True:
+                        verbindung.execute(
+                            sqlalchemy.insert(tabelle_buchungen).values(
+                                sitzung_id=self.sitzung_id,
+                                zeit_stamp=zeit_jetzt_stamp,
+                                anzahl=arg_stichprobe
+                                )
+                            )
+
+                    return(ergebnis)
+
+            with self.engine_erstellt.connect() as verbindung:
+                verbindung.execution_options(isolation_level='AUTOCOMMIT')
+                self._funk_sql_tracker_anlegen(arg_verbindung=verbindung,
+                                               arg_zeit_jetzt=arg_zeit_jetzt)
+
+
+    @staticmethod
+    def _funk_fenster_auswerten(
+            arg_liste_buchungen: list,
+            arg_sitzung_id: str,
+            arg_stichprobe: int,
+            arg_zeit_jetzt_stamp: float
+            ):
+        """Returns a tuple with a flag whether the order is allowed by
+        the bookings in the sliding window, the seconds until it would be
+        allowed and the number of offers which are allowed at the moment
+        (both None if the order is allowed).
+
+        The order is allowed if the sum of all sessions stays within
+        N_FUER_RATELIMIT (global bucket) and, with FLAGGE_FAIRER_ANTEIL,
+        the sum of its session stays within an equal share of
+        N_FUER_RATELIMIT for all sessions with bookings in the window
+        (bucket of the session). The first order of a session in the
+        window is always allowed by its bucket, so every session can
+        scrape even if the share is smaller than its order.
+
+        Keyword arguments:\n
+        arg_liste_buchungen -- Bookings in the window (rows with
+        sitzung_id, zeit_stamp and anzahl) sorted by time\n
+        arg_sitzung_id -- Id of the session of the order\n
+        arg_stichprobe -- Number of offers that should be scraped\n
+        arg_zeit_jetzt_stamp -- Current time as timestamp
+        """
+        buch_summen_sitzungen = {}
+        for buchung_x in arg_liste_buchungen:
+            buch_summen_sitzungen[buchung_x.sitzung_id] = (
+                buch_summen_sitzungen.get(buchung_x.sitzung_id, 0) + buchung_x.anzahl
+                )
+        summe_gesamt = sum(buch_summen_sitzungen.values())
+
+        def funk_offen():
+            """Returns the number of offers which the session may book
+            with the current sums.
+            """
+            offen = constants.N_FUER_RATELIMIT - summe_gesamt
+            summe_sitzung = buch_summen_sitzungen.get(arg_sitzung_id, 0)
+
+            if constants.FLAGGE_FAIRER_ANTEIL == True and summe_sitzung > 0:
+                anteil = constants.N_FUER_RATELIMIT // len(buch_summen_sitzungen)
+                offen = min(offen, anteil - summe_sitzung)
+
+            return(max(offen, 0))
+
+        kontingent_offen = funk_offen()
+        if arg_stichprobe <= kontingent_offen:
+            return((True, None, None))
+
+        # Go through the bookings in the order in which they leave the window until the order would
+        # be allowed (the shares of the sessions grow when other sessions leave the window)
+        sekunden_bis_frei = None
+        for buchung_x in arg_liste_buchungen:
+            summe_gesamt -= buchung_x.anzahl
+            buch_summen_sitzungen[buchung_x.sitzung_id] -= buchung_x.anzahl
+            if buch_summen_sitzungen[buchung_x.sitzung_id] == 0:
+                del(buch_summen_sitzungen[buchung_x.sitzung_id])
+
+            if arg_stichprobe <= funk_offen():
+                sekunden_bis_frei = math.ceil(
+                    buchung_x.zeit_stamp + constants.ZEITRAUM_FUER_RATELIMIT - arg_zeit_jetzt_stamp
+                    )
+                break
+
+        return((False, sekunden_bis_frei, kontingent_offen))
+
+
+    def _funk_sql_warteschlange_pruefen(
+            self,
+            arg_verbindung: sqlalchemy.Connection,
+            arg_liste_buchungen: list,
+            arg_stichprobe: int,
+            arg_zeit_jetzt_stamp: float
+            ):
+        """Returns a tuple like _funk_fenster_auswerten, but the order is
+        only allowed if no waiting order is in front of it in the
+        admission queue (in the order of REIHENFOLGE_WARTESCHLANGE). If
+        the order is not allowed, it enters the queue (or its entry is
+        updated) and the expected waiting time is returned. Must be
+        called in the transaction of _funk_sql_fenster_buchen.
+
+        Waiting orders which could not be allowed only because of the
+        share of their session are not in front of other orders, so they
+        do not block the rate limit for other sessions.
+
+        Keyword arguments:\n
+        arg_verbindung -- Connection to the database in the transaction
+        which holds the lock on the tracker\n
+        arg_liste_buchungen -- Bookings in the window (see
+        _funk_fenster_auswerten)\n
+        arg_stichprobe -- Number of offers that should be scraped\n
+        arg_zeit_jetzt_stamp -- Current time as timestamp
+        """
+        tabelle_warteschlange = sqlKlasseWartend.__table__
+        spalten = tabelle_warteschlange.c
+
+        arg_verbindung.execute(
+            sqlalchemy.delete(tabelle_warteschlange).where(
+                spalten.abfrage_stamp
+                < arg_zeit_jetzt_stamp - constants.SEKUNDEN_WARTESCHLANGE_VERWAIST
+                )
+            )
+
+        liste_wartend = arg_verbindung.execute(
+            sqlalchemy.select(spalten.warte_id, spalten.sitzung_id, spalten.anzahl,
+                              spalten.eingang_stamp)
+            ).all()
+
+        buch_summen_sitzungen = {}
+        for buchung_x in arg_liste_buchungen:
+            buch_summen_sitzungen[buchung_x.sitzung_id] = (
+                buch_summen_sitzungen.get(buchung_x.sitzung_id, 0) + buchung_x.anzahl
+                )
+
+        def funk_rang(arg_sitzung_id, arg_eingang_stamp):
+            """Returns the key for the order of the queue."""
+            if constants.REIHENFOLGE_WARTESCHLANGE == 'Fair':
+                return((buch_summen_sitzungen.get(arg_sitzung_id, 0), arg_eingang_stamp))
+
+            return((arg_eingang_stamp,))
+
+        # The entry of the order may have been removed in the meantime (e. g. after a long pause)
+        eingang_stamp = arg_zeit_jetzt_stamp
+        for wartend_x in liste_wartend:
+            if wartend_x.warte_id == self.warte_id:
+                eingang_stamp = wartend_x.eingang_stamp
+                break
+        else:
+            self.warte_id = None
+
+        rang = funk_rang(self.sitzung_id, eingang_stamp)
+        n_davor = 0
+        position = 1
+
+        for wartend_x in liste_wartend:
+            if (wartend_x.warte_id == self.warte_id
+                    or funk_rang(wartend_x.sitzung_id, wartend_x.eingang_stamp) >= rang):
+                continue
+
+            flagge_x = sqlWorker._funk_fenster_auswerten(
+                arg_liste_buchungen=arg_liste_buchungen,
+                arg_sitzung_id=wartend_x.sitzung_id,
+                arg_stichprobe=wartend_x.anzahl,
+                arg_zeit_jetzt_stamp=arg_zeit_jetzt_stamp
+                )[0]
+            flagge_global_x = sqlWorker._funk_fenster_auswerten(
+                arg_liste_buchungen=arg_liste_buchungen,
+                arg_sitzung_id=None,
+                arg_stichprobe=wartend_x.anzahl,
+                arg_zeit_jetzt_stamp=arg_zeit_jetzt_stamp
+                )[0]
+
+            if flagge_x == True or flagge_global_x == False:
+                n_davor += wartend_x.anzahl
+                position += 1
+
+        flagge_ausfuehren, sekunden_bis_frei, kontingent_offen = sqlWorker._funk_fenster_auswerten(
+            arg_liste_buchungen=arg_liste_buchungen,
+            arg_sitzung_id=self.sitzung_id,
+            arg_stichprobe=arg_stichprobe,
+            arg_zeit_jetzt_stamp=arg_zeit_jetzt_stamp
+            )
+
+        if flagge_ausfuehren == True and position == 1:
+            if self.warte_id != None:
+                arg_verbindung.execute(
+                    sqlalchemy.delete(tabelle_warteschlange).where(
+                        spalten.warte_id == self.warte_id
+                        )
+                    )
+                self.warte_id = None
+
+            return((True, None, None))
+
+        # Expected waiting time: until the bookings leave the window with room for all orders in
+        # front and this one (beyond N_FUER_RATELIMIT one timeframe per further N_FUER_RATELIMIT)
+        n_bis_eigen = n_davor + arg_stichprobe
+        sekunden_global = sqlWorker._funk_fenster_auswerten(
+            arg_liste_buchungen=arg_liste_buchungen,
+            arg_sitzung_id=None,
+            arg_stichprobe=min(n_bis_eigen, constants.N_FUER_RATELIMIT),
+            arg_zeit_jetzt_stamp=arg_zeit_jetzt_stamp
+            )[1]
+        n_zeitraeume_weitere = (n_bis_eigen - 1) // constants.N_FUER_RATELIMIT
+        sekunden_warten = max(
+            (sekunden_global or 0) + constants.ZEITRAUM_FUER_RATELIMIT * n_zeitraeume_weitere,
+            sekunden_bis_frei or 0
+            )
+
+        buch_werte = {
+            'abfrage_stamp': arg_zeit_jetzt_stamp,
+            'position': position,
+            'frei_ab_stamp': arg_zeit_jetzt_stamp + sekunden_warten
+            }
+
+        if self.warte_id == None:
+            self.warte_id = arg_verbindung.execute(
+                sqlalchemy.insert(tabelle_warteschlange).\
+                    values(
+                        sitzung_id=self.sitzung_id,
+                        anzahl=arg_stichprobe,
+                        eingang_stamp=arg_zeit_jetzt_stamp,
+                        **buch_werte
+                        ).\
+                    returning(spalten.warte_id)
+                ).scalar()
+        else:
+            arg_verbindung.execute(
+                sqlalchemy.update(tabelle_warteschlange).\
+                    where(spalten.warte_id == self.warte_id).\
+                    values(**buch_werte)
+                )
+
+        return((False, sekunden_warten, kontingent_offen or 0))
+
+
+    def _funk_sql_warteschlange_verlassen(self):
+        """Removes the current order from the admission queue."""
+        tabelle_warteschlange = sqlKlasseWartend.__table__
+
+        try:
+            with self.engine_erstellt.begin() as verbindung:
+                verbindung.execute(
+                    sqlalchemy.delete(tabelle_warteschlange).where(
+                        tabelle_warteschlange.c.warte_id == self.warte_id
+                        )
+                    )
+        except Exception as fehler:
+            helpers.funk_drucken('ACHTUNG!: Fehler in sqlWorker._funk_sql_warteschlange_verlassen')
+            helpers.funk_drucken('Exception:', str(type(fehler).__name__))
+
+        self.warte_id = None
+
+
+    def _funk_sql_tracker_anlegen(
+            self,
+            arg_verbindung: sqlalchemy.Connection,
+            arg_zeit_jetzt: datetime.datetime
+            ):
+        """Creates the tracker if there is none in the database yet. If
+        another order creates it at the same time, the insert fails and
+        the tracker of the other order is used.
+
+        Keyword arguments:\n
+        arg_verbindung -- Connection to the database in autocommit mode\n
+        arg_zeit_jetzt -- Current time
+        """
+        zeit_jetzt_stamp = int(arg_zeit_jetzt.timestamp())
+
+        try:
+            arg_verbindung.execute(
+                sqlalchemy.insert(sqlKlasseTracker.__table__).values(
+                    tracker_id='Tracker_00',
+                    letzter_job_zeit=str(arg_zeit_jetzt),
+                    letzter_job_zeit_stamp=zeit_jetzt_stamp,
+                    summe_n_aktuell_in_zeitraum=0,
+                    letzte_nullung_stamp=zeit_jetzt_stamp
+                    )
+                )
+        except IntegrityError:
+            pass
+
+
+    def _funk_sql_tracker_buchen(
+            self,
+            arg_verbindung: sqlalchemy.Connection,
+            arg_stichprobe: int,
+            arg_zeit_jetzt: datetime.datetime
+            ):
+        """Adds argument arg_stichprobe to the sum of the current
+        timeframe with one single conditional UPDATE ... RETURNING and
+        returns the updated row of the tracker. Returns None if the
+        rate limit does not allow the order or if there is no tracker
+        yet. The sum is set to zero first if the timeframe is over.
+
+        Keyword arguments:\n
+        arg_verbindung -- Connection to the database in autocommit mode\n
+        arg_stichprobe -- Number of offers that should be scraped\n
+        arg_zeit_jetzt -- Current time
+        """
+        zeit_jetzt_stamp = int(arg_zeit_jetzt.timestamp())
+        spalten = sqlKlasseTracker.__table__.c
+
+        flagge_nullung = (
+            zeit_jetzt_stamp - spalten.letzte_nullung_stamp > constants.ZEITRAUM_FUER_RATELIMIT
+            )
+        summe_in_zeitraum = sqlalchemy.case(
+            (flagge_nullung, 0),
+            else_=spalten.summe_n_aktuell_in_zeitraum
+            )
+
+        # Like before, the limit is not checked if the last order is older than the timeframe
+        anweisung = sqlalchemy.update(sqlKlasseTracker.__table__).\
+            where(spalten.tracker_id == 'Tracker_00').\
+            where(sqlalchemy.or_(
+                zeit_jetzt_stamp - spalten.letzter_job_zeit_stamp
+                > constants.ZEITRAUM_FUER_RATELIMIT,
+                summe_in_zeitraum + arg_stichprobe <= constants.N_FUER_RATELIMIT
+                )).\
+            values(
+                summe_n_aktuell_in_zeitraum=summe_in_zeitraum + arg_stichprobe,
+                letzte_nullung_stamp=sqlalchemy.case(
+                    (flagge_nullung, zeit_jetzt_stamp),
+                    else_=spalten.letzte_nullung_stamp
+                    ),
+                letzter_job_zeit=str(arg_zeit_jetzt),
+                letzter_job_zeit_stamp=zeit_jetzt_stamp
+                ).\
+            returning(*spalten)
+
+        return(arg_verbindung.execute(anweisung).first())
+
+
+    def _funk_sql_quote_zurueckgeben(
+            self,
+            arg_verbindung: sqlalchemy.Connection,
+            arg_quoten_leasing: quota_lease.QuotenLeasing,
+            arg_zeit_jetzt_stamp: float
+            ):
+        """Gives the unused quota of an expired lease back to the tracker
+        if its timeframe is not over yet.
+
+        Keyword arguments:\n
+        arg_verbindung -- Connection to the database in autocommit mode\n
+        arg_quoten_leasing -- Process-wide instance of
+        quota_lease.QuotenLeasing\n
+        arg_zeit_jetzt_stamp -- Current time as timestamp
+        """
+        rest, nullung_stamp = arg_quoten_leasing.funk_rest_abgelaufen_entnehmen(
+            arg_zeit_jetzt_stamp=arg_zeit_jetzt_stamp
+            )
+        if rest == 0:
+            return()
+
+        sqlWorker._funk_sql_rest_zurueckgeben(
+            arg_rest=rest,
+            arg_nullung_stamp=nullung_stamp,
+            arg_verbindung=arg_verbindung
+            )
+
+
+    @staticmethod
+    def _funk_sql_rest_zurueckgeben(
+            arg_rest: int,
+            arg_nullung_stamp: int,
+            arg_verbindung: sqlalchemy.Connection = None
+            ):
+        """Subtracts the unused quota in argument arg_rest from the sum of
+        the tracker if its timeframe is not over yet. Without a connection
+        (e. g. when called by the timer of quota_lease.QuotenLeasing), a
+        connection of its own is used.
+
+        Keyword arguments:\n
+        arg_rest -- Unused quota\n
+        arg_nullung_stamp -- Start of the timeframe in which the quota
+        was booked\n
+        arg_verbindung -- Connection to the database in autocommit mode
+        or None
+        """
+        spalten = sqlKlasseTracker.__table__.c
+
+        # The quota is only given back within the timeframe in which it was booked
+        anweisung = sqlalchemy.update(sqlKlasseTracker.__table__).\
+            where(spalten.tracker_id == 'Tracker_00').\
+            where(spalten.letzte_nullung_stamp == arg_nullung_stamp).\
+            where(spalten.summe_n_aktuell_in_zeitraum >= arg_rest).\
+            values(summe_n_aktuell_in_zeitraum=spalten.summe_n_aktuell_in_zeitraum - arg_rest)
+
+        if arg_verbindung != None:
+            arg_verbindung.execute(anweisung)
+            return()
+
+        try:
+            with sqlWorker._funk_sql_engine_erstellen().begin() as verbindung:
+                verbindung.execute(anweisung)
+        except Exception as fehler:
+            helpers.funk_drucken('ACHTUNG!: Fehler in sqlWorker._funk_sql_rest_zurueckgeben')
+            helpers.funk_drucken('Exception:', str(type(fehler).__name__))
+
+
     def _funk_sql_add_und_commit_all(
             self,
             arg_liste_objekte: list
@@ -309,13 +1063,16 @@ class Scraper_Worker:
         eventmanager -- Instance of Eventmanager to work with\n
         sql_Worker -- Instance of sqlWorker to work with\n
         user_interface -- Instance of UserInterface to work with\n
+        datenkontext -- Instance of Datenkontext with the external data\n
+        url_scraper_api -- URL of the external scraper API (or of a
+        local stub server, see replay.py)\n
         suchbegriff -- Current search term\n
         stichprobe -- Number of offers that should be scraped, i. e.
         expected sample size\n
         max_anzeigenalter -- Maximum age of offers (in days) which
         should be included in the scraped sample\n
-        buch_anzeigen -- Current dict of scraped offers with links to
-        offers as keys of the dict\n
+        tabelle_anzeigen -- Current instance of
+        offer_table.AnzeigenTabelle with the scraped offers\n
         buch_ergebnisse -- Current dict containing the scraped data and
         external data (e. g. inhabitant numbers) aggregated on the
         level of the 16 states in germann, i. e. the keys of the dict
@@ -323,9 +1080,8 @@ class Scraper_Worker:
         antwort_server_str -- Current response from Kleinanzeigen server
         after sending a request while scraping\n
         zaehler_anzeigen -- Counter for scraped offers while scraping\n
-        liste_elemente_anzeige -- Temporary list with scraped HTML
-        elements while scraping\n
-        baum_html -- Temporary HTML tree while scraping\n
+        seite -- Temporary parsed page (instance of offer_parser.Seite)
+        while scraping\n
         flagge_fertig_geschuerft -- Flag which becomes True when
         scraping is done\n
         flagge_letzte_seite -- Flag which becomes True when the last
@@ -334,9 +1090,38 @@ class Scraper_Worker:
         zeitstempel_heute -- Timestamp for 00:00:00 of the current day\n
         max_anzeigenalter_sekunden -- Attribute max_anzeigenalter
         converted to seconds\n
-        sitzung -- Current object for sending requests created by
-        calling requests.Session()\n
-        payload -- Payload for the external scraper API
+        http_client -- Process-wide instance of HttpClient for sending
+        requests\n
+        taktgeber -- Process-wide instance of pacing.Taktgeber for pacing
+        the requests\n
+        cookie_jar -- Cookie jar of the current order\n
+        payload -- Payload for the external scraper API\n
+        anzahl_seiten -- Maximum number of pages of the Kleinanzeigen
+        website to scrape for the current order\n
+        flagge_alle_artikel -- Flag which is True if the current search
+        term is empty, i. e. all articles are searched\n
+        suchbegriff_url -- Current search term formatted for the URL\n
+        antwort_cache -- Process-wide instance of AntwortCache or None
+        if the cache is switched off\n
+        flagge_seite_aus_cache -- Flag which is True if the current page
+        is from the response cache\n
+        buch_delta -- Dict with the stored offers of the current search
+        term from sqlWorker.funk_suchbegriff_laden or None\n
+        zaehler_bekannte_anzeigen -- Counter for scraped offers in a row
+        which are in attribute buch_delta\n
+        flagge_delta_zusammengefuehrt -- Flag which becomes True when the
+        offers in attribute buch_delta are added to attribute
+        tabelle_anzeigen\n
+        vollstaendig_ab_stamp -- All offers on the website with a date
+        from this timestamp on are scraped (None if not known yet)\n
+        flagge_nur_anzahlen -- Flag which is True if the current order
+        only needs the numbers of offers per state from the "Ort" filter
+        of the first page (no offers are scraped)\n
+        flagge_keine_anzeigen -- Flag which becomes True when the order
+        is aborted because there is not a single offer for the search
+        term\n
+        n_gebucht -- Number of offers of the current order which are
+        booked on the rate limit (or on pages from the response cache)
         
     Public methods:\n
         funk_auftrag_annehmen -- This function receives the scraping
@@ -347,59 +1132,121 @@ class Scraper_Worker:
         received.\n
         _funk_schuerfen -- Scrapes the offers with the help of other
         private methods after receiving the order.\n
-        _funk_html_objekt_erstellen -- Updates attributes baum_html,
-        liste_elemente_anzeigen and antwort_server_str.\n
+        _funk_url_parameter_setzen -- Updates the attributes needed for
+        the URLs of the current order.\n
+        _funk_anzeigen_im_cache_zaehlen -- Returns the number of offers
+        on the first pages which are all in the response cache.\n
+        _funk_seite_buchen -- Books the offers of a further page on the
+        rate limit.\n
+        _funk_seiten_nacheinander_schuerfen -- Requests and scrapes the
+        pages strictly one after another.\n
+        _funk_seiten_parallel_schuerfen -- Requests several pages at the
+        same time and scrapes them in the order of the pages.\n
+        _funk_seite_strom_schuerfen -- Scrapes a page while it is still
+        being downloaded.\n
+        _funk_payload_erstellen -- Returns the payload for the external
+        scraper API to request a specific page.\n
+        _funk_seite_auswerten -- Scrapes the page which is currently held
+        in the attributes.\n
+        _funk_html_objekt_erstellen -- Updates attributes seite and
+        antwort_server_str.\n
+        _funk_seite_uebernehmen -- Updates the attributes with a
+        requested or cached page.\n
+        _funk_seite_aus_cache_laden -- Returns a page from the response
+        cache.\n
+        _funk_seite_abrufen -- Requests a page and returns the parsed
+        page and the response.\n
+        _funk_anfrage_senden -- Sends a request as soon as the pacing
+        allows it and tries again after blocks.\n
         _funk_html_objekt_erste_seite_pruefen -- Checks for errors after
         sending the request for the first time to the Kleinanzeigen
         website.\n
+        _funk_blockierung_pruefen -- Checks for blocking by the
+        Kleinanzeigen website.\n
+        _funk_keine_anzeigen_pruefen -- Checks whether the page does not
+        contain a single offer.\n
         _funk_html_objekt_filter_schuerfen -- Updates attribute
         buch_ergebnisse with data found in the filters of the
         Kleinanzeigen website.\n
         _funk_html_objekt_anzeigen_schuerfen -- Updates attribute
-        buch_anzeigen with data from the offers.
+        tabelle_anzeigen with data from the offers.\n
+        _funk_anzeige_schuerfen -- Updates attribute tabelle_anzeigen
+        with data from one single offer.\n
+        _funk_anzeige_aufnehmen -- Adds one single offer to attribute
+        tabelle_anzeigen.\n
+        _funk_delta_zusammenfuehren -- Adds the stored offers of the
+        search term to attribute tabelle_anzeigen.\n
+        _funk_delta_speichern -- Stores the offers of the search term
+        for the next order.
     """
 
     def __init__(
             self,
             init_eventmanager: Eventmanager,
             init_sql_worker: sqlWorker,
-            init_user_interface: UserInterface
+            init_user_interface: UserInterface,
+            init_datenkontext: Datenkontext,
+            init_url_scraper_api: str = None
             ):
         """Inits ScraperWorker.
 
         Keyword arguments:\n
         init_eventmanager -- Active instance of class Eventmanager\n
         init_sql_Worker -- Active instance of class SQLWorker\n
-        init_user_interface -- Active instance of class UserInterface
+        init_user_interface -- Active instance of class UserInterface\n
+        init_datenkontext -- Instance of Datenkontext with the external
+        data\n
+        init_url_scraper_api -- URL of the external scraper API or of a
+        local stub server (None means URL_SCRAPER_API from constants.py)
         """
         self.eventmanager = init_eventmanager
         self.sql_worker = init_sql_worker
         self.user_interface = init_user_interface
+        self.datenkontext = init_datenkontext
+
+        if init_url_scraper_api == None:
+            self.url_scraper_api = constants.URL_SCRAPER_API
+        else:
+            self.url_scraper_api = init_url_scraper_api
         
         self.suchbegriff = ''
         self.stichprobe = constants.N_DEFAULT_STICHPROBE_AUFTRAG
         self.max_anzeigenalter = constants.DEFAULT_MAX_ANZEIGENALTER_AUFTRAG
         
-        self.buch_anzeigen = {}
-        self.buch_ergebnisse = copy.deepcopy(streamlit.session_state['Buch_Laender'])
+        self.tabelle_anzeigen = offer_table.AnzeigenTabelle()
+        self.buch_ergebnisse = copy.deepcopy(self.datenkontext.buch_laender)
         self.antwort_server_str = ''  
         
         self.zaehler_anzeigen = None
-        self.liste_elemente_anzeige = None
-        self.baum_html = None
+        self.seite = None
         self.flagge_fertig_geschuerft = None
         self.flagge_letzte_seite = None
         self.zeitstempel_heute = None
         self.max_anzeigenalter_sekunden = None
-        self.sitzung = None
+        self.http_client = None
+        self.taktgeber = None
+        self.cookie_jar = None
         self.payload = None
+        self.anzahl_seiten = None
+        self.flagge_alle_artikel = None
+        self.suchbegriff_url = None
+        self.antwort_cache = None
+        self.flagge_seite_aus_cache = None
+        self.buch_delta = None
+        self.zaehler_bekannte_anzeigen = None
+        self.flagge_delta_zusammengefuehrt = None
+        self.vollstaendig_ab_stamp = None
+        self.flagge_nur_anzahlen = False
+        self.flagge_keine_anzeigen = None
+        self.n_gebucht = None
 
 
     def funk_auftrag_annehmen(
             self,
             arg_auftrag_suchbegriff: str,
             arg_auftrag_stichprobe: int,
-            arg_auftrag_max_anzeigenalter: int):
+            arg_auftrag_max_anzeigenalter: int,
+            arg_auftrag_nur_anzahlen: bool = False):
         """This function receives the scraping order from the
         eventmanager.
         
@@ -409,27 +1256,56 @@ class Scraper_Worker:
         for the incoming order\n
         arg_auftrag_max_anzeigenalter -- Maximum age of offers (in days)
         which should be included in the scraped sample for the incoming
-        order
+        order\n
+        arg_auftrag_nur_anzahlen -- Whether only the numbers of offers
+        per state are needed, i. e. exactly one page is requested and no
+        offers are scraped
         """ 
         if arg_auftrag_stichprobe > constants.N_GRENZE_STICHPROBE_AUFTRAG:
             self.stichprobe = constants.N_GRENZE_STICHPROBE_AUFTRAG
         else:
             self.stichprobe = arg_auftrag_stichprobe
         
-        # Check whether the rate limit for all users is not reached
-        self.sql_worker.funk_sql_tracker_updaten(arg_stichprobe=self.stichprobe)
-        
         self.suchbegriff = arg_auftrag_suchbegriff.lstrip().rstrip().lower()       
         self.max_anzeigenalter = arg_auftrag_max_anzeigenalter
+        self.flagge_nur_anzahlen = arg_auftrag_nur_anzahlen
+        self._funk_url_parameter_setzen()
+
+        if constants.FLAGGE_ANTWORT_CACHE == True:
+            self.antwort_cache = response_cache.funk_antwort_cache_erstellen()
+        else:
+            self.antwort_cache = None
 
-        self.buch_anzeigen = {}
-        self.buch_ergebnisse = copy.deepcopy(streamlit.session_state['Buch_Laender'])
+        # Without offers there is nothing to take from or to store for delta scraping
+        if constants.FLAGGE_DELTA_SCHUERFEN == True and self.flagge_nur_anzahlen == False:
+            self.buch_delta = self.sql_worker.funk_suchbegriff_laden(arg_suchbegriff=self.suchbegriff)
+        else:
+            self.buch_delta = None
+
+        # Check whether the rate limit for all users is not reached. Offers on pages which are
+        # already in the cache are not counted. With stored offers of the search term usually only
+        # the first page is requested, for counts-only orders always only the first page. Further
+        # pages of such an order are booked before they are requested (see _funk_seite_buchen).
+        if self.buch_delta != None or self.flagge_nur_anzahlen == True:
+            n_erwartet = min(self.stichprobe, constants.ANZEIGEN_PRO_SEITE)
+        else:
+            n_erwartet = self.stichprobe
+        n_fuer_ratelimit = n_erwartet - min(self._funk_anzeigen_im_cache_zaehlen(), n_erwartet)
+        if n_fuer_ratelimit > 0:
+            self.sql_worker.funk_sql_tracker_updaten(arg_stichprobe=n_fuer_ratelimit)
+        self.n_gebucht = n_erwartet
+
+        self.tabelle_anzeigen = offer_table.AnzeigenTabelle()
+        self.buch_ergebnisse = copy.deepcopy(self.datenkontext.buch_laender)
         self.antwort_server_str = ''
-        self.baum_html = None
+        self.seite = None
         
         with self.user_interface.platzhalter_ausgabe_spinner_02:
             with streamlit.spinner('Deine Daten werden gerade gesammelt.'):
                 self._funk_arbeiten()
+
+        if constants.FLAGGE_DELTA_SCHUERFEN == True and self.flagge_nur_anzahlen == False:
+            self._funk_delta_speichern()
                     
         # Tell the Eventmanager that the scraping is done
         self.eventmanager.funk_event_eingetreten(
@@ -438,7 +1314,8 @@ class Scraper_Worker:
                 'arg_auftrag_suchbegriff': self.suchbegriff,
                 'arg_auftrag_stichprobe': self.stichprobe,
                 'arg_auftrag_max_anzeigenalter': self.max_anzeigenalter,
-                'arg_auftrag_buch_anzeigen': self.buch_anzeigen,
+                'arg_auftrag_nur_anzahlen': self.flagge_nur_anzahlen,
+                'arg_auftrag_tabelle_anzeigen': self.tabelle_anzeigen,
                 'arg_auftrag_buch_ergebnisse': self.buch_ergebnisse,
                 'arg_auftrag_antwort_server_str': self.antwort_server_str
                 }
@@ -455,16 +1332,13 @@ class Scraper_Worker:
         """Scrapes the offers with the help of other private methods after
         receiving the order.
         """
-        suchbegriff_url = self.suchbegriff.replace(' ', '-')
-        if suchbegriff_url == '':
-            flagge_alle_artikel = True
-        else:
-            flagge_alle_artikel = False
-
-        anhang_url = 'k0'
         self.zaehler_anzeigen = 0
         self.flagge_fertig_geschuerft = False
         self.flagge_letzte_seite = False
+        self.zaehler_bekannte_anzeigen = 0
+        self.flagge_delta_zusammengefuehrt = False
+        self.vollstaendig_ab_stamp = None
+        self.flagge_keine_anzeigen = False
 
         jahr_gerade = datetime.datetime.now().year
         monat_gerade = datetime.datetime.now().month
@@ -475,72 +1349,488 @@ class Scraper_Worker:
 
         self.max_anzeigenalter_sekunden = self.max_anzeigenalter*24*60*60
 
-        with requests.Session() as self.sitzung:
-            self.sitzung.cookies.clear()
+        # Use the pooled connections shared by all users, but a cookie jar of its own for this order
+        self.http_client = http_client.funk_http_client_erstellen()
+        self.cookie_jar = self.http_client.funk_cookie_jar_erstellen()
 
-            for seite_i in range(0, int(self.stichprobe / 25 + 2)):
-                if seite_i == 0:
-                    if flagge_alle_artikel == False:
-                        url = f''
-                    elif flagge_alle_artikel == True:
-                        url = ''
-                
-                elif seite_i >= 1:
-                    if flagge_alle_artikel == False:
-                        url = f''
-                    elif flagge_alle_artikel == True:
-                        url = f''
+        # All users share the pacing, because the Kleinanzeigen website blocks them all together
+        self.taktgeber = pacing.funk_taktgeber_erstellen()
+
+        if constants.N_PARALLELE_SEITENABFRAGEN > 1:
+            self._funk_seiten_parallel_schuerfen()
+        else:
+            self._funk_seiten_nacheinander_schuerfen()
+
+
+    def _funk_url_parameter_setzen(self):
+        """Updates attributes suchbegriff_url, flagge_alle_artikel and
+        anzahl_seiten for the current order.
+        """
+        self.suchbegriff_url = self.suchbegriff.replace(' ', '-')
+        if self.suchbegriff_url == '':
+            self.flagge_alle_artikel = True
+        else:
+            self.flagge_alle_artikel = False
+
+        # The "Ort" filter with the numbers of offers per state is on the first page
+        if self.flagge_nur_anzahlen == True:
+            self.anzahl_seiten = 1
+        else:
+            self.anzahl_seiten = int(self.stichprobe / constants.ANZEIGEN_PRO_SEITE + 2)
 
-                self.payload = {'api_key': constants.SCHLUESSEL, 'url': url}
 
+    def _funk_anzeigen_im_cache_zaehlen(self):
+        """Returns the number of offers (up to attribute stichprobe) on
+        the first pages of the current order which are all in the
+        response cache.
+        """
+        if self.antwort_cache == None:
+            return(0)
+
+        anzahl_anzeigen = 0
+        for seite_i in range(0, self.anzahl_seiten):
+            if anzahl_anzeigen >= self.stichprobe:
+                break
+
+            url = self._funk_payload_erstellen(arg_seite_i=seite_i)['url']
+            if self.antwort_cache.funk_enthaelt(arg_url=url) == False:
+                break
+
+            anzahl_anzeigen += constants.ANZEIGEN_PRO_SEITE
+
+        return(min(anzahl_anzeigen, self.stichprobe))
+
+
+    def _funk_seite_buchen(
+            self,
+            arg_seite_i: int,
+            arg_payload: dict
+            ):
+        """Books the offers of the page in argument arg_seite_i on the rate
+        limit if they are not booked yet (i. e. after the first page of an
+        order with stored offers) and the page is not in the response
+        cache. Returns False if the rate limit does not allow them (the
+        order is aborted like in funk_auftrag_annehmen).
+
+        Keyword arguments:\n
+        arg_seite_i -- Index of the page of the Kleinanzeigen website
+        (starting with 0)\n
+        arg_payload -- Payload for the page from _funk_payload_erstellen
+        """
+        n_bis_seite = min((arg_seite_i + 1)*constants.ANZEIGEN_PRO_SEITE, self.stichprobe)
+        if n_bis_seite <= self.n_gebucht:
+            return(True)
+
+        if (self.antwort_cache == None
+                or self.antwort_cache.funk_enthaelt(arg_url=arg_payload['url']) == False):
+            if self.sql_worker.funk_sql_tracker_updaten(
+                    arg_stichprobe=n_bis_seite - self.n_gebucht
+                    ) == False:
+                return(False)
+
+        self.n_gebucht = n_bis_seite
+
+        return(True)
+
+
+    def _funk_seiten_nacheinander_schuerfen(self):
+        """Requests and scrapes the pages of the Kleinanzeigen website
+        strictly one after another. The requests are paced by attribute
+        taktgeber.
+        """
+        for seite_i in range(0, self.anzahl_seiten):
+            self.payload = self._funk_payload_erstellen(arg_seite_i=seite_i)
+
+            if self._funk_seite_buchen(arg_seite_i=seite_i, arg_payload=self.payload) == False:
+                break
+
+            if constants.FLAGGE_STROM_PARSEN == True:
+                self._funk_seite_strom_schuerfen(arg_seite_i=seite_i)
+            else:
                 self._funk_html_objekt_erstellen()
-                self._funk_html_objekt_erste_seite_pruefen()
-                self._funk_html_objekt_filter_schuerfen()
-                self._funk_html_objekt_anzeigen_schuerfen()
+                self._funk_seite_auswerten()
 
-                if self.flagge_fertig_geschuerft == True:
+            if self.flagge_fertig_geschuerft == True:
+                break
+
+            if self.flagge_letzte_seite == True:
+                break
+
+
+    def _funk_seiten_parallel_schuerfen(self):
+        """Requests up to N_PARALLELE_SEITENABFRAGEN pages of the
+        Kleinanzeigen website at the same time and scrapes them in the
+        order of the pages as soon as they arrive.
+
+        No further pages are requested as soon as enough offers are
+        scraped, the offers are too old or the last page is reached.
+        A request is only started when attribute taktgeber allows it.
+        """
+        pool_abfragen = concurrent.futures.ThreadPoolExecutor(
+            max_workers=constants.N_PARALLELE_SEITENABFRAGEN
+            )
+
+        buch_abfragen_laufend = {}
+        buch_seiten_angekommen = {}
+        seite_naechste_abfrage = 0
+        seite_naechste_auswertung = 0
+        sekunden_bis_abfrage = 0
+
+        try:
+            while True:
+                # Scrape the arrived pages in the order of the pages, so the offers keep being
+                # sorted by their age
+                while (seite_naechste_auswertung in buch_seiten_angekommen
+                       and self.flagge_fertig_geschuerft == False
+                       and self.flagge_letzte_seite == False):
+                    self._funk_seite_uebernehmen(
+                        buch_seiten_angekommen.pop(seite_naechste_auswertung)
+                        )
+                    self._funk_seite_auswerten()
+                    seite_naechste_auswertung += 1
+
+                if self.flagge_fertig_geschuerft == True or self.flagge_letzte_seite == True:
                     break
 
-                if self.flagge_letzte_seite == True:
+                flagge_abfrage_moeglich = (
+                    seite_naechste_abfrage < self.anzahl_seiten
+                    and len(buch_abfragen_laufend) < constants.N_PARALLELE_SEITENABFRAGEN
+                    )
+
+                if flagge_abfrage_moeglich == True:
+                    payload = self._funk_payload_erstellen(arg_seite_i=seite_naechste_abfrage)
+
+                    # Pages from the cache are not requested, so they do not use up any tokens
+                    seite_aus_cache = self._funk_seite_aus_cache_laden(arg_payload=payload)
+                    if seite_aus_cache != None:
+                        buch_seiten_angekommen[seite_naechste_abfrage] = seite_aus_cache
+                        seite_naechste_abfrage += 1
+                        continue
+
+                    # Start the request for the next page if the pacing allows it (the token is
+                    # taken here, so the thread does not wait for one after the order is done)
+                    sekunden_bis_abfrage = self.taktgeber.funk_token_versuchen()
+                    if sekunden_bis_abfrage == 0:
+                        # Prefetched pages are booked on the rate limit like all others
+                        if self._funk_seite_buchen(
+                                arg_seite_i=seite_naechste_abfrage,
+                                arg_payload=payload
+                                ) == False:
+                            self.flagge_fertig_geschuerft = True
+                            break
+
+                        abfrage = pool_abfragen.submit(self._funk_seite_abrufen, payload, True)
+                        buch_abfragen_laufend[abfrage] = seite_naechste_abfrage
+                        seite_naechste_abfrage += 1
+                        continue
+
+                if len(buch_abfragen_laufend) == 0:
+                    if flagge_abfrage_moeglich == True:
+                        time.sleep(sekunden_bis_abfrage)
+                        continue
                     break
 
-                helpers.funk_schlafen(
-                    constants.SCHLAFEN_SEKUNDEN - 1,
-                    constants.SCHLAFEN_SEKUNDEN + 1
+                # Wait until a page arrives or the next request may be started
+                if flagge_abfrage_moeglich == True:
+                    wartezeit = sekunden_bis_abfrage
+                else:
+                    wartezeit = None
+
+                abfragen_fertig, _ = concurrent.futures.wait(
+                    buch_abfragen_laufend,
+                    timeout=wartezeit,
+                    return_when=concurrent.futures.FIRST_COMPLETED
                     )
 
+                for abfrage_x in abfragen_fertig:
+                    seite_x = buch_abfragen_laufend.pop(abfrage_x)
+                    buch_seiten_angekommen[seite_x] = abfrage_x.result()
+
+        finally:
+            pool_abfragen.shutdown(wait=False, cancel_futures=True)
+
+
+    def _funk_seite_strom_schuerfen(
+            self,
+            arg_seite_i: int
+            ):
+        """Requests the page for attribute payload and scrapes the offers
+        as soon as they arrive, i. e. while the rest of the page is still
+        being downloaded. The transfer is aborted as soon as attribute
+        flagge_fertig_geschuerft becomes True (on the first page not
+        before the "Ort" filter was read). Only completely downloaded
+        pages are stored in the response cache.
+
+        Keyword arguments:\n
+        arg_seite_i -- Index of the page of the Kleinanzeigen website
+        (starting with 0)
+        """
+        seite_aus_cache = self._funk_seite_aus_cache_laden(arg_payload=self.payload)
+        if seite_aus_cache != None:
+            self._funk_seite_uebernehmen(seite_aus_cache)
+            self._funk_seite_auswerten()
+            return()
+
+        self.flagge_seite_aus_cache = False
+        liste_anzeigen = []
+        self.seite = offer_parser.Seite(liste_anzeigen=liste_anzeigen, buch_ort_filter=None)
+
+        antwort_server = self._funk_anfrage_senden(arg_payload=self.payload, arg_stream=True)
+
+        try:
+            self.antwort_server_str = str(antwort_server)
+            self._funk_blockierung_pruefen()
+
+            strom_parser = offer_parser.StromParser(
+                antwort_server.iter_content(chunk_size=constants.STROM_CHUNK_BYTES)
+                )
+
+            for anzeige_x in strom_parser.funk_anzeigen_lesen():
+                liste_anzeigen.append(anzeige_x)
+
+                # For a counts-only order the first offer only shows that there are any
+                if self.flagge_nur_anzahlen == True:
+                    self.flagge_fertig_geschuerft = True
+                else:
+                    self._funk_anzeige_schuerfen(anzeige_x)
+
+                if self.flagge_fertig_geschuerft == True:
+                    break
+
+            # The numbers of offers per state are only needed from the first page
+            if arg_seite_i == 0:
+                strom_parser.funk_bis_ort_filter_lesen()
+
+            self.seite = offer_parser.Seite(
+                liste_anzeigen=liste_anzeigen,
+                buch_ort_filter=strom_parser.buch_ort_filter
+                )
+
+            # Without the rest of the page it is unknown whether it contains a filter
+            if strom_parser.flagge_vollstaendig == True or self.seite.buch_ort_filter != None:
+                self._funk_html_objekt_filter_schuerfen()
+
+            if strom_parser.flagge_vollstaendig == True:
+                if len(liste_anzeigen) == 0:
+                    self.flagge_letzte_seite = True
+                    self._funk_keine_anzeigen_pruefen()
+
+                if self.antwort_cache != None and antwort_server.status_code == 200:
+                    self.antwort_cache.funk_speichern(
+                        arg_url=self.payload['url'],
+                        arg_status=antwort_server.status_code,
+                        arg_inhalt=strom_parser.funk_inhalt()
+                        )
+
+        finally:
+            # Closing the response before reading it completely aborts the transfer
+            antwort_server.close()
+
+
+    def _funk_payload_erstellen(
+            self,
+            arg_seite_i: int
+            ):
+        """Returns the payload for the external scraper API to request
+        the page in argument arg_seite_i.
+
+        Keyword arguments:\n
+        arg_seite_i -- Index of the page of the Kleinanzeigen website
+        (starting with 0)
+        """
+        anhang_url = 'k0'
+
+        if arg_seite_i == 0:
+            if self.flagge_alle_artikel == False:
+                url = f''
+            elif self.flagge_alle_artikel == True:
+                url = ''
+
+        elif arg_seite_i >= 1:
+            if self.flagge_alle_artikel == False:
+                url = f''
+            elif self.flagge_alle_artikel == True:
+                url = f''
+
+        return({'api_key': constants.SCHLUESSEL, 'url': url})
+
+
+    def _funk_seite_auswerten(self):
+        """Scrapes the page which is currently held in the attributes
+        seite and antwort_server_str.
+        """
+        self._funk_html_objekt_erste_seite_pruefen()
+        self._funk_html_objekt_filter_schuerfen()
+        self._funk_html_objekt_anzeigen_schuerfen()
+
 
     def _funk_html_objekt_erstellen(self):
-        """Updates attributes baum_html, liste_elemente_anzeigen and
-        antwort_server_str.
+        """Updates attributes seite, antwort_server_str and
+        flagge_seite_aus_cache.
         """
-        for i in range(0,2):
-            # Try sending the request two times
-            try:
-                antwort_server = self.sitzung.get('', params=self.payload)
-                antwort_server_html = antwort_server.content.decode("utf-8")
-                self.baum_html = html.fromstring(antwort_server_html)
-                self.liste_elemente_anzeigen = self.baum_html.cssselect('article.aditem')
+        seite = self._funk_seite_aus_cache_laden(arg_payload=self.payload)
+        if seite == None:
+            seite = self._funk_seite_abrufen(arg_payload=self.payload)
+
+        self._funk_seite_uebernehmen(seite)
+
+
+    def _funk_seite_uebernehmen(
+            self,
+            arg_seite: tuple
+            ):
+        """Updates attributes seite, antwort_server_str,
+        flagge_seite_aus_cache and flagge_letzte_seite with a page
+        returned by _funk_seite_abrufen or _funk_seite_aus_cache_laden.
+
+        Keyword arguments:\n
+        arg_seite -- Tuple of the page
+        """
+        (
+            self.seite,
+            self.antwort_server_str,
+            flagge_letzte_seite,
+            self.flagge_seite_aus_cache
+            ) = arg_seite
+
+        if flagge_letzte_seite == True:
+            self.flagge_letzte_seite = True
+
+
+    def _funk_seite_aus_cache_laden(
+            self,
+            arg_payload: dict
+            ):
+        """Returns the page for the payload in argument arg_payload from
+        the response cache as tuple like _funk_seite_abrufen or None if
+        the page is not in the cache.
+
+        Keyword arguments:\n
+        arg_payload -- Payload for the external scraper API
+        """
+        if self.antwort_cache == None:
+            return(None)
+
+        eintrag = self.antwort_cache.funk_laden(arg_url=arg_payload['url'])
+        if eintrag == None:
+            return(None)
+
+        status, inhalt = eintrag
+        seite = offer_parser.funk_seite_parsen(inhalt)
+
+        return((
+            seite,
+            f'<Response [{status}]>',
+            len(seite.liste_anzeigen) == 0,
+            True
+            ))
+
+
+    def _funk_seite_abrufen(
+            self,
+            arg_payload: dict,
+            arg_flagge_token: bool = False
+            ):
+        """Requests the page for the payload in argument arg_payload and
+        returns a tuple with the parsed page (instance of
+        offer_parser.Seite), the response as string, a flag which is
+        True if the last page on the Kleinanzeigen website is reached and
+        a flag which is True if the page is from the response cache
+        (always False here). Successful responses are stored in the
+        response cache.
+
+        This function does not change any attributes, so it can be
+        called from several threads at the same time.
+
+        Keyword arguments:\n
+        arg_payload -- Payload for the external scraper API\n
+        arg_flagge_token -- True if the token for the first try was
+        already taken from attribute taktgeber
+        """
+        antwort_server = self._funk_anfrage_senden(
+            arg_payload=arg_payload,
+            arg_flagge_token=arg_flagge_token
+            )
+        seite = offer_parser.funk_seite_parsen(antwort_server.content)
+
+        # If there are not any offers on the page, set the flag for reaching the last page on the
+        # Kleinanzeigen website to True
+        flagge_letzte_seite = len(seite.liste_anzeigen) == 0
+
+        if self.antwort_cache != None and antwort_server.status_code == 200:
+            self.antwort_cache.funk_speichern(
+                arg_url=arg_payload['url'],
+                arg_status=antwort_server.status_code,
+                arg_inhalt=antwort_server.content
+                )
+
+        return((
+            seite,
+            str(antwort_server),
+            flagge_letzte_seite,
+            False
+            ))
+
+
+    def _funk_anfrage_senden(
+            self,
+            arg_payload: dict,
+            arg_stream: bool = False,
+            arg_flagge_token: bool = False
+            ):
+        """Sends the request for the payload in argument arg_payload as
+        soon as attribute taktgeber allows it and returns the response.
+        Every response is reported to attribute taktgeber. A blocked
+        request (status code 418, 429 or 5xx) is tried again after the
+        backoff up to N_VERSUCHE_BLOCKIERUNG times in total, the last
+        response is returned even if it is blocked.
+
+        This function does not change any attributes, so it can be
+        called from several threads at the same time.
+
+        Keyword arguments:\n
+        arg_payload -- Payload for the external scraper API\n
+        arg_stream -- If True, the content of the response is not
+        downloaded yet (see HttpClient.funk_get)\n
+        arg_flagge_token -- True if the token for the first try was
+        already taken from attribute taktgeber
+        """
+        for versuch_i in range(0, constants.N_VERSUCHE_BLOCKIERUNG):
+            if versuch_i > 0 or arg_flagge_token == False:
+                self.taktgeber.funk_token_holen()
+
+            antwort_server = self.http_client.funk_get(
+                self.url_scraper_api,
+                arg_params=arg_payload,
+                arg_cookie_jar=self.cookie_jar,
+                arg_stream=arg_stream
+                )
 
-                if len(self.liste_elemente_anzeigen) == 0:
-                    raise IndexError  
+            flagge_blockierung = self.taktgeber.funk_antwort_melden(
+                arg_status=antwort_server.status_code,
+                arg_retry_after=antwort_server.headers.get('Retry-After')
+                )
+
+            if flagge_blockierung == False or versuch_i == constants.N_VERSUCHE_BLOCKIERUNG - 1:
                 break
-            
-            except IndexError:
-                # If there are not any offers on the page, set the flag for reaching the last page
-                # on the Kleinanzeigen website to True
-                if i == 1 or len(self.liste_elemente_anzeigen) == 0:
-                    self.flagge_letzte_seite = True
-                    break
 
-        self.antwort_server_str = str(antwort_server)
+            antwort_server.close()
+
+        return(antwort_server)
 
 
     def _funk_html_objekt_erste_seite_pruefen(self):
         """Checks for errors after sending the request for the first time
         to the Kleinanzeigen website.
         """
-        # Error because of blocking by the Kleinanzeigen website
+        self._funk_blockierung_pruefen()
+        self._funk_keine_anzeigen_pruefen()
+
+
+    def _funk_blockierung_pruefen(self):
+        """Checks attribute antwort_server_str for blocking by the
+        Kleinanzeigen website.
+        """
         if '418' in self.antwort_server_str:
             nachricht_fehler = f'''ACHTUNG!: Wahrscheinlich ist deine Suche fehlgeschlagen, weil
                 die Kleinanzeigen-Website deine Anfrage blockiert! Versuche es später nochmal!'''
@@ -552,12 +1842,18 @@ class Scraper_Worker:
                                         'arg_nachricht': nachricht_fehler
                                         }
                 )
-            
-        # Error because there is not a single offer for the current search term
-        if len(self.liste_elemente_anzeigen) == 0:                
+
+
+
+    def _funk_keine_anzeigen_pruefen(self):
+        """Checks whether attribute seite does not contain a single offer
+        for the current search term.
+        """
+        if len(self.seite.liste_anzeigen) == 0:
             nachricht_fehler = f'''ACHTUNG!: Wahrscheinlich wurden keine Anzeigen für deinen
                 Suchbegriff "_{self.suchbegriff}_" gefunden! Die Suche wurde deswegen vorzeitig
                 abgebrochen!'''
+            self.flagge_keine_anzeigen = True
 
             self.eventmanager.funk_event_eingetreten(
                 arg_event_name='Vorzeitig_abgebrochen',
@@ -575,72 +1871,189 @@ class Scraper_Worker:
         for key_x in self.buch_ergebnisse.keys():
             self.buch_ergebnisse[key_x]['Anzeigenanzahl_total'] = 0
 
-        liste_sections = self.baum_html.cssselect('section')
+        if self.seite.buch_ort_filter == None:
+            return()
 
-        for section_x in liste_sections:    
-            ueberschriften = section_x.cssselect('h3.sectionheadline')
-            
-            for ueberschrift_x in ueberschriften:
-                if ueberschrift_x.text_content() == 'Ort':
-                    laender = section_x.cssselect('li')
-                    for land_x in laender:
-                        text = land_x.text_content()
-                        text = text.replace('.', '')
-                        text = text.replace('(', '')
-                        text = text.replace(')', '')
-                        text = text.replace('\n', '')
-                        
-                        land_str, anzahl_str = text.split()
-                        anzahl_int = int(anzahl_str)
-
-                        self.buch_ergebnisse[land_str]['Anzeigenanzahl_total'] = anzahl_int
-
-                    break
+        for land_str, anzahl_int in self.seite.buch_ort_filter.items():
+            self.buch_ergebnisse[land_str]['Anzeigenanzahl_total'] = anzahl_int
 
 
     def _funk_html_objekt_anzeigen_schuerfen(self):
-        """Updates attribute buch_anzeigen with data from the offers."""
-        for x in self.liste_elemente_anzeigen: 
-            ort_str = x.cssselect('div.aditem-main--top--left')[0].text_content().lstrip()
+        """Updates attribute tabelle_anzeigen with data from the offers."""
+        if self.flagge_nur_anzahlen == True:
+            self.flagge_fertig_geschuerft = True
+            return()
+
+        for anzeige_x in self.seite.liste_anzeigen:
+            self._funk_anzeige_schuerfen(anzeige_x)
 
-            # Direct URL to the offer
-            href_str = str(x.attrib['data-href'])
+            if self.flagge_fertig_geschuerft == True:
+                break
 
-            preis_str = x.cssselect('p.aditem-main--middle--price-shipping--price')[0].\
-                            text_content().\
-                            lstrip()
 
-            zeit_str = x.cssselect('div.aditem-main--top > div.aditem-main--top--right')[0].\
-                            text_content().\
-                            lstrip()
-            
-            if zeit_str == '':
-                zeitstempel = self.zeitstempel_heute
-            elif 'Heute' in zeit_str:
-                zeitstempel = self.zeitstempel_heute
-            elif 'Gestern' in zeit_str:
-                zeitstempel = self.zeitstempel_heute - 24*60*60
+    def _funk_anzeige_schuerfen(
+            self,
+            arg_anzeige: offer_parser.Anzeige
+            ):
+        """Updates attribute tabelle_anzeigen with data from one single offer
+        and sets attribute flagge_fertig_geschuerft to True if the offer
+        is too old or enough offers are scraped already.
+
+        Keyword arguments:\n
+        arg_anzeige -- Instance of offer_parser.Anzeige
+        """
+        ort_str = arg_anzeige.ort
+
+        # Direct URL to the offer
+        href_str = arg_anzeige.href
+
+        preis_str = arg_anzeige.preis
+        zeit_str = arg_anzeige.zeit
+
+        if zeit_str == '':
+            zeitstempel = self.zeitstempel_heute
+        elif 'Heute' in zeit_str:
+            zeitstempel = self.zeitstempel_heute
+        elif 'Gestern' in zeit_str:
+            zeitstempel = self.zeitstempel_heute - 24*60*60
+        else:
+            zeit_str = zeit_str.rstrip()
+            zeitstempel = datetime.datetime.strptime(zeit_str, '%d.%m.%Y').timestamp()
+
+        self._funk_anzeige_aufnehmen(
+            arg_href=href_str,
+            arg_ort=ort_str,
+            arg_preis=preis_str,
+            arg_zeit=zeit_str,
+            arg_zeitstempel=zeitstempel
+            )
+
+        # Take the remaining offers from the stored ones of the search term as soon as enough of
+        # them are found in a row
+        if self.buch_delta != None and self.flagge_delta_zusammengefuehrt == False:
+            if href_str in self.buch_delta['tabelle_anzeigen']:
+                self.zaehler_bekannte_anzeigen += 1
             else:
-                zeit_str = zeit_str.rstrip()
-                zeitstempel = datetime.datetime.strptime(zeit_str, '%d.%m.%Y').timestamp()
+                self.zaehler_bekannte_anzeigen = 0
 
-            # Check whether offer is too old
-            if self.zeitstempel_heute - zeitstempel > self.max_anzeigenalter_sekunden:
-                self.flagge_fertig_geschuerft = True
-                break
+            n_bekannte_anzeigen = min(constants.N_BEKANNTE_ANZEIGEN_DELTA,
+                                      len(self.buch_delta['tabelle_anzeigen']))
 
-            # Add offer to dict in attribute buch_anzeigen
-            if href_str not in list(self.buch_anzeigen.keys()):
-                self.buch_anzeigen[href_str] = {'Preis': preis_str,
-                                                'Ort': ort_str,
-                                                'Zeit': zeit_str
-                                                }
-                self.zaehler_anzeigen += 1
-
-            # Stop scraping when enough offers are scraped already
-            if self.zaehler_anzeigen >= self.stichprobe:
-                self.flagge_fertig_geschuerft = True
-                break
+            if (self.zaehler_bekannte_anzeigen >= n_bekannte_anzeigen
+                    and self.flagge_fertig_geschuerft == False):
+                self._funk_delta_zusammenfuehren()
+
+
+    def _funk_anzeige_aufnehmen(
+            self,
+            arg_href: str,
+            arg_ort: str,
+            arg_preis: str,
+            arg_zeit: str,
+            arg_zeitstempel: float
+            ):
+        """Adds one single offer to attribute tabelle_anzeigen and sets
+        attribute flagge_fertig_geschuerft to True if the offer is too
+        old or enough offers are scraped already.
+
+        Keyword arguments:\n
+        arg_href -- Direct URL to the offer\n
+        arg_ort -- Location of the offer beginning with the PLZ\n
+        arg_preis -- Price of the offer as shown on the website\n
+        arg_zeit -- Date of the offer as shown on the website\n
+        arg_zeitstempel -- Date of the offer as timestamp
+        """
+        # Check whether offer is too old
+        if self.zeitstempel_heute - arg_zeitstempel > self.max_anzeigenalter_sekunden:
+            self.flagge_fertig_geschuerft = True
+            self.vollstaendig_ab_stamp = int(self.zeitstempel_heute
+                                             - self.max_anzeigenalter_sekunden)
+            return()
+
+        # Add offer to attribute tabelle_anzeigen (offers which are already in it are skipped)
+        flagge_neu = self.tabelle_anzeigen.funk_hinzufuegen(
+            arg_href=arg_href,
+            arg_ort=arg_ort,
+            arg_preis=arg_preis,
+            arg_zeit=arg_zeit,
+            arg_zeitstempel=arg_zeitstempel
+            )
+        if flagge_neu == True:
+            self.zaehler_anzeigen += 1
+
+        # Stop scraping when enough offers are scraped already
+        if self.zaehler_anzeigen >= self.stichprobe:
+            self.flagge_fertig_geschuerft = True
+            self.vollstaendig_ab_stamp = int(arg_zeitstempel) + 1
+
+
+    def _funk_delta_zusammenfuehren(self):
+        """Adds the stored offers of the search term in attribute
+        buch_delta to attribute tabelle_anzeigen (from new to old with the
+        same checks as the scraped offers). Sets attribute
+        flagge_fertig_geschuerft to True if the stored offers contain all
+        remaining offers of the order, otherwise the scraping goes on
+        with the next page.
+        """
+        self.flagge_delta_zusammengefuehrt = True
+
+        for zeile_x in self.buch_delta['tabelle_anzeigen'].funk_zeilen():
+            self._funk_anzeige_aufnehmen(
+                arg_href=zeile_x.href,
+                arg_ort=zeile_x.ort,
+                arg_preis=zeile_x.preis,
+                arg_zeit=zeile_x.zeit,
+                arg_zeitstempel=zeile_x.zeitstempel
+                )
+
+            if self.flagge_fertig_geschuerft == True:
+                return()
+
+        # The stored offers reach down to the maximum age, so there are no further offers to scrape
+        if (self.buch_delta['vollstaendig_ab_stamp']
+                <= self.zeitstempel_heute - self.max_anzeigenalter_sekunden):
+            self.flagge_fertig_geschuerft = True
+            self.vollstaendig_ab_stamp = self.buch_delta['vollstaendig_ab_stamp']
+
+
+    def _funk_delta_speichern(self):
+        """Stores the offers of the current order (together with the
+        stored offers of the search term if they were merged) for the
+        next order with the same search term.
+        """
+        if len(self.tabelle_anzeigen) == 0:
+            return()
+
+        if self.flagge_letzte_seite == True:
+            vollstaendig_ab_stamp = 0
+        elif self.vollstaendig_ab_stamp != None:
+            vollstaendig_ab_stamp = self.vollstaendig_ab_stamp
+        else:
+            vollstaendig_ab_stamp = int(self.tabelle_anzeigen.array_zeitstempel[-1]) + 1
+
+        tabelle_delta = self.tabelle_anzeigen
+
+        # The scraped offers overlap with the stored ones, so both together have no gaps
+        if self.flagge_delta_zusammengefuehrt == True:
+            vollstaendig_ab_stamp = min(vollstaendig_ab_stamp,
+                                        self.buch_delta['vollstaendig_ab_stamp'])
+
+            tabelle_delta = offer_table.AnzeigenTabelle()
+            for tabelle_x in [self.tabelle_anzeigen, self.buch_delta['tabelle_anzeigen']]:
+                for zeile_x in tabelle_x.funk_zeilen():
+                    tabelle_delta.funk_hinzufuegen(
+                        arg_href=zeile_x.href,
+                        arg_ort=zeile_x.ort,
+                        arg_preis=zeile_x.preis,
+                        arg_zeit=zeile_x.zeit,
+                        arg_zeitstempel=zeile_x.zeitstempel
+                        )
+
+        self.sql_worker.funk_suchbegriff_speichern(
+            arg_suchbegriff=self.suchbegriff,
+            arg_tabelle_anzeigen=tabelle_delta,
+            arg_vollstaendig_ab_stamp=vollstaendig_ab_stamp
+            )
 
 
 
@@ -655,20 +2068,28 @@ class AnalyzerWorker:
         not being prefixed with an underscore.\n
         eventmanager -- Instance of Eventmanager to work with\n
         user_interface -- Instance of UserInterface to work with\n
+        datenkontext -- Instance of Datenkontext with the external data
+        and the dict for the results of the orders\n
+        flagge_darstellen -- Whether the maps and plots are created (the
+        report and the chi-square test are always created)\n
         suchbegriff -- Current search term\n
         stichprobe -- Number of offers that should be scraped, i. e.
         expected sample size\n
         max_anzeigenalter -- Maximum age of offers (in days) which
         should be included in the scraped sample\n
-        buch_anzeigen -- Current dict of scraped offers with links to
-        the offers as keys of the dict\n
+        flagge_nur_anzahlen -- Flag which is True if the current order
+        is a counts-only order, i. e. without scraped offers\n
+        tabelle_anzeigen -- Current instance of
+        offer_table.AnzeigenTabelle with the scraped offers\n
         buch_ergebnisse -- Current dict of the results aggregated on the
         level of the 16 states in germany, i. e. names of the different
         states are the keys of the dict\n
         antwort_server_str -- Current response from Kleinanzeigen server
         after sending a request while scraping\n
+        buch_kennzahlen -- Current dict with the results per state as
+        NumPy arrays (see LaenderKern.funk_kennzahlen_berechnen)\n
         frame_geojson_laender -- Loaded geojson data for the borders of
-        the 16 states\n
+        the 16 states (shared by the process, see Datenkontext)\n
         frame_ergebnisse -- Pandas dataframe containing the scraped data
         and external data (e. g. inhabitant numbers) for analyzing\n
         frame_merge -- Like attribute frame_ergebnisse but also with geo
@@ -684,11 +2105,11 @@ class AnalyzerWorker:
         data from attribute frame_merge (this map will be displayed as
         "Karte 2 (ANZEIGENQUOTE_TOTAL in Bundesländern)" to the user)\n
         ergebnis_chi_quadrat -- Results of the chi-square test\n
-        ergebnis_heatmap -- Heatmap as opened png file to display to the
-        user\n
-        ergebnis_clustermap -- Clustermap as opened png file to display
+        ergebnis_heatmap -- Heatmap as png image (bytes) to display to
+        the user\n
+        ergebnis_clustermap -- Clustermap as png image (bytes) to display
         to the user\n
-        ergebnis_scatterplots -- Scatterplots as opened png file to
+        ergebnis_scatterplots -- Scatterplots as png image (bytes) to
         display to the user
     
     Public methods:\n
@@ -698,16 +2119,16 @@ class AnalyzerWorker:
     Private methods:\n
         _funk_arbeiten -- Analyzes the data with the help of the other
         private methods.\n
-        _funk_buch_anzeigen_fertigstellen -- Updates the attribute
-        buch_anzeigen: Adds location data to each scraped offer.\n
-        _funk_buch_ergebnisse_fertigstellen -- Updates the attribute
-        buch_ergebnisse: Calculates additional variables.\n
+        _funk_tabelle_anzeigen_fertigstellen -- Updates the attribute
+        tabelle_anzeigen: Adds location data to each scraped offer.\n
+        _funk_kennzahlen_berechnen -- Creates attribute
+        buch_kennzahlen: Calculates the results per state.\n
         _funk_frames_erstellen -- Creates attributes frame_ergebnisse
         and frame_merge.\n
         _funk_korrelationen_erstellen -- Creates attribute
         Korrelationen.\n
-        _funk_ergebnisse_speichern -- Saves relevant results to
-        streamlit.session_state.\n
+        _funk_ergebnisse_speichern -- Saves relevant results to the dict
+        buch_ergebnisse_auftraege of attribute datenkontext.\n
         _funk_frame_bericht_erstellen -- Returns dataframe which will
         become attribute ergebnis_bericht.\n
         _funk_karte_standorte_erstellen -- Returns folium map object
@@ -718,38 +2139,56 @@ class AnalyzerWorker:
         which will become attribute ergebnis_karte_anzeigenquote.\n
         _funk_chi_quadrat_erstellen -- Returns dictionary which will
         become attribute ergebnis_chi_quadrat.\n
-        _funk_heatmap_erstellen -- Returns loaded png file which will
-        become attribute ergebnis_heatmap.\n
-        _funk_clustermap_erstellen -- Returns loaded png file which will
-        become attribute ergebnis_clustermap.\n
-        funk_scatterplots_erstellen -- Returns loaded png file which
-        will become attribute ergebnis_scatterplots.
+        _funk_heatmap_erstellen -- Returns png image which will become
+        attribute ergebnis_heatmap (from the cache of the process if
+        possible).\n
+        _funk_heatmap_rendern -- Returns the heatmap of a correlation
+        matrix as png image.\n
+        _funk_clustermap_erstellen -- Returns png image which will become
+        attribute ergebnis_clustermap (from the cache of the process if
+        possible).\n
+        _funk_clustermap_rendern -- Returns the clustermap of a
+        correlation matrix as png image.\n
+        funk_scatterplots_erstellen -- Returns png image which will
+        become attribute ergebnis_scatterplots (from the cache of the
+        process if possible).\n
+        _funk_scatterplots_rendern -- Returns the scatterplots of the
+        variables as png image.
         """
     
     def __init__(
             self,
             init_eventmanager: Eventmanager,
             init_user_interface: UserInterface,
+            init_datenkontext: Datenkontext,
+            init_flagge_darstellen: bool = True
             ):
         """Inits AnalyzerWorker.
 
         Keyword arguments:\n
         init_eventmanager -- Active instance of class Eventmanager\n
-        init_user_interface -- Active instance of class UserInterface
+        init_user_interface -- Active instance of class UserInterface\n
+        init_datenkontext -- Instance of Datenkontext with the external
+        data and the dict for the results of the orders\n
+        init_flagge_darstellen -- Whether the maps and plots are created
+        (False for runs without a UI which only need the numbers)
         """
         self.eventmanager = init_eventmanager
         self.user_interface = init_user_interface
+        self.datenkontext = init_datenkontext
+        self.flagge_darstellen = init_flagge_darstellen
 
         self.suchbegriff = ''
         self.stichprobe = constants.N_DEFAULT_STICHPROBE_AUFTRAG
         self.max_anzeigenalter = constants.DEFAULT_MAX_ANZEIGENALTER_AUFTRAG
-        self.buch_anzeigen = {}
-        self.buch_ergebnisse = copy.deepcopy(streamlit.session_state['Buch_Laender'])
+        self.flagge_nur_anzahlen = False
+        self.tabelle_anzeigen = offer_table.AnzeigenTabelle()
+        self.buch_ergebnisse = copy.deepcopy(self.datenkontext.buch_laender)
         self.antwort_server_str = ''
+        self.buch_kennzahlen = None
 
-        self.frame_geojson_laender = geopandas.read_file(streamlit.\
-                                                         session_state['Geojson_Laender']
-                                                         )
+        # Parsed once per process, the merge in _funk_frames_erstellen returns a new dataframe
+        self.frame_geojson_laender = self.datenkontext.frame_geojson_laender
         self.frame_ergebnisse = None
         self.frame_merge = None
         
@@ -768,9 +2207,10 @@ class AnalyzerWorker:
             arg_auftrag_suchbegriff: str,
             arg_auftrag_stichprobe: int,
             arg_auftrag_max_anzeigenalter: int,
-            arg_auftrag_buch_anzeigen: dict,
+            arg_auftrag_tabelle_anzeigen: offer_table.AnzeigenTabelle,
             arg_auftrag_buch_ergebnisse: dict,
-            arg_auftrag_antwort_server_str: str):
+            arg_auftrag_antwort_server_str: str,
+            arg_auftrag_nur_anzahlen: bool = False):
         """This function receives the analyzing order from the
         eventmanager.
         
@@ -781,8 +2221,10 @@ class AnalyzerWorker:
         arg_auftrag_max_anzeigenalter -- Maximum age of offers (in days)
         which should be included in the scraped sample for the processed
         order\n
-        arg_auftrag_buch_anzeigen -- Dict of scraped offers with links
-        to offers as keys of the dict\n
+        arg_auftrag_nur_anzahlen -- Whether the processed order is a
+        counts-only order (only the aggregate analysis is done)\n
+        arg_auftrag_tabelle_anzeigen -- Instance of
+        offer_table.AnzeigenTabelle with the scraped offers\n
         arg_auftrag_buch_ergebnisse -- Dict of the results aggregated on
         the level of the 16 states in germann, i. e. the keys of the
         dict are the names of the different states\n
@@ -792,7 +2234,8 @@ class AnalyzerWorker:
         self.suchbegriff = arg_auftrag_suchbegriff
         self.stichprobe = arg_auftrag_stichprobe
         self.max_anzeigenalter = arg_auftrag_max_anzeigenalter
-        self.buch_anzeigen = arg_auftrag_buch_anzeigen
+        self.flagge_nur_anzahlen = arg_auftrag_nur_anzahlen
+        self.tabelle_anzeigen = arg_auftrag_tabelle_anzeigen
         self.buch_ergebnisse = arg_auftrag_buch_ergebnisse
         self.antwort_server_str = arg_auftrag_antwort_server_str
         
@@ -814,75 +2257,50 @@ class AnalyzerWorker:
         """Analyzes the data with the help of the other private
         methods.
         """
-        self._funk_buch_anzeigen_fertigstellen()
-        self._funk_buch_ergebnisse_fertigstellen()
+        # Counts-only orders have no offers which could get location data
+        if self.flagge_nur_anzahlen == False:
+            self._funk_tabelle_anzeigen_fertigstellen()
+        self._funk_kennzahlen_berechnen()
         self._funk_frames_erstellen()
         self._funk_korrelationen_erstellen()
         self._funk_ergebnisse_speichern()
 
 
-    def _funk_buch_anzeigen_fertigstellen(self):
-        """Updates the attribute buch_anzeigen: Adds location data to
+    def _funk_tabelle_anzeigen_fertigstellen(self):
+        """Updates the attribute tabelle_anzeigen: Adds location data to
         each scraped offer.
         """
-        for key_x in self.buch_anzeigen:
-            plz_anzeige = self.buch_anzeigen[key_x]['Ort'].split(' ')[0]
-
-            eintrag_aus_Buch_PLZs = streamlit.session_state['Buch_PLZs'][plz_anzeige]
-            
-            self.buch_anzeigen[key_x]['PLZ'] = plz_anzeige
-            self.buch_anzeigen[key_x]['Land'] = eintrag_aus_Buch_PLZs['Land']
-            self.buch_anzeigen[key_x]['Breitengrad'] = eintrag_aus_Buch_PLZs['Breitengrad']
-            self.buch_anzeigen[key_x]['Laengengrad'] = eintrag_aus_Buch_PLZs['Laengengrad']
+        self.tabelle_anzeigen.funk_orte_hinzufuegen(
+            arg_plz_index=self.datenkontext.plz_index
+            )
     
 
-    def _funk_buch_ergebnisse_fertigstellen(self):
-        """Updates the attribute buch_ergebnisse: Calculates additional
-        variables.
+    def _funk_kennzahlen_berechnen(self):
+        """Creates attribute buch_kennzahlen: Counts the scraped offers per
+        state and calculates the rates and expected numbers of offers with
+        the LaenderKern of attribute datenkontext.
         """
-        anzeigenanzahl_total_deutschland = 0
+        laender_kern = self.datenkontext.laender_kern
 
-        for x in self.buch_ergebnisse.keys():
-            self.buch_ergebnisse[x]['Anzeigenanzahl'] = 0
-            anzeigenanzahl_total_deutschland = (
-                anzeigenanzahl_total_deutschland + self.buch_ergebnisse[x]['Anzeigenanzahl_total']
-                )
+        anzahlen = laender_kern.funk_anzahlen_zaehlen(
+            arg_codes=self.tabelle_anzeigen.funk_spalte('land'),
+            arg_liste_laender_codes=self.tabelle_anzeigen.liste_laender
+            )
+        anzahlen_total = numpy.array(
+            [self.buch_ergebnisse[x]['Anzeigenanzahl_total'] for x in laender_kern.liste_laender],
+            dtype=numpy.int64
+            )
 
-        for x in self.buch_anzeigen.keys():
-            land_von_anzeige = self.buch_anzeigen[x]['Land']
-            self.buch_ergebnisse[land_von_anzeige]['Anzeigenanzahl'] = (
-                self.buch_ergebnisse[land_von_anzeige]['Anzeigenanzahl'] + 1
-                )
-        
-        for x in self.buch_ergebnisse.keys():
-            self.buch_ergebnisse[x]['Anzeigenquote'] = (
-                self.buch_ergebnisse[x]['Anzeigenanzahl']
-                / self.buch_ergebnisse[x]['Einwohnerzahl']
-                * 1000000
-                )
-            
-            self.buch_ergebnisse[x]['Anzeigenanzahl_erwartet'] = (
-                self.buch_ergebnisse[x]['Gewicht_Einwohnerzahl']
-                * len(self.buch_anzeigen)
-                )
-            
-            self.buch_ergebnisse[x]['ANZEIGENQUOTE_TOTAL'] = (
-                self.buch_ergebnisse[x]['Anzeigenanzahl_total']
-                / self.buch_ergebnisse[x]['Einwohnerzahl']
-                * 1000000
-                )
-            
-            self.buch_ergebnisse[x]['Anzeigenanzahl_total_erwartet'] = (
-                self.buch_ergebnisse[x]['Gewicht_Einwohnerzahl']
-                * anzeigenanzahl_total_deutschland
-                )
+        self.buch_kennzahlen = laender_kern.funk_kennzahlen_berechnen(
+            arg_anzahlen=anzahlen,
+            arg_anzahlen_total=anzahlen_total
+            )
 
 
     def _funk_frames_erstellen(self):
         """Creates attributes frame_ergebnisse and frame_merge."""
-        self.frame_ergebnisse = helpers.funk_nested_dict_zu_frame(
-                                    arg_dict=self.buch_ergebnisse,
-                                    arg_schluessel='Land'
+        self.frame_ergebnisse = self.datenkontext.laender_kern.funk_frame_erstellen(
+                                    arg_buch_kennzahlen=self.buch_kennzahlen
                                     )
         
         self.frame_merge = self.frame_geojson_laender.merge(self.frame_ergebnisse, on = 'Land')
@@ -927,57 +2345,58 @@ class AnalyzerWorker:
 
 
     def _funk_ergebnisse_speichern(self):
-        """Saves relevant results to streamlit.session_state."""
+        """Saves relevant results to the dict buch_ergebnisse_auftraege
+        of attribute datenkontext.
+        """
+        buch_ergebnisse_auftraege = self.datenkontext.buch_ergebnisse_auftraege
+
         # If the results are for an order which has already been executed with the same parameters
-        # before, delete the old results in streamlit.session_state
+        # before, delete the old results
         order_id_in_state = f'{self.suchbegriff}_{self.stichprobe}_{self.max_anzeigenalter}'
+        if self.flagge_nur_anzahlen == True:
+            order_id_in_state = f'{self.suchbegriff}_Anzahlen'
         
         try:
-            del(streamlit.session_state['Ergebnisse'][order_id_in_state])
+            del(buch_ergebnisse_auftraege[order_id_in_state])
         except Exception:
             pass
         
         ##########
-        streamlit.session_state['Ergebnisse'][order_id_in_state] = {}
+        buch_ergebnisse_auftraege[order_id_in_state] = {}
 
         ##########
-        streamlit.session_state['Ergebnisse'][order_id_in_state]['Suchbegriff'] = self.suchbegriff
-        streamlit.session_state['Ergebnisse'][order_id_in_state]['Stichprobe'] = self.stichprobe
-        streamlit.session_state['Ergebnisse'][order_id_in_state]['Max_Anzeigenalter']\
-            = self.max_anzeigenalter
-        streamlit.session_state['Ergebnisse'][order_id_in_state]['Buch_Anzeigen']\
-            = self.buch_anzeigen
+        buch_ergebnisse_auftraege[order_id_in_state]['Suchbegriff'] = self.suchbegriff
+        buch_ergebnisse_auftraege[order_id_in_state]['Stichprobe'] = self.stichprobe
+        buch_ergebnisse_auftraege[order_id_in_state]['Max_Anzeigenalter'] = self.max_anzeigenalter
+        buch_ergebnisse_auftraege[order_id_in_state]['Nur_Anzahlen'] = self.flagge_nur_anzahlen
+        buch_ergebnisse_auftraege[order_id_in_state]['Tabelle_Anzeigen'] = self.tabelle_anzeigen
         
         ##########
         self.ergebnis_bericht = self._funk_frame_bericht_erstellen()
-        streamlit.session_state['Ergebnisse'][order_id_in_state]['Frame_Bericht']\
-            = self.ergebnis_bericht
+        buch_ergebnisse_auftraege[order_id_in_state]['Frame_Bericht'] = self.ergebnis_bericht
+
+        self.ergebnis_chi_quadrat = self._funk_chi_quadrat_erstellen()
+        buch_ergebnisse_auftraege[order_id_in_state]['Chi_Quadrat'] = self.ergebnis_chi_quadrat
 
         ##########
-        self.ergebnis_karte_standorte = self._funk_karte_standorte_erstellen() 
-        streamlit.session_state['Ergebnisse'][order_id_in_state]['Karte_Standorte']\
+        # The maps and plots are only created if they are displayed or written to files
+        if self.flagge_darstellen == True:
+            if self.flagge_nur_anzahlen == False:
+                self.ergebnis_karte_standorte = self._funk_karte_standorte_erstellen()
+            else:
+                self.ergebnis_karte_standorte = None
+            self.ergebnis_karte_anzeigenquote = self._funk_karte_anzeigenquote_erstellen()
+            self.ergebnis_heatmap = self._funk_heatmap_erstellen()
+            self.ergebnis_clustermap = self._funk_clustermap_erstellen()
+            self.ergebnis_scatterplots = self._funk_scatterplots_erstellen()
+
+        buch_ergebnisse_auftraege[order_id_in_state]['Karte_Standorte']\
             = self.ergebnis_karte_standorte
-        
-        ##########              
-        self.ergebnis_karte_anzeigenquote = self._funk_karte_anzeigenquote_erstellen()
-        streamlit.session_state['Ergebnisse'][order_id_in_state]['Karte_Anzeigenquote']\
+        buch_ergebnisse_auftraege[order_id_in_state]['Karte_Anzeigenquote']\
             = self.ergebnis_karte_anzeigenquote
-        
-        self.ergebnis_chi_quadrat = self._funk_chi_quadrat_erstellen()
-        streamlit.session_state['Ergebnisse'][order_id_in_state]['Chi_Quadrat']\
-            = self.ergebnis_chi_quadrat
-        
-        self.ergebnis_heatmap = self._funk_heatmap_erstellen()
-        streamlit.session_state['Ergebnisse'][order_id_in_state]['Heatmap']\
-            = self.ergebnis_heatmap
-        
-        self.ergebnis_clustermap = self._funk_clustermap_erstellen()
-        streamlit.session_state['Ergebnisse'][order_id_in_state]['Clustermap']\
-            = self.ergebnis_clustermap
-
-        self.ergebnis_scatterplots = self._funk_scatterplots_erstellen()
-        streamlit.session_state['Ergebnisse'][order_id_in_state]['Scatterplots']\
-            = self.ergebnis_scatterplots
+        buch_ergebnisse_auftraege[order_id_in_state]['Heatmap'] = self.ergebnis_heatmap
+        buch_ergebnisse_auftraege[order_id_in_state]['Clustermap'] = self.ergebnis_clustermap
+        buch_ergebnisse_auftraege[order_id_in_state]['Scatterplots'] = self.ergebnis_scatterplots
        
 
     def _funk_frame_bericht_erstellen(self):
@@ -995,6 +2414,12 @@ class AnalyzerWorker:
                 'Anzeigenquote', 'Anzeigenanzahl', 'Anzeigenanzahl_erwartet'
                 ]]
             
+            # The columns for the scraped offers would only contain zeros for counts-only orders
+            if self.flagge_nur_anzahlen == True:
+                frame_bericht = frame_bericht.drop(
+                    columns=['Anzeigenquote', 'Anzeigenanzahl', 'Anzeigenanzahl_erwartet']
+                    )
+
             frame_bericht.set_index('Land', inplace=True)
             
             spaltennamen_fuer_int = [
@@ -1023,7 +2448,7 @@ class AnalyzerWorker:
                                 )
             
             self._funk_marker_einfuegen(
-                arg_buch_anzeigen=self.buch_anzeigen,
+                arg_tabelle_anzeigen=self.tabelle_anzeigen,
                 arg_karte=karte_standorte
                 )
             return(karte_standorte)
@@ -1034,21 +2459,21 @@ class AnalyzerWorker:
             return(None)
 
 
-    def _funk_marker_einfuegen(self, arg_buch_anzeigen, arg_karte):
+    def _funk_marker_einfuegen(self, arg_tabelle_anzeigen, arg_karte):
         """Adds location markers to a folium map object.
 
         Keyword arguments:\n
-        arg_buch_anzeigen -- Dict with offers and corresponding location
-        data\n
+        arg_tabelle_anzeigen -- Instance of offer_table.AnzeigenTabelle
+        with offers and corresponding location data\n
         arg_karte -- Folium map object for adding the markers to
         """
         buch_laengengrade = {}
         
-        for x in arg_buch_anzeigen.keys():
-            breitengrad = arg_buch_anzeigen[x]['Breitengrad']
-            laengengrad = arg_buch_anzeigen[x]['Laengengrad']
+        for zeile_x in arg_tabelle_anzeigen.funk_zeilen():
+            breitengrad = zeile_x.breitengrad
+            laengengrad = zeile_x.laengengrad
 
-            plz = arg_buch_anzeigen[x]['PLZ']
+            plz = zeile_x.plz
 
             # If there is already an offer with the same PLZ, change the longitude for the marker
             # slightly to make the markers distinguishable
@@ -1058,8 +2483,8 @@ class AnalyzerWorker:
             else:
                 buch_laengengrade[plz] = laengengrad
  
-            titel = x.split('/')[2].replace('-', ' ')
-            preis = '## ' + arg_buch_anzeigen[x]['Preis']
+            titel = zeile_x.href.split('/')[2].replace('-', ' ')
+            preis = '## ' + zeile_x.preis
             url = f''
 
             if len(titel) > 20:
@@ -1071,7 +2496,7 @@ class AnalyzerWorker:
                 [breitengrad, laengengrad],
                 icon = folium.Icon(color="red"),
                 popup = url,
-                tooltip =  f'{titel_kurz}\n{preis}\n ## ' + arg_buch_anzeigen[x]['Ort']
+                tooltip =  f'{titel_kurz}\n{preis}\n ## ' + zeile_x.ort
                 ).add_to(arg_karte)
     
 
@@ -1090,13 +2515,6 @@ class AnalyzerWorker:
                                     control_scale=True
                                     )
 
-            style_funktion = lambda x: {
-                                'fillColor': '#ffffff', 
-                                'color':'#000000', 
-                                'fillOpacity': 0.1, 
-                                'weight': 0.1
-                                }
-            
             highlight_funktion = lambda x: {
                                     'fillColor': '#5df724', 
                                     'color':'#000000', 
@@ -1104,44 +2522,41 @@ class AnalyzerWorker:
                                     'weight': 1.0
                                     }
 
-            folium.Choropleth(
-                geo_data=streamlit.session_state['Geojson_Laender'],
+            liste_spalten_tooltip = [
+                'Land', 'ANZEIGENQUOTE_TOTAL', 'Anzeigenanzahl_total',
+                'Anzeigenanzahl_total_erwartet', 'Flaeche', 'Einwohnerzahl', 'Einwohnerdichte',
+                'Haus_Einkommen', 'Alter_Mittelwert', 'Alter_0_17', 'Alter_18_65', 'Alter_66_100'
+                ]
+
+            # The simplified borders are shipped once: the choropleth layer also carries the data
+            # for the tooltip instead of a second layer with the original borders
+            frame_karte = self.datenkontext.buch_frames_geometrie[
+                constants.STUFE_GEOMETRIE_KARTE_ANZEIGENQUOTE
+                ].merge(pandas.DataFrame(self.frame_merge[liste_spalten_tooltip]), on='Land')
+
+            choropleth = folium.Choropleth(
+                geo_data=frame_karte,
                 name='choropleth',
-                data=self.frame_merge,
+                data=frame_karte,
                 columns=['Land', 'ANZEIGENQUOTE_TOTAL'],
-                key_on='feature.id',
+                key_on='feature.properties.Land',
                 fill_color='Reds',
                 fill_opacity=1.0,
                 line_opacity=1.0,
                 legend_name='ANZEIGENQUOTE_TOTAL',
                 highlight=True
-                ).add_to(karte_anzeigenquote)
-            
-            highlights = folium.features.GeoJson(
-                data=self.frame_merge,
-                style_function=style_funktion, 
-                control=False,
-                highlight_function=highlight_funktion, 
-                tooltip=folium.features.GeoJsonTooltip(
-                    prefer_canvas=True,
-                    fields=[
-                        'Land', 'ANZEIGENQUOTE_TOTAL', 'Anzeigenanzahl_total',
-                        'Anzeigenanzahl_total_erwartet', 'Flaeche', 'Einwohnerzahl',
-                        'Einwohnerdichte', 'Haus_Einkommen', 'Alter_Mittelwert', 'Alter_0_17',
-                        'Alter_18_65', 'Alter_66_100'
-                        ],
-                    aliases=[
-                        'Land', 'ANZEIGENQUOTE_TOTAL', 'Anzeigenanzahl_total',
-                        'Anzeigenanzahl_total_erwartet', 'Flaeche', 'Einwohnerzahl',
-                        'Einwohnerdichte', 'Haus_Einkommen', 'Alter_Mittelwert', 'Alter_0_17',
-                        'Alter_18_65', 'Alter_66_100'
-                        ],
-                    style=("background-color: white; color: #333333; font-family: arial; \
-                                font-size: 12px; padding: 10px;") 
-                    )
                 )
+            choropleth.geojson.highlight_function = highlight_funktion
 
-            karte_anzeigenquote.add_child(highlights)
+            folium.features.GeoJsonTooltip(
+                prefer_canvas=True,
+                fields=liste_spalten_tooltip,
+                aliases=liste_spalten_tooltip,
+                style=("background-color: white; color: #333333; font-family: arial; \
+                            font-size: 12px; padding: 10px;")
+                ).add_to(choropleth.geojson)
+
+            choropleth.add_to(karte_anzeigenquote)
         
             return(karte_anzeigenquote)
     
@@ -1186,57 +2601,87 @@ class AnalyzerWorker:
 
 
     def _funk_heatmap_erstellen(self):
-        """Returns loaded png file which will become attribute
+        """Returns png image (bytes) which will become attribute
         ergebnis_heatmap.
         """
         try:
-            fig, ax = plt.subplots(figsize=(5,5))
+            return(figure_cache.funk_bild_cache_erstellen().funk_bild_holen(
+                arg_art='Heatmap',
+                arg_frame=self.korrelationen,
+                arg_funk_rendern=self._funk_heatmap_rendern
+                ))
+        
+        except Exception as fehler:
+            helpers.funk_drucken('ACHTUNG!: Fehler in funk_heatmap_erstellen:')
+            print(fehler)
+            return(None)
+
+
+    @staticmethod
+    def _funk_heatmap_rendern(arg_korrelationen: pandas.DataFrame):
+        """Returns the heatmap of the correlation matrix in argument
+        arg_korrelationen as png image (bytes).
 
+        Keyword arguments:\n
+        arg_korrelationen -- Correlation matrix
+        """
+        # The theme only applies inside the context, so it does not change other plots
+        with matplotlib.rc_context():
             seaborn.set_theme(font_scale=0.7)
+
+            fig = matplotlib.figure.Figure(figsize=(5,5))
+            ax = fig.subplots()
+
             seaborn.heatmap(
-                self.korrelationen,
+                arg_korrelationen,
                 annot=True, fmt=".2f", cmap='seismic', vmin=-1.0, vmax=1.0,
-                annot_kws={"size": 8}
+                annot_kws={"size": 8},
+                ax=ax
                 )
-            
-            fig.savefig('Heatmap.png', bbox_inches="tight")
 
-            fig_geladen = PIL.Image.open('Heatmap.png')
+            return(figure_cache.funk_figur_zu_png(fig))
+    
 
-            return(fig_geladen)
+    def _funk_clustermap_erstellen(self):
+        """Returns png image (bytes) which will become attribute
+        ergebnis_clustermap.
+        """
+        try:
+            return(figure_cache.funk_bild_cache_erstellen().funk_bild_holen(
+                arg_art='Clustermap',
+                arg_frame=self.korrelationen,
+                arg_funk_rendern=self._funk_clustermap_rendern
+                ))
         
         except Exception as fehler:
-            helpers.funk_drucken('ACHTUNG!: Fehler in funk_heatmap_erstellen:')
+            helpers.funk_drucken('ACHTUNG!: Fehler in funk_clustermap_erstellen:')
             print(fehler)
             return(None)
-    
 
-    def _funk_clustermap_erstellen(self):
-        """Returns loaded png file which will become attribute
-        ergebnis_clustermap.
+
+    @staticmethod
+    def _funk_clustermap_rendern(arg_korrelationen: pandas.DataFrame):
+        """Returns the clustermap of the correlation matrix in argument
+        arg_korrelationen as png image (bytes).
+
+        Keyword arguments:\n
+        arg_korrelationen -- Correlation matrix
         """
-        try:                    
+        with matplotlib.rc_context():
             seaborn.set_theme(font_scale=0.8)
+
+            # Seaborn creates the figure of the clustermap with pyplot, funk_figur_zu_png closes it
             clustermap = seaborn.clustermap(
-                self.korrelationen,
+                arg_korrelationen,
                 annot=True, fmt=".2f", cmap='seismic', vmin=-1.0, vmax=1.0,
                 annot_kws={"size": 8}, figsize=(6,6)
                 )
-            
-            clustermap.savefig('Clustermap.png', bbox_inches="tight")
 
-            fig_geladen = PIL.Image.open('Clustermap.png')
-
-            return(fig_geladen)
-        
-        except Exception as fehler:
-            helpers.funk_drucken('ACHTUNG!: Fehler in funk_clustermap_erstellen:')
-            print(fehler)
-            return(None)
+            return(figure_cache.funk_figur_zu_png(clustermap.figure))
     
 
     def _funk_scatterplots_erstellen(self):
-        """Returns loaded png file which will become attribute
+        """Returns png image (bytes) which will become attribute
         ergebnis_scatterplots.
         """
         try:
@@ -1248,24 +2693,45 @@ class AnalyzerWorker:
                 ],
                 inplace=True
                 ) 
-            
-            fig = pandas.plotting.scatter_matrix(
-                frame_scatterplots,
-                alpha=0.2,
-                figsize=(10, 10),
-                diagonal='hist'
-                )
-            
-            [plt.setp(x.xaxis.get_label(), 'size', 7) for x in fig.ravel()]
-            [plt.setp(x.yaxis.get_label(), 'size', 7) for x in fig.ravel()]
-            
-            plt.savefig(r'Scatterplots.png', bbox_inches='tight') 
-
-            fig_geladen = PIL.Image.open('Scatterplots.png')
 
-            return(fig_geladen)
+            return(figure_cache.funk_bild_cache_erstellen().funk_bild_holen(
+                arg_art='Scatterplots',
+                arg_frame=frame_scatterplots,
+                arg_funk_rendern=self._funk_scatterplots_rendern
+                ))
         
         except Exception as fehler:
             helpers.funk_drucken('ACHTUNG!: Fehler in funk_scatterplots_erstellen:')
             print(fehler)
             return(None)
+
+
+    @staticmethod
+    def _funk_scatterplots_rendern(arg_frame_scatterplots: pandas.DataFrame):
+        """Returns the scatterplots of the variables in argument
+        arg_frame_scatterplots as png image (bytes).
+
+        Keyword arguments:\n
+        arg_frame_scatterplots -- Dataframe with the variables
+        """
+        # Same theme as the clustermap, which was still set when the scatterplots were drawn
+        with matplotlib.rc_context():
+            seaborn.set_theme(font_scale=0.8)
+
+            fig = matplotlib.figure.Figure(figsize=(10, 10))
+
+            # The axes of the figure are replaced by the matrix of scatterplots
+            with warnings.catch_warnings():
+                warnings.filterwarnings('ignore', message='To output multiple subplots')
+                axes = pandas.plotting.scatter_matrix(
+                    arg_frame_scatterplots,
+                    alpha=0.2,
+                    diagonal='hist',
+                    ax=fig.subplots()
+                    )
+
+            for ax_x in axes.ravel():
+                ax_x.xaxis.get_label().set_size(7)
+                ax_x.yaxis.get_label().set_size(7)
+
+            return(figure_cache.funk_figur_zu_png(fig))